@@ -0,0 +1,334 @@
+# Control de admisión de las escrituras frecuentes (vistas, likes,
+# seguimientos, comentarios, mensajes, lotes y subidas). Antes de ejecutar la ruta se comprueba:
+#
+#   1. el cubo de fichas de la IP y el del usuario (campo del body) desde
+#      esa IP: si no queda ficha se responde 429 con Retry-After en segundos.
+#      El usuario no está autenticado, así que su cubo va por (IP, usuario):
+#      nadie puede gastar las fichas de otro mandando su nombre;
+#   2. cuántas peticiones de su clase están en curso: por encima del límite
+#      se responde 503 con Retry-After, en vez de esperar en cola a que el
+#      pool de conexiones se libere y acabar en timeout.
+#
+# Límites por clase en LIMITS; cada uno se cambia con una variable
+# ADMISSION_<CLASE>, p. ej. ADMISSION_LIKES="user=1/20,ip=10/50,concurrency=16"
+# (fichas por segundo / ráfaga). Un límite a 0 no se comprueba.
+#
+# Estado compartido (ADMISSION_BACKEND):
+#     memory  en el proceso: cada worker de gunicorn lleva sus cuentas
+#     redis   en ADMISSION_REDIS_URL, con scripts Lua atómicos: los límites
+#             valen para todos los workers y máquinas
+# Si el backend falla la petición pasa (y cuenta en admission_errors_total).
+import math
+import threading
+import time
+import uuid
+
+from cachetools import TTLCache
+from flask import g, request
+
+import config
+from metrics import jsonify, registry
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# clase -> {'user': (fichas/s, ráfaga), 'ip': (fichas/s, ráfaga), 'concurrency': n}
+LIMITS = {
+    'vistas': {'user': (2, 30), 'ip': (20, 100), 'concurrency': 32},
+    'likes': {'user': (1, 20), 'ip': (10, 50), 'concurrency': 16},
+    'seguimientos': {'user': (1, 20), 'ip': (10, 50), 'concurrency': 16},
+    'comentarios': {'user': (0.5, 10), 'ip': (5, 30), 'concurrency': 8},
+    'mensajes': {'user': (1, 20), 'ip': (10, 50), 'concurrency': 16},
+    'lotes': {'user': (0, 0), 'ip': (2, 10), 'concurrency': 4},
+    'subidas': {'user': (0.2, 5), 'ip': (20, 100), 'concurrency': 16},
+}
+
+# endpoint -> (clase, campo del body con el usuario)
+ENDPOINTS = {
+    'videos_api.record_view': ('vistas', 'username'),
+    'videos_api.like_video': ('likes', 'username'),
+    'videos_api.follow_user': ('seguimientos', 'follower'),
+    'videos_api.add_comment': ('comentarios', 'username'),
+    'messages_api.send_message': ('mensajes', 'from'),
+    'videos_api.batch': ('lotes', None),
+    'videos_api.create_upload': ('subidas', 'usuario'),
+    # Los trozos no llevan usuario, y su cuerpo son los bytes: no se lee aquí
+    'videos_api.upload_chunk': ('subidas', None),
+}
+
+# Tipo de acción de /api/batch -> (clase cuyos cubos, IP y usuario, gasta
+# cada acción además de la ficha del lote, campo de la acción con el usuario)
+BATCH_CLASSES = {
+    'view': ('vistas', 'username'),
+    'like': ('likes', 'username'),
+    'follow': ('seguimientos', 'follower'),
+    'comment': ('comentarios', 'username'),
+}
+
+
+def configure(settings):
+    global PROXY_HOPS, IN_FLIGHT_TTL
+    # Saltos de proxy delante de la app (X-Forwarded-For); 0 = IP de la conexión
+    PROXY_HOPS = settings['ADMISSION_PROXY_HOPS']
+    # Segundos tras los que una petición en curso se da por terminada aunque
+    # nadie la liberara (un worker que murió a mitad, sólo en redis)
+    IN_FLIGHT_TTL = settings['ADMISSION_IN_FLIGHT_TTL']
+
+
+config.register(configure)
+
+registry.counter('admission_shed_total', 'Peticiones rechazadas por el control de admisión')
+registry.counter('admission_errors_total', 'Fallos del backend del control de admisión (la petición pasa)')
+
+
+def limits_from_settings(settings):
+    """LIMITS con lo que cambie cada ADMISSION_<CLASE> (ver config.limits)."""
+    return {name: dict(defaults, **settings[f'ADMISSION_{name.upper()}'])
+            for name, defaults in LIMITS.items()}
+
+
+def client_ip():
+    if PROXY_HOPS and len(request.access_route) >= PROXY_HOPS:
+        return request.access_route[-PROXY_HOPS]
+    return request.remote_addr or 'desconocida'
+
+
+class MemoryBackend:
+    """Cubos y peticiones en curso en memoria del proceso."""
+
+    def __init__(self, max_keys=100000):
+        self._lock = threading.Lock()
+        self._buckets = TTLCache(maxsize=max_keys, ttl=600)     # clave -> (fichas, instante)
+        self._in_flight = {}                                    # clase -> peticiones
+
+    def take(self, key, rate, burst):
+        """Gasta una ficha del cubo; devuelve 0 o los segundos hasta la siguiente."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def acquire(self, name, limit):
+        """Ocupa un hueco de la clase; devuelve un testigo o None si está llena."""
+        with self._lock:
+            if self._in_flight.get(name, 0) >= limit:
+                return None
+            self._in_flight[name] = self._in_flight.get(name, 0) + 1
+            return name
+
+    def release(self, name, token):
+        with self._lock:
+            self._in_flight[name] -= 1
+
+    def in_flight(self):
+        with self._lock:
+            return dict(self._in_flight)
+
+
+# KEYS[1] cubo; ARGV: fichas/s, ráfaga. Devuelve los segundos de espera (texto).
+TAKE_SCRIPT = '''
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'fichas', 'instante')
+local tokens = tonumber(state[1]) or burst
+local last = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'fichas', tokens, 'instante', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+'''
+
+# KEYS[1] peticiones en curso (sorted set testigo -> instante); ARGV: límite,
+# testigo, TTL. Devuelve 1 si hay hueco.
+ACQUIRE_SCRIPT = '''
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[3]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[2])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3])))
+return 1
+'''
+
+
+class RedisBackend:
+    """Cubos y peticiones en curso en Redis, compartidos entre procesos."""
+
+    def __init__(self, url, prefix='admision:'):
+        if redis is None:
+            raise RuntimeError('ADMISSION_BACKEND=redis necesita el paquete redis')
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self.prefix = prefix
+        self._take = self.client.register_script(TAKE_SCRIPT)
+        self._acquire = self.client.register_script(ACQUIRE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        return float(self._take(keys=[self.prefix + 'cubo:' + key], args=[rate, burst]))
+
+    def acquire(self, name, limit):
+        token = uuid.uuid4().hex
+        if self._acquire(keys=[self.prefix + 'curso:' + name], args=[limit, token, IN_FLIGHT_TTL]):
+            return token
+        return None
+
+    def release(self, name, token):
+        self.client.zrem(self.prefix + 'curso:' + name, token)
+
+    def in_flight(self):
+        return {}
+
+
+def backend_from_settings(settings):
+    name = settings['ADMISSION_BACKEND']
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'redis':
+        return RedisBackend(settings['ADMISSION_REDIS_URL'])
+    raise ValueError(f'ADMISSION_BACKEND desconocido: {name}')
+
+
+class AdmissionControl:
+    """Decide si una petición entra, con los límites y el backend dados."""
+
+    def __init__(self, backend, limits):
+        self.backend = backend
+        self.limits = limits
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.shed = {}          # (clase, motivo) -> rechazadas
+        self.errors = 0
+
+    def _count(self, name, reason):
+        registry.inc('admission_shed_total', clase=name, reason=reason)
+        with self._lock:
+            self.shed[(name, reason)] = self.shed.get((name, reason), 0) + 1
+
+    def _take(self, key, rate, burst):
+        try:
+            return self.backend.take(key, rate, burst)
+        except Exception as e:
+            print(f"Error en el control de admisión: {e}")
+            registry.inc('admission_errors_total')
+            with self._lock:
+                self.errors += 1
+            return 0.0
+
+    def user_wait(self, name, ip, username):
+        """
+        Gasta una ficha del usuario desde esa IP en la clase. Devuelve 0 si
+        pasa o los segundos que tiene que esperar (y cuenta el rechazo).
+        """
+        rate, burst = self.limits[name]['user']
+        if not self.enabled or not rate or not isinstance(username, str) or not username:
+            return 0.0
+        wait = self._take(f'{name}:usuario:{ip}:{username}', rate, burst)
+        if wait:
+            self._count(name, 'user')
+        return wait
+
+    def ip_wait(self, name, ip):
+        rate, burst = self.limits[name]['ip']
+        if not self.enabled or not rate:
+            return 0.0
+        wait = self._take(f'{name}:ip:{ip}', rate, burst)
+        if wait:
+            self._count(name, 'ip')
+        return wait
+
+    def wait(self, name, ip, username=None):
+        """Cubo de la IP y, si pasa, el del usuario: 0 o los segundos de espera."""
+        return self.ip_wait(name, ip) or self.user_wait(name, ip, username)
+
+    def acquire(self, name):
+        """Testigo del hueco ocupado, True si no hay límite o None si está lleno."""
+        limit = self.limits[name]['concurrency']
+        if not self.enabled or not limit:
+            return True
+        try:
+            token = self.backend.acquire(name, limit)
+        except Exception as e:
+            print(f"Error en el control de admisión: {e}")
+            registry.inc('admission_errors_total')
+            with self._lock:
+                self.errors += 1
+            return True
+        if token is None:
+            self._count(name, 'concurrency')
+        return token
+
+    def release(self, name, token):
+        if token is True:
+            return
+        try:
+            self.backend.release(name, token)
+        except Exception as e:
+            print(f"Error en el control de admisión: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = {f'shed_{name}_{reason}': n for (name, reason), n in self.shed.items()}
+            stats['errors'] = self.errors
+        for name, n in self.backend.in_flight().items():
+            stats[f'in_flight_{name}'] = n
+        return stats
+
+
+def rejected(status, message, wait):
+    response = jsonify({'success': False, 'message': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def init_admission(app, control):
+    """Aplica el control de admisión a los endpoints de ENDPOINTS."""
+
+    @app.before_request
+    def _admit():
+        endpoint = ENDPOINTS.get(request.endpoint)
+        if endpoint is None or not control.enabled:
+            return None
+        name, user_field = endpoint
+
+        username = None
+        if user_field:
+            data = request.get_json(silent=True)
+            username = data.get(user_field) if isinstance(data, dict) else None
+        wait = control.wait(name, client_ip(), username)
+        if wait:
+            return rejected(429, 'Demasiadas peticiones, inténtalo más tarde', wait)
+
+        token = control.acquire(name)
+        if token is None:
+            return rejected(503, 'Servidor ocupado, inténtalo de nuevo', 1)
+        g.admission = (name, token)
+        return None
+
+    @app.teardown_request
+    def _release(exc):
+        admitted = g.pop('admission', None)
+        if admitted is not None:
+            control.release(*admitted)
+
+
+def control_from_settings(settings):
+    control = AdmissionControl(backend_from_settings(settings), limits_from_settings(settings))
+    control.enabled = settings['ADMISSION_ENABLED']
+    return control
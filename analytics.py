@@ -0,0 +1,281 @@
+# Agregados incrementales de vistas y likes para las estadísticas de los
+# creadores (streamer.html). Por cada video y por cada creador se guardan,
+# por hora y por día, las vistas, los espectadores únicos y los likes en la
+# tabla estadisticas. Cada pasada lee sólo los eventos con id mayor que la
+# marca de su tabla (estadisticas_marcas) y la avanza en la misma
+# transacción, así un lote nunca se cuenta dos veces.
+#
+# Los ids de vistas y likes se asignan antes del commit, así que un id bajo
+# puede aparecer después que uno alto. La marca sólo avanza hasta el primer
+# hueco en los ids, salvo que el evento siguiente al hueco tenga más de
+# ANALYTICS_ROLLUP_LAG segundos: entonces el hueco es de un rollback o de un
+# ON CONFLICT DO NOTHING (que también consume ids) y se salta.
+#
+# Se ejecuta en un hilo cada ANALYTICS_ROLLUP_INTERVAL segundos (0 = nunca)
+# o a mano:
+#     flask --app app rollup-stats
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from psycopg2.extras import execute_values
+
+import config
+
+# granularidad -> paso entre buckets
+GRANULARITIES = {
+    'hora': timedelta(hours=1),
+    'dia': timedelta(days=1),
+}
+
+# tabla de eventos -> (columna de estadisticas que suma, ¿cuenta espectadores?)
+SOURCES = {
+    'vistas': ('vistas', True),
+    'likes': ('likes', False),
+}
+
+
+def configure(settings):
+    global BATCH_SIZE, LAG, VIEWER_RETENTION_DAYS
+    BATCH_SIZE = settings['ANALYTICS_BATCH_SIZE']
+    LAG = settings['ANALYTICS_ROLLUP_LAG']
+    # Días que se recuerda quién vio cada bucket. Una vista que llegue más
+    # tarde cuenta como espectador nuevo.
+    VIEWER_RETENTION_DAYS = settings['ANALYTICS_VIEWER_RETENTION_DAYS']
+
+
+config.register(configure)
+
+SERIES_QUERY = '''
+    SELECT bucket, vistas, espectadores, likes
+    FROM estadisticas
+    WHERE alcance = %s AND clave = %s AND granularidad = %s AND bucket >= %s
+    ORDER BY bucket
+'''
+
+TOP_VIDEOS_QUERY = '''
+    SELECT v.video_id, v.titulo, SUM(e.vistas) as vistas, SUM(e.likes) as likes
+    FROM videos v
+    JOIN estadisticas e ON e.alcance = 'video' AND e.clave = v.video_id
+                       AND e.granularidad = %s AND e.bucket >= %s
+    WHERE v.username = %s
+    GROUP BY v.video_id, v.titulo
+    ORDER BY vistas DESC, v.video_id
+    LIMIT %s
+'''
+
+UPDATED_QUERY = 'SELECT MIN(actualizado) as actualizado FROM estadisticas_marcas'
+
+
+def bucket(timestamp, granularity):
+    """Inicio (UTC) de la hora o del día del instante."""
+    start = timestamp.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'dia':
+        start = start.replace(hour=0)
+    return start
+
+
+def window_start(granularity, periods, now=None):
+    """Primer bucket de las últimas `periods` horas o días, el actual incluido."""
+    now = now or datetime.now(timezone.utc)
+    return bucket(now, granularity) - GRANULARITIES[granularity] * (periods - 1)
+
+
+def safe_prefix(events, watermark, now, lag=None):
+    """
+    Parte de events (ordenados por id) que ya se puede agregar: hasta el
+    primer hueco en los ids cuyo evento siguiente tenga menos de lag segundos.
+    """
+    lag = LAG if lag is None else lag
+    expected = watermark + 1
+    for i, event in enumerate(events):
+        if event['id'] != expected and (now - event['timestamp']).total_seconds() < lag:
+            return events[:i]
+        expected = event['id'] + 1
+    return events
+
+
+def aggregate(events, count_viewers):
+    """
+    Devuelve ({(alcance, clave, granularidad, bucket): eventos},
+    {(alcance, clave, granularidad, bucket, username)}).
+    """
+    counts, viewers = {}, set()
+    for event in events:
+        scopes = [('video', event['video_id'])]
+        if event['creador']:
+            scopes.append(('creador', event['creador']))
+        for granularity in GRANULARITIES:
+            start = bucket(event['timestamp'], granularity)
+            for scope, key in scopes:
+                row = (scope, key, granularity, start)
+                counts[row] = counts.get(row, 0) + 1
+                if count_viewers:
+                    viewers.add(row + (event['username'],))
+    return counts, viewers
+
+
+def rollup_source(conn, source, batch_size=None, lag=None):
+    """
+    Agrega el siguiente lote de eventos de `source` y avanza su marca en
+    una sola transacción. Devuelve cuántos eventos agregó: 0 si ya está al
+    día o si otro proceso está agregando la misma tabla.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    lag = LAG if lag is None else lag
+    column, count_viewers = SOURCES[source]
+    cur = conn.cursor()
+    try:
+        # SKIP LOCKED: si otro proceso tiene la marca, esta pasada no hace nada
+        cur.execute('''
+            SELECT ultimo_id, NOW() as now FROM estadisticas_marcas
+            WHERE fuente = %s
+            FOR UPDATE SKIP LOCKED
+        ''', (source,))
+        mark = cur.fetchone()
+        if mark is None:
+            conn.rollback()
+            return 0
+
+        cur.execute(f'''
+            SELECT e.id, e.video_id, e.username, e.timestamp, v.username as creador
+            FROM {source} e
+            LEFT JOIN videos v ON v.video_id = e.video_id
+            WHERE e.id > %s
+            ORDER BY e.id
+            LIMIT %s
+        ''', (mark['ultimo_id'], batch_size))
+        events = safe_prefix(cur.fetchall(), mark['ultimo_id'], mark['now'], lag)
+        if not events:
+            conn.rollback()
+            return 0
+
+        counts, viewers = aggregate(events, count_viewers)
+
+        # Sólo cuentan como únicos los espectadores que no estaban ya
+        unique = {}
+        if viewers:
+            inserted = execute_values(cur, '''
+                INSERT INTO estadisticas_espectadores (alcance, clave, granularidad, bucket, username)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+                RETURNING alcance, clave, granularidad, bucket
+            ''', sorted(viewers), page_size=1000, fetch=True)
+            for row in inserted:
+                key = (row['alcance'], row['clave'], row['granularidad'], row['bucket'])
+                unique[key] = unique.get(key, 0) + 1
+
+        # En orden de clave, para que dos pasadas no se bloqueen mutuamente
+        execute_values(cur, f'''
+            INSERT INTO estadisticas (alcance, clave, granularidad, bucket, {column}, espectadores)
+            VALUES %s
+            ON CONFLICT (alcance, clave, granularidad, bucket) DO UPDATE
+            SET {column} = estadisticas.{column} + EXCLUDED.{column},
+                espectadores = estadisticas.espectadores + EXCLUDED.espectadores
+        ''', [key + (n, unique.get(key, 0)) for key, n in sorted(counts.items())], page_size=1000)
+
+        cur.execute('''
+            UPDATE estadisticas_marcas SET ultimo_id = %s, actualizado = NOW()
+            WHERE fuente = %s
+        ''', (events[-1]['id'], source))
+        conn.commit()
+        return len(events)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def prune_viewers(conn, days=None):
+    """Olvida los espectadores de los buckets de hace más de `days` días."""
+    days = VIEWER_RETENTION_DAYS if days is None else days
+    cur = conn.cursor()
+    cur.execute("DELETE FROM estadisticas_espectadores WHERE bucket < NOW() - %s * INTERVAL '1 day'",
+                (days,))
+    deleted = cur.rowcount
+    conn.commit()
+    cur.close()
+    return deleted
+
+
+def rollup_all(conn, sources=None, batch_size=None, max_batches=100):
+    """
+    Agrega lotes de cada tabla hasta ponerse al día (o max_batches lotes).
+    Devuelve {tabla: eventos agregados}.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    done = {}
+    for source in sources or SOURCES:
+        done[source] = 0
+        for _ in range(max_batches):
+            n = rollup_source(conn, source, batch_size)
+            done[source] += n
+            if n < batch_size:
+                break
+    return done
+
+
+class RollupWorker:
+    """Hilo que agrega los eventos nuevos cada `interval` segundos."""
+
+    def __init__(self, pool, interval=60.0):
+        self.pool = pool
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.runs = 0
+        self.events = 0
+        self.errors = 0
+
+    def ensure_started(self):
+        """Arranca el hilo (también en cada proceso hijo tras un fork) si hay intervalo."""
+        if not self.interval:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='analytics-rollup', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+    def run_once(self):
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            done = rollup_all(conn)
+            prune_viewers(conn)
+        except Exception as e:
+            print(f"Error agregando estadísticas: {e}")
+            if conn is not None:
+                self.pool.putconn(conn, discard=True)
+                conn = None
+            with self._lock:
+                self.errors += 1
+            return 0
+        finally:
+            if conn is not None:
+                self.pool.putconn(conn)
+        with self._lock:
+            self.runs += 1
+            self.events += sum(done.values())
+        return sum(done.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'events': self.events,
+                'errors': self.errors,
+            }
+
+
+def worker_from_settings(pool, settings):
+    return RollupWorker(pool, interval=settings['ANALYTICS_ROLLUP_INTERVAL'])
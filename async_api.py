@@ -0,0 +1,269 @@
+"""
+Modo asíncrono opcional para las lecturas de /api/*.
+
+Las lecturas que pasan casi todo el tiempo esperando a Postgres
+(all-videos, messages, conversations, comments) se sirven en asyncio con
+psycopg 3 y un pool de conexiones asíncrono: una petición que espera a la
+base de datos no ocupa un hilo, así que un proceso mantiene miles de
+peticiones en vuelo con unas pocas conexiones. El resto de rutas
+(escrituras, páginas, /metrics) se delegan a la app Flask de siempre, que
+corre en un pool de hilos (a2wsgi).
+
+    uvicorn async_api:app --workers 2 --port 8000
+
+Las consultas, el formato de las respuestas y los ETag salen de los mismos
+módulos que usa la app Flask (videos.py, comments.py, inbox.py y
+messages.py) y el serializador JSON es el suyo, así que las respuestas son
+idénticas a las del modo síncrono, 304 incluidos, salvo que aquí no hay
+compresión (ver compression.py). Los WebSockets de realtime.py no pasan
+por aquí: en este modo el chat usa ?since= o un servidor Socket.IO aparte
+que comparta SOCKETIO_MESSAGE_QUEUE.
+"""
+import time
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+import config
+import comments
+import etags
+import inbox
+import messages
+import profiles
+import videos
+from app import create_app
+from caches import feed_cache, comments_cache
+from metrics import registry
+from pagination import InvalidCursor
+
+settings = config.load()
+flask_app = create_app(settings)
+
+# Pool asíncrono del proceso; se abre en el arranque (lifespan) de ASGI
+pool = AsyncConnectionPool(
+    settings['DATABASE_URL'],
+    min_size=settings['ASYNC_DB_POOL_MIN'],
+    max_size=settings['ASYNC_DB_POOL_MAX'],
+    timeout=settings['DB_POOL_TIMEOUT'],
+    max_lifetime=settings['DB_POOL_MAX_LIFETIME'],
+    kwargs={'row_factory': dict_row},
+    open=False,
+)
+registry.gauge_callback('async_db_pool', pool.get_stats)
+
+# Rutas que no son de este módulo: la app Flask en hilos
+wsgi_app = WSGIMiddleware(flask_app, workers=settings['ASYNC_WSGI_THREADS'])
+
+
+async def fetchall(conn, sql, params=()):
+    cur = await conn.execute(sql, params)
+    return await cur.fetchall()
+
+
+async def get_profiles(usernames):
+    """
+    Como profiles.get_profiles, con la misma caché. Sólo toma una conexión
+    si falta algún perfil: llamarla sin tener otra conexión del pool.
+    """
+    found, missing, generation = profiles.split_cached(usernames)
+    if missing:
+        async with pool.connection() as conn:
+            rows = await fetchall(conn, profiles.PROFILE_QUERY, (missing,))
+        profiles.remember(rows, found, generation)
+    return found
+
+
+# ---------- Lecturas (consultas y formato en videos.py, comments.py, inbox.py y messages.py) ----------
+# Cada handler recibe la query string y If-None-Match y devuelve
+# (cuerpo, status, etag); con 304 el cuerpo es None.
+
+async def get_all_videos(args, if_none_match):
+    try:
+        current_user, limit, cursor, position = videos.read_args(args)
+    except InvalidCursor as e:
+        return {'success': False, 'message': str(e)}, 400, None
+
+    cache_key = videos.cache_key(cursor, limit)
+    generation = feed_cache.generation
+    page = feed_cache.get(cache_key)
+    if page is not None and not (current_user or if_none_match):
+        return (videos.response(page, videos.with_user_flags(page[0], [])), 200,
+                videos.page_etag(page, None, {}, cursor, limit))
+
+    async with pool.connection() as conn:
+        # Si otro proceso cambió la página cacheada se vuelve a leer
+        resources = videos.version_resources(current_user, page, if_none_match)
+        versions = {}
+        if resources:
+            versions = {row['recurso']: row['version'] for row in
+                        await fetchall(conn, etags.CURRENT_QUERY, (sorted(set(resources)),))}
+        if page is not None and videos.is_stale(page, versions):
+            page = None
+
+        if page is None:
+            page_versions = {row['recurso']: row['version'] for row in
+                             await fetchall(conn, etags.CURRENT_QUERY, ([etags.FEED],))}
+            rows = await fetchall(conn, *videos.page_query(position, limit))
+            page = videos.cache_page(cache_key, rows, limit, page_versions, generation)
+
+        etag = videos.page_etag(page, current_user, versions, cursor, limit)
+        if etags.matches(if_none_match, etag):
+            return None, 304, etag
+
+        params = videos.user_flags_params(current_user, page[0])
+        rows = await fetchall(conn, videos.USER_FLAGS_QUERY, params) if params else []
+
+    return videos.response(page, videos.with_user_flags(page[0], rows)), 200, etag
+
+
+async def get_comments(args, if_none_match):
+    try:
+        video_id, limit, cursor, position = comments.read_args(args)
+    except InvalidCursor as e:
+        return {'success': False, 'message': str(e)}, 400, None
+    if not video_id:
+        return {'success': False, 'message': 'Video ID requerido'}, 400, None
+
+    generation = comments_cache.generation
+    entry = None if cursor else comments_cache.get(video_id)
+    resource = etags.comments(video_id)
+
+    if entry is not None and if_none_match:
+        # Revalidar: si la versión no es la de la entrada, se vuelve a leer
+        async with pool.connection() as conn:
+            current = await fetchall(conn, etags.CURRENT_QUERY, ([resource],))
+        if current[0]['version'] != entry['version']:
+            entry = None
+
+    if entry is None:
+        async with pool.connection() as conn:
+            video = await fetchall(conn, comments.TOTAL_QUERY, (video_id,))
+            total = video[0]['total'] if video else 0
+            version = video[0]['version'] if video else 0
+            if cursor:
+                rows = await fetchall(conn, comments.PAGE_QUERY, comments.page_params(video_id, position, limit))
+                page, next_cursor = comments.page(rows, limit)
+            else:
+                rows = await fetchall(conn, comments.FIRST_PAGE_QUERY,
+                                      (video_id, comments.FIRST_PAGE_SIZE + 1))
+                entry = comments.cache_first_page(video_id, rows, total, version, generation)
+
+    if entry is not None:
+        page, next_cursor = comments.first_page(entry, limit)
+        total = entry['total']
+        version = entry['version']
+
+    etag = comments.page_etag(video_id, version, cursor, limit)
+    if etags.matches(if_none_match, etag):
+        return None, 304, etag
+
+    authors = await get_profiles([c['username'] for c in page])
+    return comments.response(page, authors, next_cursor, total), 200, etag
+
+
+async def get_conversations(args, if_none_match):
+    username = args.get('user')
+    if not username:
+        return {'success': False, 'message': 'Usuario requerido'}, 400, None
+
+    async with pool.connection() as conn:
+        conversations = await fetchall(conn, inbox.CONVERSATIONS_QUERY, (username,))
+    contacts = await get_profiles([conv['username'] for conv in conversations])
+
+    return {'success': True, 'data': inbox.with_contacts(conversations, contacts)}, 200, None
+
+
+async def get_messages(args, if_none_match):
+    try:
+        user1, user2, limit, since, before = messages.read_args(args)
+    except InvalidCursor as e:
+        return {'success': False, 'message': str(e)}, 400, None
+    if not all([user1, user2]):
+        return {'success': False, 'message': 'Usuarios requeridos'}, 400, None
+
+    if since:
+        queries = messages.sync_queries(user1, user2, since, limit)
+    else:
+        queries = messages.page_queries(user1, user2, before, limit)
+    async with pool.connection() as conn:
+        results = [await fetchall(conn, sql, params) for sql, params in queries]
+
+    if since:
+        return messages.sync_response(results, since, limit), 200, None
+    return messages.page_response(results, before, limit), 200, None
+
+
+# Ruta -> (nombre de endpoint en Flask, handler). Sólo GET.
+ROUTES = {
+    '/api/all-videos': ('videos_api.get_all_videos', get_all_videos),
+    '/api/comments': ('videos_api.get_comments', get_comments),
+    '/api/conversations': ('messages_api.get_conversations', get_conversations),
+    '/api/messages': ('messages_api.get_messages', get_messages),
+}
+
+
+# ---------- ASGI ----------
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await pool.open()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await pool.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        # WebSocket: no se sirve en este modo
+        await receive()
+        await send({'type': 'websocket.close', 'code': 1000})
+        return
+
+    route = ROUTES.get(scope['path']) if scope['method'] == 'GET' else None
+    if route is None:
+        return await wsgi_app(scope, receive, send)
+
+    endpoint, handler = route
+    start = time.perf_counter()
+    # Como request.args.get de Flask: el primer valor de cada parámetro
+    args = {key: values[0] for key, values in
+            parse_qs(scope['query_string'].decode(), keep_blank_values=True).items()}
+    if_none_match = dict(scope['headers']).get(b'if-none-match', b'').decode('latin-1') or None
+    try:
+        body, status, etag = await handler(args, if_none_match)
+    except PoolTimeout as e:
+        print(f"Error conectando a la base de datos: {e}")
+        body, status, etag = {'success': False, 'message': 'Error de conexión'}, 500, None
+    except Exception as e:
+        print(f"Error en {endpoint} (async): {e}")
+        body, status, etag = {'success': False, 'message': str(e)}, 500, None
+
+    headers = []
+    payload = b''
+    if body is not None:
+        # Mismo serializador (fechas, orden de claves) que jsonify en la app Flask
+        response = flask_app.json.response(body)
+        payload = response.get_data()
+        headers.append((b'content-type', response.mimetype.encode()))
+    headers.append((b'content-length', str(len(payload)).encode()))
+    if etag:
+        # Como etags.tagged / etags.not_modified
+        headers += [(b'etag', etag.encode()), (b'cache-control', b'no-cache')]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': payload})
+
+    registry.observe('http_request_duration_seconds', time.perf_counter() - start,
+                     endpoint=endpoint, method='GET', status=status)
+    registry.observe('http_response_bytes', len(payload), endpoint=endpoint)
@@ -0,0 +1,905 @@
+"""
+Benchmark de carga reproducible de los endpoints /api/*.
+
+Se ejecuta contra un Postgres local desechable (BENCH_DATABASE_URL) en una
+sola máquina. Tres pasos:
+
+    # 1. Migrar y sembrar (determinista: misma escala = mismos datos)
+    BENCH_DATABASE_URL=postgresql://localhost/likering_bench \\
+        python bench.py seed --scale 5 --mensajes 10000000
+
+    # 2. Arrancar la app con gunicorn y lanzar la mezcla de peticiones
+    BENCH_DATABASE_URL=... python bench.py run --serve --duration 60 \\
+        --concurrency 16 --out bench-$(git rev-parse --short HEAD).json
+
+    # 3. Comparar dos commits (sale con 1 si el p95 empeora más de lo permitido)
+    python bench.py compare bench-abc123.json bench-def456.json --max-regression 10
+
+    # Modo síncrono (gunicorn) frente al asíncrono (uvicorn, async_api.py)
+    # con la mezcla de lecturas; antes comprueba que el JSON coincide
+    BENCH_DATABASE_URL=... python bench.py sync-vs-async --concurrency 256
+
+    # Presupuesto de latencia del ranking del feed (ranking.py), sin base de
+    # datos: sale con 1 si el p95 de ordenar 1M candidatos pasa de --budget-ms
+    python bench.py ranking --candidates 1000000 --budget-ms 30
+
+    # Lo mismo para el autocompletado de nombres de usuario (search.py)
+    python bench.py autocomplete --users 1000000 --budget-ms 10
+
+    # Arranque en frío: importar la app y crearla, memoria por proceso y
+    # sale con 1 si se importa alguna librería de ML (HEAVY_MODULES). Con
+    # --serve arranca además gunicorn (preload_app) y mide cada worker
+    python bench.py startup --serve --workers 4
+
+La carga escribe (likes, comentarios, mensajes...): para que dos ejecuciones
+sean comparables hay que volver a sembrar antes de cada `run`.
+¡seed vacía las tablas de esa base! Nunca apuntar a la base de producción.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+import requests
+
+import migrate
+import ranking
+import search
+import seed
+
+# Mezcla de peticiones: escenario -> peso relativo. Aproxima el uso real de
+# la app: mucho feed y vistas, polling del chat y pocas escrituras pesadas.
+DEFAULT_MIX = {
+    'feed': 25,
+    'feed_next_page': 5,
+    'record_view': 20,
+    'like_video': 6,
+    'comments': 7,
+    'add_comment': 2,
+    'user_profile': 4,
+    'user_videos': 3,
+    'follow_user': 2,
+    'conversations': 6,
+    'messages_poll': 10,
+    'messages_open': 3,
+    'send_message': 3,
+    'mark_as_read': 2,
+    'batch': 1,
+    'batch_follow': 1,
+    'login': 1,
+}
+
+# Sólo las lecturas que sirve async_api.py: no modifica los datos, así que
+# se puede repetir contra los dos modos sin volver a sembrar
+READ_MIX = {
+    'feed': 40,
+    'feed_next_page': 10,
+    'comments': 15,
+    'conversations': 15,
+    'messages_open': 5,
+    'messages_poll': 15,
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def skewed(rng, n, power=2):
+    """Número en 1..n con sesgo hacia los más bajos (los populares del seed)."""
+    return 1 + int(n * rng.random() ** power)
+
+
+class Worker(threading.Thread):
+    """
+    Cliente en bucle cerrado: elige un escenario según la mezcla, lo ejecuta
+    y anota la latencia. Cada worker tiene su propio random con semilla fija,
+    así la secuencia de peticiones se repite entre ejecuciones.
+    """
+
+    def __init__(self, index, base_url, dataset, mix, seed_value, measure_from, stop_at):
+        super().__init__(daemon=True)
+        self.base_url = base_url.rstrip('/')
+        self.users = dataset['usuarios']
+        self.videos = dataset['videos']
+        self.rng = random.Random(seed_value * 1000 + index)
+        self.scenarios = list(mix)
+        self.weights = [mix[name] for name in self.scenarios]
+        self.measure_from = measure_from
+        self.stop_at = stop_at
+        self.session = requests.Session()
+        self.results = {}         # escenario -> {'latencies': [], 'errors': 0, ...}
+        self.feed_cursor = None
+        self.chat_cursors = {}    # (user1, user2) -> cursor de sincronización
+
+    # ---------- Datos aleatorios ----------
+
+    def user(self, power=1):
+        return f'user_{skewed(self.rng, self.users, power)}'
+
+    def video(self):
+        return f'video_{skewed(self.rng, self.videos)}'
+
+    def chat_pair(self):
+        # Un 20% de las veces la conversación fija user_1/user_2 (la más larga)
+        if self.rng.random() < 0.2:
+            return 'user_1', 'user_2'
+        return self.user(2), self.user()
+
+    # ---------- Escenarios ----------
+
+    def get(self, path, **params):
+        return self.session.get(self.base_url + path, params=params, timeout=30)
+
+    def post(self, path, body):
+        return self.session.post(self.base_url + path, json=body, timeout=30)
+
+    def do_feed(self):
+        response = self.get('/api/all-videos', user=self.user(), limit=20)
+        if response.ok:
+            self.feed_cursor = response.json().get('nextCursor')
+        return response
+
+    def do_feed_next_page(self):
+        if not self.feed_cursor:
+            return self.do_feed()
+        response = self.get('/api/all-videos', user=self.user(), limit=20, cursor=self.feed_cursor)
+        if response.ok:
+            self.feed_cursor = response.json().get('nextCursor')
+        return response
+
+    def do_record_view(self):
+        return self.post('/api/record-view', {'videoId': self.video(), 'username': self.user()})
+
+    def do_like_video(self):
+        return self.post('/api/like-video', {'videoId': self.video(), 'username': self.user()})
+
+    def do_comments(self):
+        return self.get('/api/comments', videoId=self.video())
+
+    def do_add_comment(self):
+        return self.post('/api/add-comment', {'videoId': self.video(), 'username': self.user(),
+                                              'commentText': 'Comentario de benchmark'})
+
+    def do_user_profile(self):
+        return self.get('/api/user-profile', user=self.user(3))
+
+    def do_user_videos(self):
+        return self.get('/api/user-videos', user=self.user(3))
+
+    def do_follow_user(self):
+        return self.post('/api/follow-user', {'follower': self.user(), 'following': self.user(3)})
+
+    def do_conversations(self):
+        return self.get('/api/conversations', user=self.user(2))
+
+    def do_messages_open(self):
+        user1, user2 = self.chat_pair()
+        response = self.get('/api/messages', user1=user1, user2=user2, limit=50)
+        if response.ok:
+            self.chat_cursors[(user1, user2)] = response.json().get('cursor')
+        return response
+
+    def do_messages_poll(self):
+        if not self.chat_cursors:
+            return self.do_messages_open()
+        pair = self.rng.choice(sorted(self.chat_cursors))
+        cursor = self.chat_cursors[pair]
+        if not cursor:
+            return self.do_messages_open()
+        response = self.get('/api/messages', user1=pair[0], user2=pair[1], since=cursor)
+        if response.ok:
+            self.chat_cursors[pair] = response.json().get('cursor') or cursor
+        return response
+
+    def do_send_message(self):
+        sender, receiver = self.chat_pair()
+        return self.post('/api/send-message', {'from': sender, 'to': receiver,
+                                               'message': 'Mensaje de benchmark'})
+
+    def do_mark_as_read(self):
+        sender, receiver = self.chat_pair()
+        return self.post('/api/mark-as-read', {'from': sender, 'to': receiver})
+
+    def do_batch(self):
+        video, user = self.video(), self.user()
+        return self.post('/api/batch', {'actions': [
+            {'type': 'view', 'videoId': video, 'username': user},
+            {'type': 'like', 'videoId': video, 'username': user},
+            {'type': 'view', 'videoId': self.video(), 'username': user},
+        ]})
+
+    def do_batch_follow(self):
+        # Lote sólo de seguimientos (sin likes en la misma sentencia)
+        return self.post('/api/batch', {'actions': [
+            {'type': 'follow', 'follower': self.user(), 'following': self.user(3)},
+        ]})
+
+    def do_login(self):
+        return self.post('/api/login', {'username': self.user(), 'password': seed.SEED_PASSWORD})
+
+    # ---------- Bucle ----------
+
+    def record(self, name, elapsed, status):
+        result = self.results.setdefault(name, {'latencies': [], 'errors': 0, 'rejected': 0,
+                                                'client_errors': 0})
+        result['latencies'].append(elapsed)
+        if status is None or status >= 500:
+            # 503 de record-view es contrapresión, no un fallo
+            if status == 503 and name == 'record_view':
+                result['rejected'] += 1
+            else:
+                result['errors'] += 1
+        elif status >= 400:
+            result['client_errors'] += 1
+
+    def run(self):
+        while True:
+            name = self.rng.choices(self.scenarios, self.weights)[0]
+            start = time.perf_counter()
+            if start >= self.stop_at:
+                break
+            try:
+                status = getattr(self, 'do_' + name)().status_code
+            except requests.RequestException as e:
+                print(f"Error en {name}: {e}")
+                status = None
+            if start >= self.measure_from:
+                self.record(name, time.perf_counter() - start, status)
+
+
+def percentile(sorted_values, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(workers, duration):
+    """Une los resultados de los workers en estadísticas por escenario."""
+    merged = {}
+    for worker in workers:
+        for name, result in worker.results.items():
+            target = merged.setdefault(name, {'latencies': [], 'errors': 0, 'rejected': 0,
+                                              'client_errors': 0})
+            target['latencies'] += result['latencies']
+            for key in ('errors', 'rejected', 'client_errors'):
+                target[key] += result[key]
+
+    endpoints = {}
+    for name in sorted(merged):
+        result = merged[name]
+        latencies = sorted(result['latencies'])
+        stats = {
+            'count': len(latencies),
+            'errors': result['errors'],
+            'rejected': result['rejected'],
+            'client_errors': result['client_errors'],
+            'rps': round(len(latencies) / duration, 2),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3),
+        }
+        for p in PERCENTILES:
+            stats[f'p{p}_ms'] = round(percentile(latencies, p) * 1000, 3)
+        endpoints[name] = stats
+
+    all_latencies = sorted(l for r in merged.values() for l in r['latencies'])
+    total = {
+        'count': len(all_latencies),
+        'errors': sum(r['errors'] for r in merged.values()),
+        'rps': round(len(all_latencies) / duration, 2),
+    }
+    for p in PERCENTILES:
+        total[f'p{p}_ms'] = round(percentile(all_latencies, p) * 1000, 3)
+    return total, endpoints
+
+
+def dataset_size(conn):
+    """Usuarios y videos exactos (definen los nombres válidos) y filas estimadas del resto."""
+    cur = conn.cursor()
+    cur.execute('SELECT COUNT(*) FROM usuarios')
+    size = {'usuarios': cur.fetchone()[0]}
+    cur.execute('SELECT COUNT(*) FROM videos')
+    size['videos'] = cur.fetchone()[0]
+    cur.execute('''
+        SELECT relname, reltuples::bigint FROM pg_class
+        WHERE relkind = 'r' AND relname = ANY(%s)
+    ''', (seed.SEEDED_TABLES,))
+    for table, rows in cur.fetchall():
+        size.setdefault(table, max(rows, 0))
+    conn.rollback()
+    cur.close()
+    return size
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def start_server(dsn, port, workers, threads, mode='sync'):
+    """
+    Arranca la app apuntando a la base del benchmark: 'sync' es gunicorn
+    con hilos (app.py) y 'async' es uvicorn (async_api.py). Ambos abren
+    como mucho `threads` conexiones por worker.
+    """
+    env = dict(os.environ, DATABASE_URL=dsn)
+    env.setdefault('DB_POOL_MAX', str(threads))
+    env.setdefault('ASYNC_DB_POOL_MAX', str(threads))
+    env.setdefault('SLOW_QUERY_MS', '')
+    # Toda la carga sale de una IP y unos pocos usuarios populares: sin
+    # desactivar el control de admisión (admission.py) se mediría el 429
+    env.setdefault('ADMISSION_ENABLED', '0')
+    if mode == 'async':
+        command = ['uvicorn', 'async_api:app', '--workers', str(workers), '--host', '127.0.0.1',
+                   '--port', str(port), '--log-level', 'warning', '--no-access-log']
+    else:
+        command = ['gunicorn', '-c', 'gunicorn.conf.py', '-w', str(workers), '--threads', str(threads),
+                   '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:create_app()']
+    server = subprocess.Popen([sys.executable, '-m'] + command, env=env,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL)
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'{command[0]} terminó con código {server.returncode}')
+        try:
+            requests.get(url + '/api/db-pool-stats', timeout=1)
+            return server, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('La app no respondió en 30s')
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def parse_mix(value):
+    """
+    'feed=30,record_view=20' -> dict; los escenarios no citados mantienen su
+    peso. 'reads' es la mezcla de sólo lecturas (READ_MIX).
+    """
+    if value == 'reads':
+        return dict(READ_MIX)
+    mix = dict(DEFAULT_MIX)
+    if value:
+        for item in value.split(','):
+            name, _, weight = item.partition('=')
+            name = name.strip()
+            if name not in DEFAULT_MIX:
+                raise argparse.ArgumentTypeError(f'Escenario desconocido: {name}')
+            mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def print_report(report):
+    print(f"\n{'escenario':<16} {'n':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err':>5}")
+    for name, s in report['endpoints'].items():
+        print(f"{name:<16} {s['count']:>7} {s['rps']:>8} {s['p50_ms']:>9} {s['p95_ms']:>9} "
+              f"{s['p99_ms']:>9} {s['errors']:>5}")
+    t = report['total']
+    print(f"{'TOTAL':<16} {t['count']:>7} {t['rps']:>8} {t['p50_ms']:>9} {t['p95_ms']:>9} "
+          f"{t['p99_ms']:>9} {t['errors']:>5}")
+
+
+# ---------- Comandos ----------
+
+def bench_dsn():
+    dsn = os.getenv('BENCH_DATABASE_URL')
+    if not dsn:
+        print('Define BENCH_DATABASE_URL con una base de datos local desechable')
+    return dsn
+
+
+def cmd_seed(args):
+    dsn = bench_dsn()
+    if not dsn:
+        return 2
+    overrides = {table: getattr(args, table) for table in seed.DEFAULT_COUNTS}
+    counts = seed.seed_counts(args.scale, **overrides)
+    conn = psycopg2.connect(dsn)
+    print('Aplicando migraciones:', ', '.join(migrate.migrate(conn)) or 'ninguna pendiente')
+    print('Sembrando:', ', '.join(f'{t}={n}' for t, n in counts.items()))
+    start = time.monotonic()
+    seed.seed(conn, counts)
+    conn.close()
+    print(f"Seed completado en {time.monotonic() - start:.1f}s")
+    return 0
+
+
+def run_load(url, dataset, args):
+    """Lanza los clientes contra url y devuelve (total, por escenario)."""
+    now = time.perf_counter()
+    measure_from = now + args.warmup
+    stop_at = measure_from + args.duration
+    workers = [Worker(i, url, dataset, args.mix, args.seed, measure_from, stop_at)
+               for i in range(args.concurrency)]
+    print(f"{args.concurrency} clientes contra {url}: {args.warmup}s de calentamiento "
+          f"+ {args.duration}s medidos")
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return summarize(workers, args.duration)
+
+
+def make_report(args, url, server, dataset, total, endpoints):
+    commit, dirty = git_revision()
+    return {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'url': url,
+            'server': server,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'mix': args.mix,
+            'dataset': dataset,
+        },
+        'total': total,
+        'endpoints': endpoints,
+    }
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados guardados en {path}")
+
+
+def load_dataset():
+    dsn = bench_dsn()
+    if not dsn:
+        return None, None
+    conn = psycopg2.connect(dsn)
+    dataset = dataset_size(conn)
+    conn.close()
+    if not dataset['usuarios'] or not dataset['videos']:
+        print('La base está vacía: ejecuta antes `python bench.py seed`')
+        return None, None
+    return dsn, dataset
+
+
+def cmd_run(args):
+    dsn, dataset = load_dataset()
+    if not dsn:
+        return 2
+
+    server = None
+    url = args.url
+    if args.serve:
+        server, url = start_server(dsn, args.port, args.workers, args.threads, args.mode)
+    try:
+        total, endpoints = run_load(url, dataset, args)
+    finally:
+        if server is not None:
+            stop_server(server)
+
+    server_info = ({'mode': args.mode, 'workers': args.workers, 'threads': args.threads}
+                   if args.serve else None)
+    report = make_report(args, url, server_info, dataset, total, endpoints)
+    print_report(report)
+    if args.out:
+        save_report(report, args.out)
+    return 0
+
+
+def contract_requests(base_url):
+    """Peticiones de lectura cuyo JSON debe coincidir en los dos modos."""
+    feed = requests.get(base_url + '/api/all-videos', params={'user': 'user_2', 'limit': 5}).json()
+    chat = requests.get(base_url + '/api/messages', params={'user1': 'user_1', 'user2': 'user_2'}).json()
+    comments = requests.get(base_url + '/api/comments', params={'videoId': 'video_1', 'limit': 5}).json()
+    return [
+        ('/api/all-videos', {'user': 'user_2', 'limit': 5}),
+        ('/api/all-videos', {'limit': 5}),
+        ('/api/all-videos', {'user': 'user_2', 'limit': 5, 'cursor': feed.get('nextCursor')}),
+        ('/api/all-videos', {'cursor': 'no-es-un-cursor'}),
+        ('/api/comments', {'videoId': 'video_1'}),
+        ('/api/comments', {'videoId': 'video_1', 'limit': 5, 'cursor': comments.get('nextCursor')}),
+        ('/api/comments', {}),
+        ('/api/conversations', {'user': 'user_1'}),
+        ('/api/messages', {'user1': 'user_1', 'user2': 'user_2', 'limit': 10}),
+        ('/api/messages', {'user1': 'user_1', 'user2': 'user_2', 'before': chat.get('prevCursor')}),
+        ('/api/messages', {'user1': 'user_1', 'user2': 'user_2', 'since': chat.get('cursor')}),
+    ]
+
+
+def check_contracts(sync_url, async_url):
+    """Compara las respuestas de ambos modos; devuelve las rutas que difieren."""
+    mismatches = []
+    for path, params in contract_requests(sync_url):
+        responses = []
+        for base_url in (sync_url, async_url):
+            response = requests.get(base_url + path, params=params, timeout=30)
+            body = response.json()
+            if path == '/api/messages' and 'before' not in params and 'since' not in params:
+                # El cursor de sincronización inicial lleva NOW() del servidor
+                body.pop('cursor', None)
+            responses.append((response.status_code, body))
+        if responses[0] != responses[1]:
+            mismatches.append(f"{path} {params}")
+    return mismatches
+
+
+def cmd_sync_vs_async(args):
+    dsn, dataset = load_dataset()
+    if not dsn:
+        return 2
+
+    sync_server, sync_url = start_server(dsn, args.port, args.workers, args.threads, 'sync')
+    try:
+        async_server, async_url = start_server(dsn, args.port + 1, args.workers, args.threads, 'async')
+    except Exception:
+        stop_server(sync_server)
+        raise
+    try:
+        mismatches = check_contracts(sync_url, async_url)
+        if mismatches:
+            print('Las respuestas no coinciden entre modos:\n  ' + '\n  '.join(mismatches))
+            return 1
+        print('Contrato JSON idéntico en ambos modos')
+
+        reports = []
+        for mode, url in (('sync', sync_url), ('async', async_url)):
+            total, endpoints = run_load(url, dataset, args)
+            server_info = {'mode': mode, 'workers': args.workers, 'threads': args.threads}
+            reports.append(make_report(args, url, server_info, dataset, total, endpoints))
+    finally:
+        stop_server(sync_server)
+        stop_server(async_server)
+
+    for report in reports:
+        print(f"\nModo {report['meta']['server']['mode']}:")
+        print_report(report)
+    print()
+    print_comparison(*reports)
+    if args.out:
+        save_report({'sync': reports[0], 'async': reports[1]}, args.out)
+    return 0
+
+
+def delta(old, new):
+    if not old:
+        return ''
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def print_comparison(base, new, max_regression=None):
+    """Tabla de diferencias entre dos informes; devuelve los escenarios con regresión del p95."""
+    for label, report in (('base', base), ('nuevo', new)):
+        meta = report['meta']
+        print(f"{label}: {meta['commit']}{' (con cambios)' if meta['dirty'] else ''} "
+              f"c={meta['concurrency']} {meta['duration']}s dataset={meta['dataset']}")
+    if base['meta']['dataset'] != new['meta']['dataset'] or base['meta']['mix'] != new['meta']['mix']:
+        print('Aviso: los datos o la mezcla no coinciden, la comparación no es fiable')
+
+    print(f"\n{'escenario':<16} {'rps':>16} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18}")
+    regressions = []
+    rows = list(base['endpoints'].items()) + [('TOTAL', base['total'])]
+    for name, old in rows:
+        current = new['total'] if name == 'TOTAL' else new['endpoints'].get(name)
+        if current is None:
+            print(f"{name:<16} (no aparece en el nuevo)")
+            continue
+        cells = [f"{current['rps']:>8} {delta(old['rps'], current['rps']):>7}"]
+        for p in PERCENTILES:
+            key = f'p{p}_ms'
+            cells.append(f"{current[key]:>9} {delta(old[key], current[key]):>8}")
+        print(f"{name:<16} " + ' '.join(cells))
+        if (max_regression is not None and old['p95_ms']
+                and (current['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 > max_regression):
+            regressions.append(name)
+    return regressions
+
+
+def cmd_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    regressions = print_comparison(base, new, args.max_regression)
+    if regressions:
+        print(f"\nFALLO: el p95 empeora más de un {args.max_regression}% en: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def cmd_ranking(args):
+    rng = random.Random(args.seed)
+    ranker = ranking.FeedRanker(pool=None)
+    now = time.time()
+    start = time.monotonic()
+    for first in range(0, args.candidates, 10000):
+        ranker.upsert_videos([{
+            'video_id': f'video_{i}',
+            'username': f'user_{skewed(rng, args.creators, 3)}',
+            'likes': int(1000 * rng.random() ** 4),
+            'visualizaciones': int(20000 * rng.random() ** 4),
+            'comentarios': int(200 * rng.random() ** 4),
+            'subida': now - 90 * 86400 * rng.random(),
+        } for i in range(first + 1, min(first + 10000, args.candidates) + 1)])
+    ranker.update_creators([{'username': f'user_{i}', 'followers': int(100000 / i)}
+                            for i in range(1, args.creators + 1)])
+    print(f"{args.candidates} candidatos de {args.creators} creadores cargados en "
+          f"{time.monotonic() - start:.1f}s")
+
+    latencies = []
+    for _ in range(args.repeat):
+        followed = [f'user_{skewed(rng, args.creators)}' for _ in range(args.follows)]
+        ranker.rank(followed, k=args.k, exclude_creator=f'user_{skewed(rng, args.creators)}')
+        latencies.append(ranker.last_rank_ms)
+    latencies.sort()
+    p50, p95 = percentile(latencies, 50), percentile(latencies, 95)
+    print(f"rank(k={args.k}, {args.follows} seguidos): p50 {p50:.1f} ms, p95 {p95:.1f} ms, "
+          f"máx {latencies[-1]:.1f} ms")
+    if p95 > args.budget_ms:
+        print(f"FALLO: el p95 pasa del presupuesto de {args.budget_ms} ms")
+        return 1
+    return 0
+
+
+# Librerías que no pueden cargarse al servir peticiones (requirements-ml.txt)
+HEAVY_MODULES = ['torch', 'torchvision', 'torchaudio', 'tensorflow', 'transformers', 'diffusers',
+                 'ultralytics', 'cv2', 'accelerate', 'peft', 'safetensors', 'tokenizers',
+                 'huggingface_hub', 'scipy', 'sklearn', 'matplotlib', 'sympy']
+
+# Se ejecuta en un intérprete nuevo: importa la app como gunicorn con
+# preload_app y describe el proceso en una línea JSON
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+with open('/proc/self/status') as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+print(json.dumps({'import_ms': (imported - start) * 1000, 'create_ms': (created - imported) * 1000,
+                  'rss_kb': rss, 'modules': sorted(sys.modules)}))
+"""
+
+
+def memory_kb(pid):
+    """(RSS, PSS) en kB del proceso; PSS reparte las páginas compartidas tras el fork."""
+    with open(f'/proc/{pid}/status') as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            pss = next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+    except (OSError, StopIteration):
+        pss = None
+    return rss, pss
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # El nombre del proceso va entre paréntesis y puede tener espacios
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def cmd_startup(args):
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', os.getenv('BENCH_DATABASE_URL') or 'postgresql://localhost/likering_bench')
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    runs = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE], env=env, cwd=cwd,
+                               capture_output=True, text=True)
+        total_ms = (time.perf_counter() - start) * 1000
+        if probe.returncode != 0:
+            print(probe.stderr)
+            print('FALLO: la app no se pudo importar')
+            return 1
+        result = json.loads(probe.stdout.strip().splitlines()[-1])
+        result['total_ms'] = total_ms
+        runs.append(result)
+
+    def median(key):
+        return percentile(sorted(r[key] for r in runs), 50)
+
+    modules = runs[0]['modules']
+    print(f"Arranque en frío ({args.repeat} veces, mediana): {median('total_ms'):.0f} ms en total "
+          f"(import app {median('import_ms'):.0f} ms, create_app {median('create_ms'):.0f} ms), "
+          f"RSS {median('rss_kb') / 1024:.1f} MB, {len(modules)} módulos")
+
+    heavy = sorted({m.split('.')[0] for m in modules} & set(HEAVY_MODULES))
+    failed = False
+    if heavy:
+        print(f"FALLO: la app importa librerías pesadas: {', '.join(heavy)}")
+        failed = True
+    if args.budget_ms and median('total_ms') > args.budget_ms:
+        print(f"FALLO: el arranque pasa del presupuesto de {args.budget_ms} ms")
+        failed = True
+
+    if args.serve:
+        start = time.perf_counter()
+        server, _ = start_server(env['DATABASE_URL'], args.port, args.workers, args.threads)
+        try:
+            ready_ms = (time.perf_counter() - start) * 1000
+            deadline = time.monotonic() + 10
+            workers = child_pids(server.pid)
+            while len(workers) < args.workers and time.monotonic() < deadline:
+                time.sleep(0.1)
+                workers = child_pids(server.pid)
+            print(f"gunicorn (preload_app, {args.workers} workers): primera respuesta en {ready_ms:.0f} ms")
+            for label, pid in [('maestro', server.pid)] + [(f'worker {pid}', pid) for pid in workers]:
+                rss, pss = memory_kb(pid)
+                shared = f", PSS {pss / 1024:.1f} MB" if pss is not None else ''
+                print(f"  {label:<14} RSS {rss / 1024:.1f} MB{shared}")
+                if args.max_rss_mb and label != 'maestro' and rss / 1024 > args.max_rss_mb:
+                    print(f"FALLO: {label} pasa de {args.max_rss_mb} MB de RSS")
+                    failed = True
+        finally:
+            stop_server(server)
+    return 1 if failed else 0
+
+
+# Sílabas para nombres de usuario sintéticos parecidos a los reales
+SYLLABLES = ['ma', 'ri', 'an', 'jo', 'se', 'lu', 'ca', 'pe', 'dro', 'la', 'na', 'to',
+             'vi', 'el', 'ra', 'mon', 'te', 'sa', 'gi', 'ol', 'fer', 'nan', 'do', 'xi']
+
+
+def cmd_autocomplete(args):
+    rng = random.Random(args.seed)
+
+    def name():
+        base = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        separator = rng.choice(['', '_', '.'])
+        return base + separator + (str(rng.randint(1, 9999)) if rng.random() < 0.6 else '')
+
+    names = {name() for _ in range(args.users)}
+    while len(names) < args.users:
+        names.add(name() + str(len(names)))
+    names = list(names)
+    index = search.UsernameIndex(pool=None)
+    start = time.monotonic()
+    index.build(names)
+    print(f"{len(index)} nombres indexados en {time.monotonic() - start:.1f}s")
+    for i in range(args.recent):
+        index.add(f'{name()}_nuevo{i}')
+
+    latencies = []
+    for _ in range(args.repeat):
+        sample = rng.choice(names).lower()
+        if rng.random() < 0.7:
+            text = sample[:rng.randint(1, min(6, len(sample)))]
+        else:
+            first = rng.randint(1, max(1, len(sample) - 3))
+            text = sample[first:first + rng.randint(3, 5)]
+        start = time.perf_counter()
+        index.complete(text, args.limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p50, p95 = percentile(latencies, 50), percentile(latencies, 95)
+    print(f"complete(limit={args.limit}): p50 {p50:.2f} ms, p95 {p95:.2f} ms, máx {latencies[-1]:.2f} ms")
+    if p95 > args.budget_ms:
+        print(f"FALLO: el p95 pasa del presupuesto de {args.budget_ms} ms")
+        return 1
+    return 0
+
+
+def add_load_arguments(parser, concurrency, mix):
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help='Workers del servidor (con --serve)')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Hilos (sync) o conexiones del pool (async) por worker')
+    parser.add_argument('--concurrency', type=int, default=concurrency, help='Clientes simultáneos')
+    parser.add_argument('--duration', type=float, default=30, help='Segundos medidos')
+    parser.add_argument('--warmup', type=float, default=5, help='Segundos de calentamiento sin medir')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla de la secuencia de peticiones')
+    parser.add_argument('--mix', type=parse_mix, default=dict(mix),
+                        help='Pesos a cambiar, p. ej. "feed=40,login=0", o "reads"')
+    parser.add_argument('--out', help='Fichero JSON de resultados')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de carga de la API contra un Postgres local')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='Migrar y sembrar BENCH_DATABASE_URL')
+    seed_parser.add_argument('--scale', type=float, default=1.0, help='Multiplica seed.DEFAULT_COUNTS')
+    for table in seed.DEFAULT_COUNTS:
+        seed_parser.add_argument(f'--{table}', type=int, default=None, help=f'Filas de {table} (ignora la escala)')
+    seed_parser.set_defaults(func=cmd_seed)
+
+    run_parser = commands.add_parser('run', help='Lanzar la carga y medir')
+    target = run_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--serve', action='store_true', help='Arrancar la app (ver --mode) contra BENCH_DATABASE_URL')
+    target.add_argument('--url', help='App ya arrancada contra BENCH_DATABASE_URL')
+    run_parser.add_argument('--mode', choices=['sync', 'async'], default='sync',
+                            help='Con --serve: gunicorn (app.py) o uvicorn (async_api.py)')
+    add_load_arguments(run_parser, concurrency=16, mix=DEFAULT_MIX)
+    run_parser.set_defaults(func=cmd_run)
+
+    versus_parser = commands.add_parser('sync-vs-async',
+                                        help='Comparar gunicorn y uvicorn con la mezcla de lecturas')
+    add_load_arguments(versus_parser, concurrency=128, mix=READ_MIX)
+    versus_parser.set_defaults(func=cmd_sync_vs_async)
+
+    ranking_parser = commands.add_parser('ranking', help='Presupuesto de latencia del ranking del feed')
+    ranking_parser.add_argument('--candidates', type=int, default=1000000, help='Videos candidatos')
+    ranking_parser.add_argument('--creators', type=int, default=100000)
+    ranking_parser.add_argument('--follows', type=int, default=200, help='Creadores seguidos por el usuario')
+    ranking_parser.add_argument('--k', type=int, default=50, help='Videos por petición')
+    ranking_parser.add_argument('--repeat', type=int, default=50)
+    ranking_parser.add_argument('--budget-ms', type=float, default=30, help='p95 máximo en ms')
+    ranking_parser.add_argument('--seed', type=int, default=42)
+    ranking_parser.set_defaults(func=cmd_ranking)
+
+    autocomplete_parser = commands.add_parser('autocomplete',
+                                              help='Presupuesto de latencia del autocompletado de usuarios')
+    autocomplete_parser.add_argument('--users', type=int, default=1000000)
+    autocomplete_parser.add_argument('--recent', type=int, default=1000,
+                                     help='Nombres añadidos después de construir el índice')
+    autocomplete_parser.add_argument('--limit', type=int, default=10)
+    autocomplete_parser.add_argument('--repeat', type=int, default=2000)
+    autocomplete_parser.add_argument('--budget-ms', type=float, default=10, help='p95 máximo en ms')
+    autocomplete_parser.add_argument('--seed', type=int, default=42)
+    autocomplete_parser.set_defaults(func=cmd_autocomplete)
+
+    startup_parser = commands.add_parser('startup',
+                                         help='Tiempo de arranque, memoria por worker y librerías importadas')
+    startup_parser.add_argument('--repeat', type=int, default=5, help='Arranques en frío medidos')
+    startup_parser.add_argument('--budget-ms', type=float, default=None,
+                                help='Mediana máxima del arranque en frío (intérprete, import y create_app) en ms')
+    startup_parser.add_argument('--serve', action='store_true',
+                                help='Arrancar también gunicorn y medir la memoria de cada worker')
+    startup_parser.add_argument('--port', type=int, default=8765)
+    startup_parser.add_argument('--workers', type=int, default=2)
+    startup_parser.add_argument('--threads', type=int, default=8)
+    startup_parser.add_argument('--max-rss-mb', type=float, default=None, help='RSS máximo por worker')
+    startup_parser.set_defaults(func=cmd_startup)
+
+    compare_parser = commands.add_parser('compare', help='Comparar dos resultados JSON')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--max-regression', type=float, default=None,
+                                help='Porcentaje de empeoramiento del p95 que hace fallar')
+    compare_parser.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
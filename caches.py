@@ -0,0 +1,118 @@
+import threading
+
+from cachetools import TTLCache
+
+import config
+
+
+class SharedCache:
+    """
+    Caché local al proceso, acotada en tamaño y con TTL, segura entre hilos.
+
+    Cada invalidación de una clave (pop, update) sube su versión: quien
+    calculó el valor de esa clave antes de la invalidación no puede
+    guardarlo después (evita volver a meter en la caché datos que ya
+    estaban obsoletos). Las demás claves no se ven afectadas. clear() sube
+    la generación, que vale para todas.
+    """
+
+    def __init__(self, maxsize=0, ttl=0, max_versions=10000):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._clock = 0             # sube con cada invalidación de una clave
+        self._versions = {}         # clave -> _clock de su última invalidación
+        self._max_versions = max_versions
+
+    def resize(self, maxsize, ttl):
+        """Cambia tamaño y TTL; si cambian se vacía (cuenta como invalidación)."""
+        with self._lock:
+            if (maxsize, ttl) != (self._cache.maxsize, self._cache.ttl):
+                self._bump_generation()
+                self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @property
+    def generation(self):
+        """Marca para set(); se toma antes de leer lo que se va a guardar."""
+        with self._lock:
+            return (self._generation, self._clock)
+
+    def _bump_generation(self):
+        self._generation += 1
+        self._versions.clear()
+
+    def _invalidate(self, key):
+        self._clock += 1
+        # Las versiones no pueden crecer sin límite: al llegar al máximo se
+        # olvidan y se sube la generación (como un clear() sólo para set)
+        if len(self._versions) >= self._max_versions:
+            self._bump_generation()
+        self._versions[key] = self._clock
+
+    def get(self, key):
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None:
+                read_generation, read_clock = generation
+                if read_generation != self._generation or self._versions.get(key, 0) > read_clock:
+                    return False
+            self._cache[key] = value
+            return True
+
+    def update(self, key, function):
+        """
+        Sustituye el valor de key (si está) por function(valor). Cuenta como
+        invalidación de key: quien la leyó antes no puede guardar.
+        """
+        with self._lock:
+            self._invalidate(key)
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache[key] = function(value)
+
+    def pop(self, key):
+        with self._lock:
+            self._invalidate(key)
+            return self._cache.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._bump_generation()
+            self._cache.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+
+# Parte compartida del feed: páginas de videos sin los flags por usuario
+feed_cache = SharedCache()
+
+
+def invalidate_feed():
+    feed_cache.clear()
+
+
+# Perfiles de usuario por username (ver profiles.py)
+profile_cache = SharedCache()
+
+
+def invalidate_profiles(*usernames):
+    for username in usernames:
+        profile_cache.pop(username)
+
+
+# Primera página de comentarios por video (ver comments.py)
+comments_cache = SharedCache()
+
+
+def configure(settings):
+    feed_cache.resize(settings['FEED_CACHE_SIZE'], settings['FEED_CACHE_TTL'])
+    profile_cache.resize(settings['PROFILE_CACHE_SIZE'], settings['PROFILE_CACHE_TTL'])
+    comments_cache.resize(settings['COMMENTS_CACHE_SIZE'], settings['COMMENTS_CACHE_TTL'])
+
+
+config.register(configure)
@@ -0,0 +1,108 @@
+# Comandos de mantenimiento de la app (flask --app app <comando>). Usan el
+# pool de conexiones de la app, sin arrancar sus hilos.
+import click
+from flask.cli import AppGroup
+
+import analytics
+import counters
+import inbox
+import ledger
+import migrate
+import uploads
+from resources import current_resources
+
+cli = AppGroup('likering', help='Comandos de mantenimiento')
+
+# CLI: reconstruir la bandeja de entrada desde la tabla mensajes
+# Uso: flask --app app rebuild-inbox [--user USERNAME]
+@cli.command('rebuild-inbox')
+@click.option('--user', default=None, help='Reconstruir sólo la bandeja de este usuario')
+def rebuild_inbox_command(user):
+    db_pool = current_resources().db_pool
+    conn = db_pool.getconn()
+    try:
+        written = inbox.rebuild_inbox(conn, user)
+    finally:
+        db_pool.putconn(conn)
+    print(f"Bandeja reconstruida: {written} conversaciones")
+
+# CLI: plegar los contadores fragmentados en sus columnas (todos, o uno)
+# Uso: flask --app app compact-counters [--counter videos.likes]
+@cli.command('compact-counters')
+@click.option('--counter', type=click.Choice(sorted(counters.COUNTERS)), default=None,
+              help='Compactar sólo este contador')
+def compact_counters_command(counter):
+    db_pool = current_resources().db_pool
+    conn = db_pool.getconn()
+    try:
+        folded = counters.compact_all(conn, [counter] if counter else None)
+    finally:
+        db_pool.putconn(conn)
+    for name, rows in folded.items():
+        print(f"{name}: {rows} filas actualizadas")
+
+# CLI: agregar los eventos nuevos de vistas y likes en estadisticas
+# Uso: flask --app app rollup-stats [--source vistas]
+@cli.command('rollup-stats')
+@click.option('--source', type=click.Choice(sorted(analytics.SOURCES)), default=None,
+              help='Agregar sólo esta tabla de eventos')
+def rollup_stats_command(source):
+    db_pool = current_resources().db_pool
+    conn = db_pool.getconn()
+    try:
+        done = analytics.rollup_all(conn, [source] if source else None, max_batches=10 ** 6)
+        pruned = analytics.prune_viewers(conn)
+    finally:
+        db_pool.putconn(conn)
+    for name, events in done.items():
+        print(f"{name}: {events} eventos agregados")
+    print(f"Espectadores olvidados: {pruned}")
+
+# CLI: liquidar los likes ganados y actualizar las fotos de saldo
+# Uso: flask --app app payouts
+@cli.command('payouts')
+def payouts_command():
+    db_pool = current_resources().db_pool
+    conn = db_pool.getconn()
+    try:
+        done = ledger.run_all(conn, max_batches=10 ** 6)
+    finally:
+        db_pool.putconn(conn)
+    print(f"Movimientos liquidados: {done}")
+
+# CLI: aplicar las migraciones pendientes de migrations/
+# Uso: flask --app app migrate [--status]
+@cli.command('migrate')
+@click.option('--status', is_flag=True, help='Sólo mostrar el estado de cada migración')
+def migrate_command(status):
+    db_pool = current_resources().db_pool
+    conn = db_pool.getconn()
+    try:
+        if status:
+            for version, name, state in migrate.migration_status(conn):
+                print(f"{version:04d}_{name}: {state}")
+        else:
+            applied = migrate.migrate(conn)
+            print('Migraciones aplicadas: ' + (', '.join(applied) or 'ninguna pendiente'))
+    finally:
+        db_pool.putconn(conn)
+
+# CLI: borrar las subidas abiertas abandonadas y sus ficheros a medias
+# Uso: flask --app app clean-uploads [--hours 24]
+@cli.command('clean-uploads')
+@click.option('--hours', type=float, default=None,
+              help='Horas sin recibir trozos tras las que se borra una subida (UPLOAD_EXPIRY_HOURS)')
+def clean_uploads_command(hours):
+    resources = current_resources()
+    conn = resources.db_pool.getconn()
+    try:
+        expired = uploads.expire(conn, resources.storage, hours)
+    finally:
+        resources.db_pool.putconn(conn)
+    print(f"Subidas abandonadas borradas: {expired}")
+
+
+def register_commands(app):
+    """Añade los comandos a `flask --app app`, al mismo nivel que run o shell."""
+    for name, command in cli.commands.items():
+        app.cli.add_command(command, name)
@@ -0,0 +1,124 @@
+# Comentarios de un video paginados por keyset sobre (timestamp, comment_id),
+# del más nuevo al más viejo. Las FIRST_PAGE_SIZE filas más recientes de cada
+# video y su total (videos.comentarios) viven en comments_cache; add_comment
+# las actualiza en el sitio tras el commit en vez de invalidarlas.
+#
+# La entrada guarda también la versión de comentarios:<video_id> (etags.py)
+# leída antes que las filas; add_to_first_page no la cambia, así que tras un
+# comentario local el ETag de la entrada es más viejo que su contenido.
+#
+# Las consultas y el formato de /api/comments son los mismos en
+# videos_api.py (Flask) y async_api.py (asyncio).
+import etags
+from caches import comments_cache
+from pagination import encode_cursor, decode_cursor, parse_limit
+
+# Filas guardadas por video: el tamaño máximo de página de /api/comments
+FIRST_PAGE_SIZE = 100
+
+COLUMNS = '''
+    SELECT comment_id, username, comment_text as "commentText",
+           timestamp, edited, image_url
+    FROM comentarios
+'''
+
+FIRST_PAGE_QUERY = COLUMNS + '''
+    WHERE video_id = %s
+    ORDER BY timestamp DESC, comment_id DESC
+    LIMIT %s
+'''
+
+PAGE_QUERY = COLUMNS + '''
+    WHERE video_id = %s AND (timestamp, comment_id) < (%s, %s)
+    ORDER BY timestamp DESC, comment_id DESC
+    LIMIT %s
+'''
+
+TOTAL_QUERY = ('SELECT comentarios as total, ' + etags.value("'comentarios:' || video_id") +
+               ' as version FROM videos WHERE video_id = %s')
+
+
+def read_args(args):
+    """
+    (video_id, limit, cursor, posición) de la query string; la posición es
+    None en la primera página. Lanza InvalidCursor.
+    """
+    cursor = args.get('cursor')
+    return (args.get('videoId'), parse_limit(args.get('limit'), maximum=FIRST_PAGE_SIZE), cursor,
+            decode_cursor(cursor) if cursor else None)
+
+
+def page_params(video_id, position, limit):
+    """Params de PAGE_QUERY tras `position`, con una fila de más."""
+    return (video_id,) + tuple(position) + (limit + 1,)
+
+
+def page_etag(video_id, version, cursor, limit):
+    return etags.make_etag({etags.comments(video_id): version}, cursor, limit)
+
+
+def response(rows, authors, next_cursor, total):
+    return {
+        'success': True,
+        'data': with_avatars(rows, authors),
+        'nextCursor': next_cursor,
+        'total': total
+    }
+
+
+def sort_key(comment):
+    return comment['timestamp'], comment['comment_id']
+
+
+def cache_first_page(video_id, rows, total, version, generation):
+    """rows: resultado de FIRST_PAGE_QUERY con LIMIT FIRST_PAGE_SIZE + 1."""
+    entry = {
+        'rows': [dict(r) for r in rows[:FIRST_PAGE_SIZE]],
+        'has_more': len(rows) > FIRST_PAGE_SIZE,
+        'total': total,
+        'version': version,
+    }
+    comments_cache.set(video_id, entry, generation)
+    return entry
+
+
+def first_page(entry, limit):
+    """Devuelve (comentarios, next_cursor) de la primera página desde la caché."""
+    rows = [dict(r) for r in entry['rows'][:limit]]
+    more = len(entry['rows']) > limit or entry['has_more']
+    return rows, next_cursor(rows) if more else None
+
+
+def page(rows, limit):
+    """(comentarios, next_cursor) de una consulta hecha con LIMIT limit + 1."""
+    rows = [dict(r) for r in rows]
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, next_cursor(rows)
+    return rows, None
+
+
+def next_cursor(rows):
+    return encode_cursor(rows[-1]['timestamp'], rows[-1]['comment_id']) if rows else None
+
+
+def add_to_first_page(video_id, comment):
+    """Mete un comentario ya confirmado en la primera página cacheada del video."""
+    def add(entry):
+        rows = sorted(entry['rows'] + [dict(comment)], key=sort_key, reverse=True)
+        return {
+            'rows': rows[:FIRST_PAGE_SIZE],
+            'has_more': entry['has_more'] or len(rows) > FIRST_PAGE_SIZE,
+            'total': entry['total'] + 1,
+            'version': entry['version'],
+        }
+    comments_cache.update(video_id, add)
+
+
+def with_avatars(rows, profiles):
+    """Pone la imagen actual del perfil (si existe) en lugar de la copiada al comentar."""
+    for row in rows:
+        profile = profiles.get(row['username'])
+        if profile:
+            row['image_url'] = profile['image_url']
+    return rows
@@ -0,0 +1,105 @@
+# Compresión negociada con Accept-Encoding de las respuestas JSON grandes:
+# brotli si el cliente lo acepta y el paquete está instalado, si no gzip.
+# Por debajo de COMPRESS_MIN_SIZE bytes no compensa y se envía tal cual.
+# Las respuestas en streaming (streaming.py) se comprimen bloque a bloque.
+import gzip
+import zlib
+
+from flask import request
+
+import config
+import etags
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def configure(settings):
+    global MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+    MIN_SIZE = settings['COMPRESS_MIN_SIZE']
+    GZIP_LEVEL = settings['COMPRESS_GZIP_LEVEL']
+    BROTLI_QUALITY = settings['COMPRESS_BROTLI_QUALITY']
+
+
+config.register(configure)
+
+MIMETYPES = {'application/json'}
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' o None según la cabecera Accept-Encoding (q=0 la rechaza)."""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    def ok(encoding):
+        return accepted.get(encoding, accepted.get('*', 0)) > 0
+
+    if brotli is not None and ok('br'):
+        return 'br'
+    if ok('gzip'):
+        return 'gzip'
+    return None
+
+
+def compress(payload, encoding):
+    if encoding == 'br':
+        return brotli.compress(payload, quality=BROTLI_QUALITY)
+    return gzip.compress(payload, compresslevel=GZIP_LEVEL)
+
+
+def compress_stream(chunks, encoding):
+    """Comprime un cuerpo en streaming sin juntarlo en memoria."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress_chunk, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress_chunk, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            data = compress_chunk(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def init_compression(app):
+    """Comprime las respuestas JSON de la app por encima de MIN_SIZE."""
+
+    @app.after_request
+    def _compress(response):
+        if (response.status_code != 200 or response.mimetype not in MIMETYPES
+                or response.direct_passthrough or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        if not response.is_streamed and (response.content_length or 0) < MIN_SIZE:
+            return response
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+        else:
+            response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag = response.headers.get('ETag')
+        if etag:
+            response.headers['ETag'] = etags.encoded(etag, encoding)
+        return response
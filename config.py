@@ -0,0 +1,234 @@
+# Configuración de la app. Todo sale de variables de entorno (o de .env):
+# este módulo carga .env al importarse y load() comprueba de una vez todas
+# las variables conocidas, para que un valor mal escrito pare el arranque
+# con la lista completa de errores en vez de fallar en la primera petición
+# que lo use o en un hilo en segundo plano. Los valores por defecto están
+# sólo aquí, en SETTINGS.
+#
+# Los módulos no leen el entorno: registran con register() una función
+# configure(settings) que copia lo suyo a sus variables. Se llama al
+# registrarla con current() (el entorno, hasta que se cree una app) y otra
+# vez con apply(settings) desde create_app, así que create_app(settings)
+# cambia también el pool, las cachés, la admisión y los hilos.
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ConfigError(Exception):
+    """Alguna variable de entorno falta o tiene un valor inválido."""
+
+
+def flag(value):
+    if value not in ('0', '1'):
+        raise ValueError('debe ser 0 o 1')
+    return value == '1'
+
+
+def optional_float(value):
+    return float(value) if value else None
+
+
+def names(value):
+    """'a, b,c' -> frozenset({'a', 'b', 'c'})"""
+    return frozenset(name.strip() for name in value.split(',') if name.strip())
+
+
+def limits(value):
+    """'user=1/20,ip=10/50,concurrency=16' -> los límites que cambia (ver admission.py)."""
+    result = {}
+    for item in value.split(','):
+        name, _, spec = item.strip().partition('=')
+        if not name:
+            continue
+        if name == 'concurrency':
+            result[name] = int(spec)
+            numbers = [result[name]]
+        elif name in ('user', 'ip'):
+            rate, _, burst = spec.partition('/')
+            result[name] = numbers = (float(rate), float(burst or rate))
+        else:
+            raise ValueError(f'límite desconocido: {name}')
+        if min(numbers) < 0:
+            raise ValueError(f'{name} no puede ser negativo')
+    return result
+
+
+# variable -> (conversión, valor por defecto); None = obligatoria
+SETTINGS = {
+    'SECRET_KEY': (str, 'clave-temporal-cambiar'),
+    'DATABASE_URL': (str, None),
+
+    # async_api.py
+    'ASYNC_DB_POOL_MIN': (int, '1'),
+    'ASYNC_DB_POOL_MAX': (int, '20'),
+    'ASYNC_WSGI_THREADS': (int, '10'),
+
+    # db_pool.py
+    'DB_POOL_MIN': (int, '1'),
+    'DB_POOL_MAX': (int, '10'),
+    'DB_POOL_TIMEOUT': (float, '5'),
+    'DB_POOL_CHECK_IDLE': (float, '30'),
+    'DB_POOL_MAX_LIFETIME': (float, '1800'),
+    'SLOW_QUERY_MS': (optional_float, '250'),
+
+    # caches.py, streaming.py, compression.py
+    'FEED_CACHE_SIZE': (int, '256'),
+    'FEED_CACHE_TTL': (float, '30'),
+    'PROFILE_CACHE_SIZE': (int, '10000'),
+    'PROFILE_CACHE_TTL': (float, '60'),
+    'COMMENTS_CACHE_SIZE': (int, '2000'),
+    'COMMENTS_CACHE_TTL': (float, '60'),
+    'STREAM_CHUNK_SIZE': (int, '500'),
+    'COMPRESS_MIN_SIZE': (int, '1024'),
+    'COMPRESS_GZIP_LEVEL': (int, '6'),
+    'COMPRESS_BROTLI_QUALITY': (int, '5'),
+
+    # Hilos en segundo plano (ver resources.py)
+    'VIEW_FLUSH_BATCH': (int, '500'),
+    'VIEW_FLUSH_INTERVAL': (float, '1'),
+    'VIEW_QUEUE_MAX': (int, '10000'),
+    'VIEW_QUEUE_TIMEOUT': (float, '0.5'),
+    'SHARDED_COUNTERS': (names, ''),
+    'COUNTER_SLOTS': (int, '16'),
+    'COUNTER_COMPACT_INTERVAL': (float, '5'),
+    'ANALYTICS_BATCH_SIZE': (int, '20000'),
+    'ANALYTICS_ROLLUP_LAG': (float, '60'),
+    'ANALYTICS_ROLLUP_INTERVAL': (float, '60'),
+    'ANALYTICS_VIEWER_RETENTION_DAYS': (int, '3'),
+    'PAYOUT_BATCH_SIZE': (int, '50000'),
+    'PAYOUT_CENTS_PER_LIKE': (int, '1'),
+    'PAYOUT_INTERVAL': (float, '300'),
+    'RANKING_W_LIKES': (float, '1.0'),
+    'RANKING_W_VIEWS': (float, '0.3'),
+    'RANKING_W_COMMENTS': (float, '0.6'),
+    'RANKING_W_FOLLOWERS': (float, '0.4'),
+    'RANKING_HALF_LIFE_HOURS': (float, '48'),
+    'RANKING_FOLLOW_BOOST': (float, '2.0'),
+    'RANKING_BATCH_SIZE': (int, '20000'),
+    'RANKING_MAX_DEPTH': (int, '1000'),
+    'RANKING_REFRESH_INTERVAL': (float, '10'),
+    'RANKING_FULL_REFRESH_INTERVAL': (float, '3600'),
+    'AUTOCOMPLETE_BATCH_SIZE': (int, '50000'),
+    'AUTOCOMPLETE_MAX_RECENT': (int, '5000'),
+    'AUTOCOMPLETE_REFRESH_INTERVAL': (float, '30'),
+    'AUTOCOMPLETE_FULL_REFRESH_INTERVAL': (float, '3600'),
+
+    # admission.py; ADMISSION_<CLASE> cambia los límites de cada clase
+    'ADMISSION_ENABLED': (flag, '1'),
+    'ADMISSION_BACKEND': (str, 'memory'),
+    'ADMISSION_REDIS_URL': (str, 'redis://localhost:6379/0'),
+    'ADMISSION_PROXY_HOPS': (int, '0'),
+    'ADMISSION_IN_FLIGHT_TTL': (float, '60'),
+    'ADMISSION_VISTAS': (limits, ''),
+    'ADMISSION_LIKES': (limits, ''),
+    'ADMISSION_SEGUIMIENTOS': (limits, ''),
+    'ADMISSION_COMENTARIOS': (limits, ''),
+    'ADMISSION_MENSAJES': (limits, ''),
+    'ADMISSION_LOTES': (limits, ''),
+    'ADMISSION_SUBIDAS': (limits, ''),
+
+    # uploads.py, storage.py
+    'UPLOAD_MAX_VIDEO_BYTES': (int, str(500 * 1024 * 1024)),
+    'UPLOAD_MAX_IMAGE_BYTES': (int, str(10 * 1024 * 1024)),
+    'UPLOAD_CHUNK_SIZE': (int, str(8 * 1024 * 1024)),
+    'UPLOAD_MAX_CHUNK_SIZE': (int, str(32 * 1024 * 1024)),
+    'UPLOAD_MAX_OPEN': (int, '5'),
+    'UPLOAD_EXPIRY_HOURS': (float, '24'),
+    'STORAGE_BACKEND': (str, 'local'),
+    'STORAGE_DIR': (str, ''),
+    'STORAGE_BASE_URL': (str, '/media/'),
+
+    # messages.py
+    'MESSAGES_SYNC_OVERLAP': (float, '10'),
+
+    # realtime.py
+    'REALTIME_BACKEND': (str, 'socketio'),
+    'SOCKETIO_CORS_ORIGINS': (str, '*'),
+    'SOCKETIO_ASYNC_MODE': (str, ''),
+    'SOCKETIO_MESSAGE_QUEUE': (str, ''),
+}
+
+CHOICES = {
+    'ADMISSION_BACKEND': ('memory', 'redis'),
+    'REALTIME_BACKEND': ('socketio', 'memory'),
+    'STORAGE_BACKEND': ('local',),
+    'SOCKETIO_ASYNC_MODE': ('', 'threading', 'eventlet', 'gevent', 'gevent_uwsgi'),
+}
+
+# Variables que no pueden ser negativas (tamaños, intervalos, tiempos)
+NON_NEGATIVE = {name for name, (convert, _) in SETTINGS.items() if convert in (int, float)}
+
+
+def load(environ=None, required=True):
+    """
+    Lee y valida la configuración. Devuelve un dict variable -> valor ya
+    convertido; lanza ConfigError con todos los problemas a la vez. Con
+    required=False las obligatorias que falten quedan a None.
+    """
+    environ = os.environ if environ is None else environ
+    settings = {}
+    errors = []
+    for name, (convert, default) in SETTINGS.items():
+        raw = environ.get(name, default)
+        if raw is None:
+            if required:
+                errors.append(f'{name}: obligatoria')
+            else:
+                settings[name] = None
+            continue
+        try:
+            value = convert(raw)
+        except ValueError as e:
+            errors.append(f'{name}={raw!r}: {e}')
+            continue
+        if name in CHOICES and value not in CHOICES[name]:
+            errors.append(f"{name}={raw!r}: debe ser uno de {', '.join(c or '(vacío)' for c in CHOICES[name])}")
+        elif name in NON_NEGATIVE and value < 0:
+            errors.append(f'{name}={raw!r}: no puede ser negativa')
+        settings[name] = value
+
+    if 'DB_POOL_MAX' in settings and settings['DB_POOL_MAX'] < 1:
+        errors.append('DB_POOL_MAX: tiene que ser al menos 1')
+    if settings.get('DB_POOL_MIN', 0) > settings.get('DB_POOL_MAX', 1):
+        errors.append('DB_POOL_MIN no puede ser mayor que DB_POOL_MAX')
+    if settings.get('ASYNC_DB_POOL_MIN', 0) > settings.get('ASYNC_DB_POOL_MAX', 1):
+        errors.append('ASYNC_DB_POOL_MIN no puede ser mayor que ASYNC_DB_POOL_MAX')
+    if settings.get('UPLOAD_CHUNK_SIZE', 0) > settings.get('UPLOAD_MAX_CHUNK_SIZE', 0):
+        errors.append('UPLOAD_CHUNK_SIZE no puede ser mayor que UPLOAD_MAX_CHUNK_SIZE')
+    if errors:
+        raise ConfigError('Configuración inválida:\n  ' + '\n  '.join(errors))
+    return settings
+
+
+_current = None
+_hooks = []
+
+
+def current():
+    """
+    Configuración en vigor: la del último apply() o, hasta entonces, la del
+    entorno (leída una vez, sin exigir las obligatorias: los módulos se
+    importan antes de crear la app).
+    """
+    global _current
+    if _current is None:
+        _current = load(required=False)
+    return _current
+
+
+def register(configure):
+    """Llama ya a configure(current()) y otra vez en cada apply()."""
+    _hooks.append(configure)
+    configure(current())
+    return configure
+
+
+def apply(settings):
+    """Pone settings (de load()) en vigor en todos los módulos registrados."""
+    global _current
+    _current = settings
+    for configure in _hooks:
+        configure(settings)
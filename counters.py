@@ -0,0 +1,231 @@
+# Contadores fragmentados para filas calientes. Con un contador activado en
+# SHARDED_COUNTERS (p. ej. "videos.likes,usuarios.followers") cada incremento
+# va a uno de COUNTER_SLOTS fragmentos en contadores_fragmentados en vez de a
+# la columna, así los likes simultáneos a un mismo video no esperan todos
+# por el bloqueo de la misma fila. Las lecturas suman columna y fragmentos;
+# CounterCompactor los pliega en la columna cada COUNTER_COMPACT_INTERVAL s.
+#
+# Antes de desactivar un contador hay que plegar lo pendiente:
+#     flask --app app compact-counters
+import os
+import random
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+import config
+
+# contador -> (tabla, columna, clave)
+COUNTERS = {
+    'videos.likes': ('videos', 'likes', 'video_id'),
+    'videos.visualizaciones': ('videos', 'visualizaciones', 'video_id'),
+    'usuarios.followers': ('usuarios', 'followers', 'username'),
+    'usuarios.following': ('usuarios', 'following', 'username'),
+    # Sellos de versión de los ETag (ver etags.py)
+    'versiones.version': ('versiones', 'version', 'recurso'),
+}
+
+SHARDED = None
+
+
+def configure(settings):
+    """
+    SHARDED sólo se fija la primera vez: value() lo deja dentro de las
+    consultas que otros módulos arman al importarse.
+    """
+    global SHARDED, SLOTS
+    sharded = settings['SHARDED_COUNTERS']
+    if sharded - COUNTERS.keys():
+        raise config.ConfigError('SHARDED_COUNTERS desconocidos: ' + ', '.join(sorted(sharded - COUNTERS.keys())))
+    if SHARDED is not None and sharded != SHARDED:
+        raise config.ConfigError('SHARDED_COUNTERS no se puede cambiar después de importar counters')
+    SHARDED = sharded
+    SLOTS = settings['COUNTER_SLOTS']
+
+
+config.register(configure)
+
+
+def is_sharded(counter):
+    return counter in SHARDED
+
+
+def value(counter, alias=None):
+    """
+    Expresión SQL con el valor del contador para la fila `alias` (por
+    defecto el nombre de la tabla): la columna más los fragmentos pendientes.
+    """
+    table, column, key = COUNTERS[counter]
+    alias = alias or table
+    if counter not in SHARDED:
+        return f'{alias}.{column}'
+    return (f"({alias}.{column} + COALESCE((SELECT SUM(f.delta) FROM contadores_fragmentados f "
+            f"WHERE f.contador = '{counter}' AND f.clave = {alias}.{key}), 0))")
+
+
+def increment(counter, keys_sql, amount=1):
+    """
+    Sentencia para usar como CTE que suma `amount` al contador de cada clave
+    que devuelve la subconsulta keys_sql, una vez por cada fila (una clave
+    repetida suma varias veces). Devuelve (sql, params).
+    """
+    table, column, key = COUNTERS[counter]
+    grouped = f'SELECT clave, COUNT(*) AS n FROM ({keys_sql}) AS k(clave) GROUP BY clave'
+    if counter not in SHARDED:
+        return (f'''UPDATE {table} t SET {column} = t.{column} + d.n * %s
+            FROM ({grouped}) AS d
+            WHERE t.{key} = d.clave''', (amount,))
+    return ('''
+        INSERT INTO contadores_fragmentados (contador, clave, slot, delta)
+        SELECT %s, d.clave, %s, d.n * %s FROM (''' + grouped + ''') AS d
+        ON CONFLICT (contador, clave, slot)
+        DO UPDATE SET delta = contadores_fragmentados.delta + EXCLUDED.delta
+    ''', (counter, random.randrange(SLOTS), amount))
+
+
+def increments(items, amount=1):
+    """
+    Como increment para varios contadores [(contador, keys_sql)] en la misma
+    sentencia. Los no fragmentados de una misma tabla van en un solo UPDATE:
+    con dos CTE que actualizan la misma fila sólo se aplica una. Devuelve
+    [(sql, params)].
+    """
+    result = []
+    tables = {}
+    for counter, keys_sql in items:
+        if counter in SHARDED:
+            result.append(increment(counter, keys_sql, amount))
+        else:
+            tables.setdefault(COUNTERS[counter][0], []).append((counter, keys_sql))
+    for table, group in tables.items():
+        if len(group) == 1:
+            result.append(increment(group[0][0], group[0][1], amount))
+            continue
+        key = COUNTERS[group[0][0]][2]
+        union = ' UNION ALL '.join(f'SELECT {i}, k.clave FROM ({keys_sql}) AS k(clave)'
+                                   for i, (_, keys_sql) in enumerate(group))
+        counts = ', '.join(f'COUNT(*) FILTER (WHERE u.i = {i}) AS n{i}' for i in range(len(group)))
+        sets = ', '.join(f'{COUNTERS[counter][1]} = t.{COUNTERS[counter][1]} + d.n{i} * %s'
+                         for i, (counter, _) in enumerate(group))
+        result.append((f'''UPDATE {table} t SET {sets}
+            FROM (SELECT u.clave, {counts} FROM ({union}) AS u(i, clave) GROUP BY u.clave) AS d
+            WHERE t.{key} = d.clave''', (amount,) * len(group)))
+    return result
+
+
+def add_many(cur, counter, deltas):
+    """Suma {clave: n} al contador en una sola sentencia (en orden de clave)."""
+    table, column, key = COUNTERS[counter]
+    rows = sorted(deltas.items())
+    if counter not in SHARDED:
+        execute_values(cur, f'''
+            UPDATE {table} t SET {column} = t.{column} + d.n
+            FROM (VALUES %s) AS d(clave, n)
+            WHERE t.{key} = d.clave
+        ''', rows, page_size=1000)
+        return
+    slot = random.randrange(SLOTS)
+    execute_values(cur, '''
+        INSERT INTO contadores_fragmentados (contador, clave, slot, delta) VALUES %s
+        ON CONFLICT (contador, clave, slot)
+        DO UPDATE SET delta = contadores_fragmentados.delta + EXCLUDED.delta
+    ''', [(counter, clave, slot, n) for clave, n in rows], page_size=1000)
+
+
+def compact(conn, counter):
+    """
+    Pliega en la columna todos los fragmentos de un contador, en una sola
+    transacción: las lecturas ven antes o después, nunca la suma a medias.
+    Devuelve cuántas filas de la tabla se actualizaron.
+    """
+    table, column, key = COUNTERS[counter]
+    cur = conn.cursor()
+    cur.execute(f'''
+        WITH plegados AS (
+            DELETE FROM contadores_fragmentados WHERE contador = %s
+            RETURNING clave, delta
+        ), sumas AS (
+            SELECT clave, SUM(delta) as delta FROM plegados GROUP BY clave
+        )
+        UPDATE {table} t SET {column} = t.{column} + s.delta
+        FROM sumas s
+        WHERE t.{key} = s.clave
+    ''', (counter,))
+    updated = cur.rowcount
+    conn.commit()
+    cur.close()
+    return updated
+
+
+def compact_all(conn, names=None):
+    """
+    Compacta los contadores indicados (por defecto todos). Varios procesos
+    pueden hacerlo a la vez: el segundo DELETE ya no encuentra las filas.
+    Devuelve {contador: filas actualizadas}.
+    """
+    return {name: compact(conn, name) for name in (names or COUNTERS)}
+
+
+class CounterCompactor:
+    """Hilo que compacta los contadores fragmentados cada `interval` segundos."""
+
+    def __init__(self, pool, interval=5.0):
+        self.pool = pool
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.runs = 0
+        self.folded_rows = 0
+        self.errors = 0
+
+    def ensure_started(self):
+        """Arranca el hilo (también en cada proceso hijo tras un fork) si hay contadores fragmentados."""
+        if not SHARDED:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='counter-compactor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+    def run_once(self):
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            folded = compact_all(conn, sorted(SHARDED))
+        except Exception as e:
+            print(f"Error compactando contadores: {e}")
+            if conn is not None:
+                self.pool.putconn(conn, discard=True)
+                conn = None
+            with self._lock:
+                self.errors += 1
+            return 0
+        finally:
+            if conn is not None:
+                self.pool.putconn(conn)
+        with self._lock:
+            self.runs += 1
+            self.folded_rows += sum(folded.values())
+        return sum(folded.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sharded': len(SHARDED),
+                'runs': self.runs,
+                'folded_rows': self.folded_rows,
+                'errors': self.errors,
+            }
+
+
+def compactor_from_settings(pool, settings):
+    return CounterCompactor(pool, interval=settings['COUNTER_COMPACT_INTERVAL'])
@@ -0,0 +1,242 @@
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+
+class PoolTimeout(Exception):
+    """Se lanza cuando no se libera ninguna conexión antes del timeout."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones acotado por proceso.
+
+    Las conexiones se piden con getconn() y se devuelven con putconn().
+    Antes de entregar una conexión que lleva tiempo sin usarse se comprueba
+    con un SELECT 1 y, si está caída o es demasiado vieja, se reemplaza por
+    una nueva.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=5.0,
+                 check_idle=30.0, max_lifetime=1800.0,
+                 cursor_factory=RealDictCursor):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError('Tamaños de pool inválidos: min=%s max=%s' % (minconn, maxconn))
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.max_lifetime = max_lifetime
+        self.cursor_factory = cursor_factory
+
+        self._cond = threading.Condition()
+        self._idle = deque()      # (conexión, creada_en, último_uso)
+        self._created_at = {}     # id(conexión) -> momento de creación
+        self._size = 0            # conexiones abiertas (libres + en uso)
+        self._in_use = 0
+        self._waiting = 0
+        self._pid = os.getpid()
+
+        # Estadísticas exportadas
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._connection_errors = 0
+        self._reconnects = 0
+        self._failed_checks = 0
+
+    # ---------- Conexiones físicas ----------
+
+    def _connect(self):
+        try:
+            conn = psycopg2.connect(self.dsn, cursor_factory=self.cursor_factory)
+        except Exception:
+            with self._cond:
+                self._connection_errors += 1
+            raise
+        self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _close(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if self.max_lifetime and now - self._created_at.get(id(conn), now) > self.max_lifetime:
+            return False
+        if self.check_idle is not None and now - last_used >= self.check_idle:
+            try:
+                cur = conn.cursor()
+                cur.execute('SELECT 1')
+                cur.close()
+                conn.rollback()
+            except Exception:
+                with self._cond:
+                    self._failed_checks += 1
+                return False
+        return True
+
+    def _check_fork(self):
+        # Tras un fork las conexiones heredadas pertenecen al proceso padre:
+        # se olvidan sin cerrarlas para no cortar la sesión del padre.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._created_at.clear()
+            self._size = 0
+            self._in_use = 0
+            self._waiting = 0
+
+    def fill(self):
+        """Abre conexiones hasta llegar al mínimo configurado."""
+        while True:
+            with self._cond:
+                self._check_fork()
+                if self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    # ---------- API del pool ----------
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout if self.timeout is not None else None
+
+        while True:
+            conn = None
+            with self._cond:
+                self._check_fork()
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout('No hay conexiones libres tras %.1fs' % self.timeout)
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                if self._idle:
+                    # LIFO: la conexión usada más recientemente es la que
+                    # menos probabilidades tiene de estar caída.
+                    conn, last_used = self._idle.pop()
+                else:
+                    self._size += 1
+                self._in_use += 1
+
+            if conn is not None and not self._is_healthy(conn, last_used):
+                self._close(conn)
+                conn = None
+                with self._cond:
+                    self._reconnects += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """
+        Devuelve una conexión al pool. Si quedó una transacción abierta
+        (por ejemplo tras una excepción en el handler) se hace rollback.
+        """
+        if not discard and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if self._pid != os.getpid():
+                # Conexión de otro proceso: no la contamos ni la reutilizamos
+                return
+            self._in_use -= 1
+            if discard or conn.closed:
+                self._size -= 1
+                self._created_at.pop(id(conn), None)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if discard and not conn.closed:
+            self._close(conn)
+
+    def closeall(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'min': self.minconn,
+                'max': self.maxconn,
+                'saturation': round(self._in_use / self.maxconn, 4),
+                'checkouts': self._checkouts,
+                'wait_seconds_total': round(self._wait_total, 6),
+                'wait_seconds_avg': round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+                'wait_seconds_max': round(self._wait_max, 6),
+                'timeouts': self._timeouts,
+                'connection_errors': self._connection_errors,
+                'failed_health_checks': self._failed_checks,
+                'reconnects': self._reconnects,
+            }
+
+
+def pool_from_settings(settings, cursor_factory=RealDictCursor):
+    """Crea el pool con DATABASE_URL y los límites DB_POOL_* de la configuración."""
+    return ConnectionPool(
+        settings['DATABASE_URL'],
+        minconn=settings['DB_POOL_MIN'],
+        maxconn=settings['DB_POOL_MAX'],
+        timeout=settings['DB_POOL_TIMEOUT'],
+        check_idle=settings['DB_POOL_CHECK_IDLE'],
+        max_lifetime=settings['DB_POOL_MAX_LIFETIME'],
+        cursor_factory=cursor_factory,
+    )
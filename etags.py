@@ -0,0 +1,133 @@
+# Sellos de versión por recurso para ETag / If-None-Match. Cada escritura
+# suma 1, en su misma transacción, a la versión de los recursos que cambia:
+#
+#     perfil:<username>        /api/user-profile (y los flags del feed de ese usuario)
+#     videos                   altas de videos (contenido de las páginas del feed)
+#     videos:<username>        videos de un usuario: likes, vistas y comentarios
+#     comentarios:<video_id>   /api/comments de un video
+#
+# La versión es un contador más (versiones.version en counters.py), así que
+# con SHARDED_COUNTERS también se reparte en fragmentos.
+#
+# Una respuesta lleva el ETag de las versiones leídas antes que sus datos (o
+# en la misma sentencia): como mucho el ETag es más viejo que el cuerpo, lo
+# que cuesta un 200 de más, nunca un 304 con datos obsoletos.
+import hashlib
+import json
+
+from flask import Response
+
+import counters
+
+COUNTER = 'versiones.version'
+
+FEED = 'videos'
+
+# Sufijo del ETag de cada variante comprimida (ver compression.py)
+ENCODING_SUFFIXES = {'gzip': '-gz', 'br': '-br'}
+
+
+def profile(username):
+    return f'perfil:{username}'
+
+
+def user_videos(username):
+    return f'videos:{username}'
+
+
+def comments(video_id):
+    return f'comentarios:{video_id}'
+
+
+def value(resource_sql):
+    """Expresión SQL con la versión del recurso resource_sql (0 si nunca cambió)."""
+    return (f'COALESCE((SELECT {counters.value(COUNTER, "ver")} FROM versiones ver '
+            f'WHERE ver.recurso = {resource_sql}), 0)')
+
+
+CURRENT_QUERY = ('SELECT r.recurso, ' + value('r.recurso') + ' as version '
+                 'FROM unnest(%s::text[]) AS r(recurso)')
+
+
+def current(cur, resources):
+    """{recurso: versión} de los recursos pedidos, en una sola consulta."""
+    cur.execute(CURRENT_QUERY, (sorted(set(resources)),))
+    return {row['recurso']: row['version'] for row in cur.fetchall()}
+
+
+def bump(keys_sql, params=(), name='versionado'):
+    """
+    CTE que suma 1 a la versión de cada recurso que devuelve la subconsulta
+    keys_sql (con sus params). Devuelve (sql, params) para poner tras WITH o
+    tras la coma de otra CTE. Las filas se tocan en orden de recurso para
+    que dos escrituras concurrentes no se bloqueen mutuamente.
+    """
+    keys = f'SELECT DISTINCT recurso FROM ({keys_sql}) AS r(recurso) ORDER BY recurso'
+    if not counters.is_sharded(COUNTER):
+        return (f'''{name} AS (
+            INSERT INTO versiones (recurso, version)
+            SELECT recurso, 1 FROM ({keys}) AS k
+            ON CONFLICT (recurso) DO UPDATE SET version = versiones.version + 1
+        )''', tuple(params))
+    # La fila base tiene que existir para que compact() pliegue sus fragmentos
+    increment_sql, increment_params = counters.increment(COUNTER, keys)
+    return (f'''{name}_filas AS (
+            INSERT INTO versiones (recurso, version)
+            SELECT recurso, 0 FROM ({keys}) AS k
+            ON CONFLICT (recurso) DO NOTHING
+        ), {name} AS (
+            {increment_sql}
+        )''', tuple(params) + increment_params + tuple(params))
+
+
+def touch_query(cur, keys_sql, params=()):
+    """Suma 1 a la versión de los recursos que devuelve keys_sql, en la transacción de cur."""
+    sql, bump_params = bump(keys_sql, params)
+    cur.execute('WITH ' + sql + ' SELECT 1', bump_params)
+
+
+def touch(cur, *resources):
+    """Suma 1 a la versión de cada recurso indicado, en la transacción de cur."""
+    if resources:
+        touch_query(cur, 'SELECT unnest(%s::text[])', (list(resources),))
+
+
+def make_etag(versions, *parts):
+    """ETag fuerte a partir de {recurso: versión} y los parámetros de la respuesta."""
+    raw = json.dumps([sorted(versions.items()), parts], default=str)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest()[:24] + '"'
+
+
+def encoded(etag, encoding):
+    """ETag de la variante comprimida con `encoding`."""
+    return etag[:-1] + ENCODING_SUFFIXES[encoding] + '"'
+
+
+def matches(if_none_match, etag):
+    """¿Alguno de los ETag de If-None-Match es etag (o una variante comprimida)?"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        for suffix in ENCODING_SUFFIXES.values():
+            if candidate.endswith(suffix + '"'):
+                candidate = candidate[:-len(suffix) - 1] + '"'
+                break
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag):
+    return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+
+def tagged(response, etag):
+    """Pone el ETag en la respuesta; no-cache obliga al cliente a revalidar."""
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,49 @@
+# Configuración de gunicorn para producción:
+#
+#     gunicorn -c gunicorn.conf.py 'app:create_app()'
+#
+# Con preload_app el maestro importa los módulos y crea la app una sola vez
+# y los workers la heredan con el fork (arrancan antes y comparten en
+# copy-on-write las páginas del código importado). create_app no abre
+# conexiones ni hilos (ver resources.py): cada worker abre los suyos en
+# post_worker_init, después del fork y antes de aceptar peticiones.
+#
+# Con REALTIME_BACKEND=socketio (el de por defecto) hay un solo worker.
+# Socket.IO guarda cada sesión en el proceso que la abrió y gunicorn
+# reparte las peticiones entre sus workers sin afinidad, así que el sondeo
+# (long-polling) de un cliente acaba en otro worker y falla con "Invalid
+# session". Para más procesos se arrancan varios gunicorn de un worker,
+# cada uno en su puerto, detrás de un balanceador con sesiones pegajosas
+# (p. ej. ip_hash en nginx) y con SOCKETIO_MESSAGE_QUEUE para que los
+# eventos lleguen a todos.
+import os
+
+import config
+
+SOCKETIO = config.current()['REALTIME_BACKEND'] == 'socketio'
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', '1' if SOCKETIO else '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+worker_class = 'gthread'
+preload_app = True
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+
+
+def when_ready(server):
+    if SOCKETIO and workers > 1:
+        server.log.warning('Socket.IO con varios workers de gunicorn: las sesiones por sondeo '
+                           'fallarán con "Invalid session" (ver gunicorn.conf.py)')
+
+
+def post_worker_init(worker):
+    resources = getattr(worker.wsgi, 'extensions', {}).get('recursos')
+    if resources is None:
+        return
+    try:
+        resources.start()
+    except Exception as e:
+        # Sin base de datos el worker arranca igual: el pool vuelve a
+        # intentarlo al pedir conexión y los hilos con la primera petición
+        worker.log.warning(f"Error abriendo los recursos del worker: {e}")
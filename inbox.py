@@ -0,0 +1,128 @@
+# Bandeja de entrada materializada: una fila por (usuario, contacto) con el
+# último mensaje y los no leídos. send_message y mark_as_read la mantienen
+# en la misma transacción que escriben en `mensajes`. La tabla se crea en
+# migrations/0002_conversaciones.sql.
+#
+# CONVERSATIONS_QUERY y with_contacts son /api/conversations, compartidos
+# por messages_api.py y async_api.py.
+
+# Una lectura por rango del índice (usuario, ultimo_timestamp)
+CONVERSATIONS_QUERY = '''
+    SELECT contacto as username, ultimo_mensaje as last_message_text,
+           ultimo_timestamp as last_message_timestamp,
+           ultimo_remitente as last_message_from,
+           no_leidos as unread_count
+    FROM conversaciones
+    WHERE usuario = %s
+    ORDER BY ultimo_timestamp DESC
+'''
+
+
+def with_contacts(conversations, contacts):
+    """Conversaciones en el formato de la API, sin las de contactos que ya no existen."""
+    result = []
+    for conv in conversations:
+        contact = contacts.get(conv['username'])
+        if contact is None:
+            continue
+        result.append({
+            'username': conv['username'],
+            'imageUrl': contact['image_url'],
+            'lastMessage': {
+                'text': conv['last_message_text'],
+                'timestamp': conv['last_message_timestamp'].isoformat(),
+                'from': conv['last_message_from']
+            },
+            'unreadCount': conv['unread_count']
+        })
+    return result
+
+
+def record_message(cur, remitente, destinatario, mensaje, timestamp):
+    """Actualiza la conversación de los dos participantes con un mensaje nuevo."""
+    if remitente == destinatario:
+        rows = [(remitente, destinatario, 1)]
+    else:
+        # Se ordenan las filas para que dos envíos cruzados (a->b y b->a)
+        # bloqueen siempre en el mismo orden
+        rows = sorted([(remitente, destinatario, 0), (destinatario, remitente, 1)])
+
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+    params = []
+    for usuario, contacto, no_leidos in rows:
+        params += [usuario, contacto, mensaje, timestamp, remitente, no_leidos]
+
+    cur.execute('''
+        INSERT INTO conversaciones (usuario, contacto, ultimo_mensaje,
+                                    ultimo_timestamp, ultimo_remitente, no_leidos)
+        VALUES ''' + values + '''
+        ON CONFLICT (usuario, contacto) DO UPDATE SET
+            ultimo_mensaje = CASE WHEN EXCLUDED.ultimo_timestamp >= conversaciones.ultimo_timestamp
+                                  THEN EXCLUDED.ultimo_mensaje ELSE conversaciones.ultimo_mensaje END,
+            ultimo_remitente = CASE WHEN EXCLUDED.ultimo_timestamp >= conversaciones.ultimo_timestamp
+                                    THEN EXCLUDED.ultimo_remitente ELSE conversaciones.ultimo_remitente END,
+            ultimo_timestamp = GREATEST(conversaciones.ultimo_timestamp, EXCLUDED.ultimo_timestamp),
+            no_leidos = conversaciones.no_leidos + EXCLUDED.no_leidos
+    ''', params)
+
+
+def mark_read(cur, usuario, contacto, count):
+    """
+    Descuenta los mensajes que `usuario` acaba de leer de `contacto`. Se
+    resta lo marcado en vez de poner 0 para no perder un mensaje que llegue
+    mientras tanto.
+    """
+    if count:
+        cur.execute('''
+            UPDATE conversaciones
+            SET no_leidos = GREATEST(no_leidos - %s, 0)
+            WHERE usuario = %s AND contacto = %s
+        ''', (count, usuario, contacto))
+
+
+def rebuild_inbox(conn, usuario=None):
+    """
+    Recalcula la bandeja desde `mensajes` (de todos los usuarios o de uno).
+    Devuelve el número de conversaciones escritas.
+    """
+    cur = conn.cursor()
+    # Bloquea escrituras concurrentes en la bandeja mientras se reconstruye
+    cur.execute('LOCK TABLE conversaciones IN EXCLUSIVE MODE')
+
+    user_filter = ''
+    params = ()
+    if usuario:
+        user_filter = 'WHERE m.usuario = %s'
+        params = (usuario,)
+        cur.execute('DELETE FROM conversaciones WHERE usuario = %s', (usuario,))
+    else:
+        cur.execute('DELETE FROM conversaciones')
+
+    cur.execute('''
+        INSERT INTO conversaciones (usuario, contacto, ultimo_mensaje,
+                                    ultimo_timestamp, ultimo_remitente, no_leidos)
+        SELECT DISTINCT ON (m.usuario, m.contacto)
+               m.usuario, m.contacto, m.mensaje, m.timestamp, m.remitente,
+               COALESCE(n.no_leidos, 0)
+        FROM (
+            SELECT remitente as usuario, destinatario as contacto,
+                   mensaje, timestamp, remitente, message_id
+            FROM mensajes
+            UNION ALL
+            SELECT destinatario, remitente, mensaje, timestamp, remitente, message_id
+            FROM mensajes
+            WHERE destinatario <> remitente
+        ) m
+        LEFT JOIN (
+            SELECT destinatario as usuario, remitente as contacto, COUNT(*) as no_leidos
+            FROM mensajes
+            WHERE leido = false
+            GROUP BY destinatario, remitente
+        ) n ON n.usuario = m.usuario AND n.contacto = m.contacto
+        ''' + user_filter + '''
+        ORDER BY m.usuario, m.contacto, m.timestamp DESC, m.message_id DESC
+    ''', params)
+    written = cur.rowcount
+    conn.commit()
+    cur.close()
+    return written
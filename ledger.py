@@ -0,0 +1,259 @@
+# Libro de movimientos de la billetera. Cada ganancia o gasto es una fila
+# nueva en movimientos (nunca se actualiza ni se borra) con lo que suma a
+# likes_disponibles, likes_ganados y al dinero ganado (en céntimos):
+#
+#     apertura  saldo que tenía usuarios antes del libro (migración 0007)
+#     like      like recibido en un video (+1 likes_ganados), en
+#               record_likes_and_follows (videos_api.py)
+#     pago      liquidación de los likes recibidos (+céntimos)
+#
+# La liquidación (run_payouts) recorre una sola vez los movimientos nuevos
+# desde su marca: paga los likes a PAYOUT_CENTS_PER_LIKE y deja en saldos
+# una foto del saldo de cada usuario que tuvo movimientos. Leer un saldo es
+# su foto más los pocos movimientos posteriores.
+#
+# Aquí no vale la espera ante huecos de analytics.py: un movimiento que se
+# confirmara tarde faltaría para siempre en el saldo. Cada fila guarda su
+# transacción (migración 0010) y se recorre en orden de (transaccion, id),
+# sólo hasta pg_snapshot_xmin de la instantánea actual: las transacciones
+# anteriores ya terminaron, así que ninguna fila puede aparecer por detrás
+# de la marca. Una transacción larga en la base retrasa la liquidación,
+# no la descuadra.
+#
+# Se ejecuta en un hilo cada PAYOUT_INTERVAL segundos (0 = nunca) o a mano:
+#     flask --app app payouts
+import os
+import threading
+import time
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+import config
+
+
+def configure(settings):
+    global BATCH_SIZE, CENTS_PER_LIKE
+    BATCH_SIZE = settings['PAYOUT_BATCH_SIZE']
+    CENTS_PER_LIKE = settings['PAYOUT_CENTS_PER_LIKE']
+
+
+config.register(configure)
+
+AMOUNTS = ['likes_disponibles', 'likes_ganados', 'centimos']
+
+# Saldo = foto + movimientos posteriores (índice (username, transaccion, id))
+BALANCE_QUERY = '''
+    SELECT COALESCE(s.likes_disponibles, 0) + COALESCE(t.likes_disponibles, 0) as likes_disponibles,
+           COALESCE(s.likes_ganados, 0) + COALESCE(t.likes_ganados, 0) as likes_ganados,
+           ((COALESCE(s.centimos, 0) + COALESCE(t.centimos, 0)) / 100.0)::numeric(14, 2) as dinero_ganado
+    FROM (SELECT %s::text as username) u
+    LEFT JOIN saldos s ON s.username = u.username
+    LEFT JOIN LATERAL (
+        SELECT SUM(m.likes_disponibles) as likes_disponibles,
+               SUM(m.likes_ganados) as likes_ganados,
+               SUM(m.centimos) as centimos
+        FROM movimientos m
+        WHERE m.username = u.username
+          AND (m.transaccion, m.id) > (COALESCE(s.hasta_transaccion, '0'), COALESCE(s.hasta_id, 0))
+    ) t ON true
+'''
+
+HISTORY_QUERY = '''
+    SELECT id, tipo, likes_disponibles, likes_ganados,
+           (centimos / 100.0)::numeric(14, 2) as dinero, referencia, timestamp
+    FROM movimientos
+    WHERE username = %s AND id < %s
+    ORDER BY id DESC
+    LIMIT %s
+'''
+
+
+def append(cur, username, tipo, likes_disponibles=0, likes_ganados=0, centimos=0, referencia=None):
+    """Añade un movimiento en la transacción abierta de cur."""
+    cur.execute('''
+        INSERT INTO movimientos (username, tipo, likes_disponibles, likes_ganados, centimos, referencia)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    ''', (username, tipo, likes_disponibles, likes_ganados, centimos, referencia))
+
+
+def balance(cur, username):
+    """{likes_disponibles, likes_ganados, dinero_ganado} del usuario."""
+    cur.execute(BALANCE_QUERY, (username,))
+    return dict(cur.fetchone())
+
+
+def payouts(entries, cents_per_like=None):
+    """
+    Céntimos a pagar a cada creador por los likes de entries (DataFrame de
+    movimientos). Devuelve una Series username -> céntimos, sin ceros.
+    """
+    cents_per_like = CENTS_PER_LIKE if cents_per_like is None else cents_per_like
+    likes = entries.loc[entries['tipo'].to_numpy() == 'like']
+    earned = likes.groupby('username', sort=True)['likes_ganados'].sum() * cents_per_like
+    return earned[earned.to_numpy() != 0]
+
+
+def snapshot_deltas(entries):
+    """Suma por usuario de cada importe de entries (DataFrame username x AMOUNTS)."""
+    return entries.groupby('username', sort=True)[AMOUNTS].sum()
+
+
+def run_payouts(conn, batch_size=None):
+    """
+    Procesa el siguiente lote de movimientos en una sola transacción: añade
+    los pagos, actualiza las fotos de saldos y avanza la marca. Devuelve
+    cuántos movimientos procesó: 0 si ya está al día o si otro proceso está
+    liquidando.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    cur = conn.cursor()
+    try:
+        # El horizonte se lee antes de que esta transacción escriba nada: sus
+        # pagos quedan por encima y entran en la próxima pasada
+        cur.execute('''
+            SELECT ultima_transaccion, ultimo_id,
+                   pg_snapshot_xmin(pg_current_snapshot()) as horizonte
+            FROM saldos_marca
+            WHERE nombre = 'movimientos'
+            FOR UPDATE SKIP LOCKED
+        ''')
+        mark = cur.fetchone()
+        if mark is None:
+            conn.rollback()
+            return 0
+
+        cur.execute('''
+            SELECT transaccion, id, username, tipo, likes_disponibles, likes_ganados, centimos
+            FROM movimientos
+            WHERE (transaccion, id) > (%s::xid8, %s) AND transaccion < %s::xid8
+            ORDER BY transaccion, id
+            LIMIT %s
+        ''', (mark['ultima_transaccion'], mark['ultimo_id'], mark['horizonte'], batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            conn.rollback()
+            return 0
+
+        # pandas tarda en importarse: sólo lo carga el proceso que liquida,
+        # no el arranque de cada worker (ver `python bench.py startup`)
+        import pandas as pd
+
+        last = (rows[-1]['transaccion'], rows[-1]['id'])
+        entries = pd.DataFrame.from_records(
+            rows, columns=['id', 'username', 'tipo'] + AMOUNTS).astype({a: np.int64 for a in AMOUNTS})
+        del rows
+
+        # Pagos: los escribe esta transacción, por encima del horizonte, y
+        # entran en la próxima foto
+        earned = payouts(entries)
+        if len(earned):
+            reference = f"movimientos hasta {last[0]}/{last[1]}"
+            execute_values(cur, '''
+                INSERT INTO movimientos (username, tipo, centimos, referencia) VALUES %s
+            ''', [(username, 'pago', int(cents), reference) for username, cents in earned.items()],
+                page_size=1000)
+
+        # Fotos de saldo: en orden de username, para no bloquearse con otra pasada
+        deltas = snapshot_deltas(entries)
+        execute_values(cur, '''
+            INSERT INTO saldos (username, hasta_transaccion, hasta_id,
+                                likes_disponibles, likes_ganados, centimos)
+            VALUES %s
+            ON CONFLICT (username) DO UPDATE
+            SET hasta_transaccion = EXCLUDED.hasta_transaccion,
+                hasta_id = EXCLUDED.hasta_id,
+                likes_disponibles = saldos.likes_disponibles + EXCLUDED.likes_disponibles,
+                likes_ganados = saldos.likes_ganados + EXCLUDED.likes_ganados,
+                centimos = saldos.centimos + EXCLUDED.centimos,
+                actualizado = NOW()
+        ''', [(username, last[0], last[1], int(d), int(g), int(c)) for username, d, g, c in
+              deltas.itertuples(name=None)], template='(%s, %s::xid8, %s, %s, %s, %s)', page_size=1000)
+
+        cur.execute('''
+            UPDATE saldos_marca
+            SET ultima_transaccion = %s::xid8, ultimo_id = %s, actualizado = NOW()
+            WHERE nombre = 'movimientos'
+        ''', last)
+        conn.commit()
+        return len(entries)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def run_all(conn, batch_size=None, max_batches=100):
+    """Procesa lotes hasta ponerse al día (o max_batches). Devuelve cuántos movimientos."""
+    batch_size = batch_size or BATCH_SIZE
+    done = 0
+    for _ in range(max_batches):
+        n = run_payouts(conn, batch_size)
+        done += n
+        if n < batch_size:
+            break
+    return done
+
+
+class PayoutWorker:
+    """Hilo que liquida los movimientos nuevos cada `interval` segundos."""
+
+    def __init__(self, pool, interval=300.0):
+        self.pool = pool
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.runs = 0
+        self.entries = 0
+        self.errors = 0
+
+    def ensure_started(self):
+        """Arranca el hilo (también en cada proceso hijo tras un fork) si hay intervalo."""
+        if not self.interval:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='payouts', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+    def run_once(self):
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            done = run_all(conn)
+        except Exception as e:
+            print(f"Error liquidando la billetera: {e}")
+            if conn is not None:
+                self.pool.putconn(conn, discard=True)
+                conn = None
+            with self._lock:
+                self.errors += 1
+            return 0
+        finally:
+            if conn is not None:
+                self.pool.putconn(conn)
+        with self._lock:
+            self.runs += 1
+            self.entries += done
+        return done
+
+    def stats(self):
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'entries': self.entries,
+                'errors': self.errors,
+            }
+
+
+def worker_from_settings(pool, settings):
+    return PayoutWorker(pool, interval=settings['PAYOUT_INTERVAL'])
@@ -0,0 +1,179 @@
+# Mensajes entre dos usuarios para /api/messages, compartidos por
+# messages_api.py (Flask) y async_api.py (asyncio). Cada modo es una lista de
+# consultas (sync_queries / page_queries) y una función que arma la
+# respuesta con sus resultados, en el mismo orden; cada servidor sólo las
+# ejecuta.
+#
+# Sin cursores se devuelve la última página de la conversación. Con 'since'
+# los mensajes nuevos y los cambios de lectura desde ese punto, más los de
+# los SYNC_OVERLAP segundos anteriores (pueden repetirse); con 'before' la
+# página anterior (scroll hacia atrás).
+import config
+from pagination import (encode_cursor, decode_cursor, encode_sync_cursor,
+                        decode_sync_cursor, parse_limit)
+
+
+def configure(settings):
+    global SYNC_OVERLAP
+    # Segundos que 'since' vuelve a leer por detrás del cursor. El timestamp
+    # de un mensaje (y su read_at) es el NOW() del inicio de su transacción:
+    # uno que se confirme después que otro más nuevo puede quedar detrás de
+    # un cursor que ya lo pasó. Se repiten los de ese margen y el cliente
+    # descarta por message_id los que ya tiene. Tiene que ser mayor que lo
+    # que dura la transacción de send_message o mark_as_read.
+    SYNC_OVERLAP = settings['MESSAGES_SYNC_OVERLAP']
+
+
+config.register(configure)
+
+COLUMNS = '''
+    SELECT message_id, remitente as "from", destinatario as "to",
+           mensaje as message, leido as read, timestamp, read_at
+'''
+
+
+def both_directions(select, where, order=None):
+    """
+    La consulta para los dos sentidos de la conversación como UNION ALL de
+    dos ramas con remitente y destinatario fijos: cada una va por su índice
+    (un OR de los dos pares no puede). Con 'order' cada rama se ordena y
+    corta por el índice y luego se mezclan; los parámetros son los de
+    both_params.
+    """
+    branch = f'''{select.rstrip()}
+    FROM mensajes
+    WHERE remitente = %s AND destinatario = %s{where}'''
+    if order is None:
+        return f'{branch}\nUNION ALL\n{branch}'
+    branch = f'({branch}\n    ORDER BY {order}\n    LIMIT %s)'
+    return f'{branch}\nUNION ALL\n{branch}\nORDER BY {order}\nLIMIT %s'
+
+
+def both_params(user1, user2, params=(), limit=None):
+    """Parámetros de both_directions: cada rama y, si hay límite, el de fuera."""
+    if limit is None:
+        return (user1, user2) + params + (user2, user1) + params
+    return ((user1, user2) + params + (limit,)
+            + (user2, user1) + params + (limit, limit))
+
+
+ASC = 'timestamp ASC, message_id ASC'
+DESC = 'timestamp DESC, message_id DESC'
+
+# Mensajes nuevos desde la última posición vista
+NEW_QUERY = both_directions(COLUMNS, '''
+      AND (timestamp, message_id) > (%s, %s)''', ASC)
+
+FROM_START_QUERY = both_directions(COLUMNS, '', ASC)
+
+# Los del margen anterior al cursor, por si alguno se confirmó tarde
+OVERLAP_QUERY = both_directions(COLUMNS, '''
+      AND timestamp > %s - make_interval(secs => %s)
+      AND (timestamp, message_id) <= (%s, %s)''', ASC)
+
+# Mensajes ya conocidos que se marcaron como leídos después (con el mismo
+# margen sobre read_at). Cada rama va por mensajes_lectura_idx (0011): sin
+# él se recorría toda la conversación.
+READ_UPDATES_QUERY = both_directions('''
+    SELECT message_id, read_at''', '''
+      AND read_at > %s - make_interval(secs => %s)
+      AND (timestamp, message_id) <= (%s, %s)''')
+
+BEFORE_QUERY = both_directions(COLUMNS, '''
+      AND (timestamp, message_id) < (%s, %s)''', DESC)
+
+LAST_PAGE_QUERY = both_directions(COLUMNS, '', DESC)
+
+NOW_QUERY = 'SELECT NOW() as now'
+
+
+def read_args(args):
+    """
+    (user1, user2, limit, since, before) de la query string, con los
+    cursores ya decodificados. Lanza InvalidCursor.
+    """
+    since = args.get('since')
+    before = args.get('before')
+    return (args.get('user1'), args.get('user2'),
+            parse_limit(args.get('limit'), default=50, maximum=200),
+            decode_sync_cursor(since) if since else None,
+            decode_cursor(before) if before else None)
+
+
+def sync_queries(user1, user2, since, limit):
+    """[(sql, params)] para 'since', en el orden que espera sync_response."""
+    since_ts, since_id, read_ts = since
+    if not since_ts:
+        return [(FROM_START_QUERY, both_params(user1, user2, limit=limit + 1))]
+    return [
+        (NEW_QUERY, both_params(user1, user2, (since_ts, since_id), limit + 1)),
+        (OVERLAP_QUERY, both_params(user1, user2, (since_ts, SYNC_OVERLAP, since_ts, since_id),
+                                    limit)),
+        (READ_UPDATES_QUERY, both_params(user1, user2,
+                                         (read_ts, SYNC_OVERLAP, since_ts, since_id))),
+    ]
+
+
+def sync_response(results, since, limit):
+    """Respuesta de 'since' con los resultados de sync_queries."""
+    since_ts, since_id, read_ts = since
+    messages = [dict(m) for m in results[0]]
+    overlap = [dict(m) for m in results[1]] if len(results) > 1 else []
+    read_updates = [dict(r) for r in results[2]] if len(results) > 2 else []
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    # El cursor sigue avanzando sólo con los mensajes nuevos
+    last = messages[-1] if messages else None
+    messages = overlap + messages
+    read_times = [r['read_at'] for r in read_updates + messages if r['read_at']]
+    return {
+        'success': True,
+        'data': messages,
+        'readUpdates': read_updates,
+        'cursor': encode_sync_cursor(
+            last['timestamp'] if last else since_ts,
+            last['message_id'] if last else since_id,
+            max(read_times + [read_ts])
+        ),
+        'hasMore': has_more
+    }
+
+
+def page_queries(user1, user2, before, limit):
+    """
+    [(sql, params)] de la página anterior a 'before' (o la última) y del
+    momento de la lectura: los cambios de lectura posteriores llegarán con
+    'since'.
+    """
+    if before:
+        page = (BEFORE_QUERY, both_params(user1, user2, (before[0], before[1]), limit + 1))
+    else:
+        page = (LAST_PAGE_QUERY, both_params(user1, user2, limit=limit + 1))
+    return [page, (NOW_QUERY, ())]
+
+
+def page_response(results, before, limit):
+    """Respuesta de una página con los resultados de page_queries."""
+    messages = [dict(m) for m in results[0]]
+    now = results[1][0]['now']
+
+    prev_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        prev_cursor = encode_cursor(messages[-1]['timestamp'], messages[-1]['message_id'])
+    messages.reverse()
+
+    response = {
+        'success': True,
+        'data': messages,
+        'prevCursor': prev_cursor
+    }
+    if not before:
+        last = messages[-1] if messages else None
+        response['cursor'] = encode_sync_cursor(
+            last['timestamp'] if last else None,
+            last['message_id'] if last else None,
+            now
+        )
+    return response
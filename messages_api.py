@@ -0,0 +1,179 @@
+# API de mensajería: conversaciones, mensajes, envío y marcar como leídos.
+# Los mensajes nuevos se publican además por WebSocket (ver realtime.py)
+import uuid
+
+from flask import Blueprint, request
+
+import inbox
+import messages
+import streaming
+from metrics import jsonify
+from pagination import InvalidCursor
+from profiles import get_profiles
+from realtime import publish
+from resources import get_db_connection
+
+bp = Blueprint('messages_api', __name__)
+
+# API: Obtener conversaciones
+# En streaming desde un cursor del servidor si la bandeja es grande.
+# Consulta y formato en inbox.py (compartidos con async_api.py).
+@bp.route('/api/conversations', methods=['GET'])
+def get_conversations():
+    try:
+        username = request.args.get('user')
+        if not username:
+            return jsonify({'success': False, 'message': 'Usuario requerido'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = streaming.server_cursor(conn)
+        cur.execute(inbox.CONVERSATIONS_QUERY, (username,))
+        
+        def with_contacts(conversations):
+            # Avatares de los contactos del bloque en una sola consulta (o de la caché)
+            contacts = get_profiles([conv['username'] for conv in conversations], get_db_connection)
+            return inbox.with_contacts(conversations, contacts)
+        
+        return streaming.list_response(cur, with_contacts, success=True)
+        
+    except Exception as e:
+        print(f"Error obteniendo conversaciones: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Obtener mensajes entre dos usuarios
+# Sin cursores devuelve la última página de la conversación; con 'since' los
+# mensajes nuevos y los cambios de lectura, y con 'before' la página
+# anterior. Consultas y formato en messages.py (compartidos con async_api.py).
+@bp.route('/api/messages', methods=['GET'])
+def get_messages():
+    try:
+        try:
+            user1, user2, limit, since, before = messages.read_args(request.args)
+        except InvalidCursor as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        if not all([user1, user2]):
+            return jsonify({'success': False, 'message': 'Usuarios requeridos'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        if since:
+            queries = messages.sync_queries(user1, user2, since, limit)
+        else:
+            queries = messages.page_queries(user1, user2, before, limit)
+        cur = conn.cursor()
+        results = []
+        for sql, params in queries:
+            cur.execute(sql, params)
+            results.append(cur.fetchall())
+        cur.close()
+        
+        if since:
+            return jsonify(messages.sync_response(results, since, limit))
+        return jsonify(messages.page_response(results, before, limit))
+        
+    except Exception as e:
+        print(f"Error obteniendo mensajes: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Enviar mensaje
+@bp.route('/api/send-message', methods=['POST'])
+def send_message():
+    try:
+        data = request.get_json()
+        remitente = data.get('from')
+        destinatario = data.get('to')
+        mensaje = data.get('message')
+        
+        if not all([remitente, destinatario, mensaje]):
+            return jsonify({'success': False, 'message': 'Datos incompletos'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        
+        message_id = str(uuid.uuid4())
+        
+        cur.execute('''
+            INSERT INTO mensajes (message_id, remitente, destinatario, mensaje)
+            VALUES (%s, %s, %s, %s)
+            RETURNING timestamp
+        ''', (message_id, remitente, destinatario, mensaje))
+        timestamp = cur.fetchone()['timestamp']
+
+        # Mantener la bandeja de entrada de ambos en la misma transacción
+        inbox.record_message(cur, remitente, destinatario, mensaje, timestamp)
+        
+        conn.commit()
+        cur.close()
+
+        # Entregar el mensaje en tiempo real a los dos participantes
+        publish([remitente, destinatario], 'new_message', {
+            'message_id': message_id,
+            'from': remitente,
+            'to': destinatario,
+            'message': mensaje,
+            'read': False,
+            'timestamp': timestamp.isoformat(),
+            'read_at': None
+        })
+        
+        return jsonify({
+            'success': True,
+            'message': 'Mensaje enviado',
+            'messageId': message_id
+        })
+        
+    except Exception as e:
+        print(f"Error enviando mensaje: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Marcar mensajes como leídos
+@bp.route('/api/mark-as-read', methods=['POST'])
+def mark_as_read():
+    try:
+        data = request.get_json()
+        remitente = data.get('from')
+        destinatario = data.get('to')
+        
+        if not all([remitente, destinatario]):
+            return jsonify({'success': False, 'message': 'Datos incompletos'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        cur.execute('''
+            UPDATE mensajes
+            SET leido = true, read_at = NOW()
+            WHERE remitente = %s AND destinatario = %s AND leido = false
+            RETURNING message_id, read_at
+        ''', (remitente, destinatario))
+        read_rows = cur.fetchall()
+        inbox.mark_read(cur, destinatario, remitente, len(read_rows))
+        
+        conn.commit()
+        cur.close()
+
+        # Confirmación de lectura para quien envió los mensajes
+        if read_rows:
+            publish([remitente, destinatario], 'messages_read', {
+                'from': remitente,
+                'to': destinatario,
+                'messageIds': [r['message_id'] for r in read_rows],
+                'readAt': read_rows[0]['read_at'].isoformat()
+            })
+        
+        return jsonify({'success': True})
+        
+    except Exception as e:
+        print(f"Error marcando como leído: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
@@ -0,0 +1,264 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from flask import jsonify as flask_jsonify
+from psycopg2.extras import RealDictCursor
+
+import config
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500, 1000, 5000, 10000, 100000)
+BYTE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+class Histogram:
+    """Histograma acumulativo al estilo Prometheus (buckets fijos)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    Contadores e histogramas del proceso. Con varios workers de gunicorn
+    cada uno expone los suyos; Prometheus los suma por instancia.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._buckets = {}
+        self._series = {}       # nombre -> {labels: Histogram | float}
+        self._gauges = []       # (prefijo, función que devuelve {clave: valor})
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._help[name] = help_text
+        self._types[name] = 'histogram'
+        self._buckets[name] = buckets
+        self._series.setdefault(name, {})
+
+    def counter(self, name, help_text):
+        self._help[name] = help_text
+        self._types[name] = 'counter'
+        self._series.setdefault(name, {})
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            if key not in series:
+                series[key] = Histogram(self._buckets[name])
+            series[key].observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            series[key] = series.get(key, 0) + value
+
+    def gauge_callback(self, prefix, callback):
+        """
+        Expone como gauges {prefix}_{clave} los valores numéricos que devuelva
+        callback(). Registrar otra vez el mismo prefijo (otra app creada con
+        create_app en el mismo proceso) sustituye al anterior.
+        """
+        with self._lock:
+            self._gauges = [(p, c) for p, c in self._gauges if p != prefix]
+            self._gauges.append((prefix, callback))
+
+    def render(self):
+        """Texto en formato de exposición de Prometheus."""
+        lines = []
+        with self._lock:
+            for name, series in self._series.items():
+                lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {self._types[name]}')
+                for key, value in series.items():
+                    if isinstance(value, Histogram):
+                        cumulative = 0
+                        for bound, count in zip(self._buckets[name] + ('+Inf',), value.counts):
+                            cumulative += count
+                            lines.append(f'{name}_bucket{_labels(key, le=bound)} {cumulative}')
+                        lines.append(f'{name}_sum{_labels(key)} {value.sum}')
+                        lines.append(f'{name}_count{_labels(key)} {value.count}')
+                    else:
+                        lines.append(f'{name}{_labels(key)} {value}')
+
+        for prefix, callback in self._gauges:
+            try:
+                values = callback()
+            except Exception as e:
+                print(f"Error leyendo métricas {prefix}: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'# TYPE {prefix}_{key} gauge')
+                    lines.append(f'{prefix}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(key, **extra):
+    items = list(key) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+registry = Registry()
+registry.histogram('http_request_duration_seconds', 'Latencia total por endpoint')
+registry.histogram('http_request_db_seconds', 'Tiempo en la base de datos por endpoint')
+registry.histogram('http_serialize_seconds', 'Tiempo en jsonify por endpoint')
+registry.histogram('http_response_bytes', 'Tamaño de la respuesta por endpoint', BYTE_BUCKETS)
+registry.histogram('db_checkout_seconds', 'Espera para obtener una conexión del pool por endpoint')
+registry.histogram('db_query_seconds', 'Tiempo de execute por consulta')
+registry.histogram('db_fetch_seconds', 'Tiempo de fetch por consulta')
+registry.histogram('db_query_rows', 'Filas devueltas por consulta', ROW_BUCKETS)
+registry.counter('db_slow_queries_total', 'Consultas por encima de SLOW_QUERY_MS')
+
+
+# ---------- Consultas ----------
+
+
+def configure(settings):
+    global SLOW_QUERY_SECONDS
+    # Umbral del log de consultas lentas (SLOW_QUERY_MS; vacío = desactivado)
+    slow_ms = settings['SLOW_QUERY_MS']
+    SLOW_QUERY_SECONDS = slow_ms / 1000 if slow_ms is not None else None
+
+
+config.register(configure)
+
+_NAME_COMMENT = re.compile(r'^\s*--\s*name:\s*([\w.-]+)')
+_VERB = re.compile(r'^\s*(?:WITH\b.*?\)\s*)?(SELECT|INSERT|UPDATE|DELETE)\b', re.I | re.S)
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+([a-z_][\w.]*)', re.I)
+
+
+def query_name(sql):
+    """
+    Nombre estable de una consulta: el comentario '-- name: x' si lo tiene,
+    si no '<endpoint>.<verbo>_<tabla>' (p. ej. get_all_videos.select_videos).
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors='replace')
+    match = _NAME_COMMENT.match(sql)
+    if match:
+        return match.group(1)
+    verb = _VERB.match(sql)
+    table = _TABLE.search(sql)
+    base = (verb.group(1).lower() if verb else sql.split(None, 1)[0].lower() if sql.strip() else 'sql')
+    if table:
+        base += '_' + table.group(1).lower()
+    endpoint = request.endpoint if has_request_context() else 'background'
+    return f'{endpoint or "unknown"}.{base}'
+
+
+def param_shapes(params):
+    """Describe los parámetros por tipo (y longitud de listas) sin sus valores."""
+    def shape(value):
+        if isinstance(value, (list, tuple)):
+            return f'{type(value).__name__}[{len(value)}]'
+        return type(value).__name__
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{k}: {shape(v)}' for k, v in params.items()) + '}'
+    return '(' + ', '.join(shape(v) for v in params) + ')'
+
+
+def _add_db_time(seconds):
+    if has_request_context():
+        g.metrics_db_time = g.get('metrics_db_time', 0.0) + seconds
+
+
+class InstrumentedCursor(RealDictCursor):
+    """Cursor que mide execute/fetch, cuenta filas y registra consultas lentas."""
+
+    def execute(self, query, vars=None):
+        self._metrics_name = query_name(query)
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.observe('db_query_seconds', elapsed, query=self._metrics_name)
+            _add_db_time(elapsed)
+            if SLOW_QUERY_SECONDS is not None and elapsed >= SLOW_QUERY_SECONDS:
+                registry.inc('db_slow_queries_total', query=self._metrics_name)
+                sql = query.decode(errors='replace') if isinstance(query, bytes) else query
+                print(f"Consulta lenta ({elapsed * 1000:.1f} ms) [{self._metrics_name}]: "
+                      f"{' '.join(sql.split())} params={param_shapes(vars)}")
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        rows = fetch(*args)
+        elapsed = time.perf_counter() - start
+        name = getattr(self, '_metrics_name', 'unknown')
+        registry.observe('db_fetch_seconds', elapsed, query=name)
+        registry.observe('db_query_rows', len(rows) if isinstance(rows, list) else int(rows is not None),
+                         query=name)
+        _add_db_time(elapsed)
+        return rows
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+# ---------- Peticiones ----------
+
+def jsonify(*args, **kwargs):
+    """flask.jsonify midiendo el tiempo de serialización del endpoint."""
+    start = time.perf_counter()
+    response = flask_jsonify(*args, **kwargs)
+    if has_request_context():
+        registry.observe('http_serialize_seconds', time.perf_counter() - start,
+                         endpoint=request.endpoint or 'unknown')
+    return response
+
+
+def observe_checkout(seconds):
+    endpoint = request.endpoint if has_request_context() else 'background'
+    registry.observe('db_checkout_seconds', seconds, endpoint=endpoint or 'unknown')
+
+
+def init_metrics(app):
+    """Mide latencia, tiempo en BD y tamaño de respuesta de cada ruta."""
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_start = time.perf_counter()
+        g.metrics_db_time = 0.0
+
+    @app.after_request
+    def _metrics_end(response):
+        start = g.get('metrics_start')
+        if start is None:
+            return response
+        endpoint = request.endpoint or 'unknown'
+        registry.observe('http_request_duration_seconds', time.perf_counter() - start,
+                         endpoint=endpoint, method=request.method, status=response.status_code)
+        registry.observe('http_request_db_seconds', g.get('metrics_db_time', 0.0), endpoint=endpoint)
+        if not response.is_streamed and response.content_length is not None:
+            registry.observe('http_response_bytes', response.content_length, endpoint=endpoint)
+        return response
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import re
+
+from psycopg2.extensions import cursor as tuple_cursor
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Clave del advisory lock: evita que dos procesos migren a la vez
+MIGRATION_LOCK_ID = 724031
+
+_MIGRATION_FILE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+
+
+class MigrationError(Exception):
+    """Una migración falló o ya aplicada fue modificada."""
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Devuelve [(versión, nombre, sql, checksum)] ordenado por versión."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode()).hexdigest()
+        migrations.append((int(match.group(1)), match.group(2), sql, checksum))
+
+    migrations.sort()
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError('Hay dos migraciones con el mismo número de versión')
+    return migrations
+
+
+def _ensure_table(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     INTEGER PRIMARY KEY,
+            nombre      TEXT NOT NULL,
+            checksum    TEXT NOT NULL,
+            aplicada_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    ''')
+
+
+def applied_migrations(conn):
+    cur = conn.cursor(cursor_factory=tuple_cursor)
+    _ensure_table(cur)
+    cur.execute('SELECT version, checksum FROM schema_migrations')
+    applied = {row[0]: row[1] for row in cur.fetchall()}
+    conn.commit()
+    cur.close()
+    return applied
+
+
+def migrate(conn, target=None, directory=MIGRATIONS_DIR):
+    """
+    Aplica en orden las migraciones pendientes, cada una en su propia
+    transacción. Devuelve la lista de migraciones aplicadas.
+    """
+    cur = conn.cursor(cursor_factory=tuple_cursor)
+    cur.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+    conn.commit()
+    done = []
+    try:
+        applied = applied_migrations(conn)
+        for version, name, sql, checksum in discover_migrations(directory):
+            if target is not None and version > target:
+                break
+            if version in applied:
+                if applied[version] != checksum:
+                    raise MigrationError(
+                        f'La migración {version:04d}_{name} cambió después de aplicarse')
+                continue
+            try:
+                cur.execute(sql)
+                cur.execute('''
+                    INSERT INTO schema_migrations (version, nombre, checksum)
+                    VALUES (%s, %s, %s)
+                ''', (version, name, checksum))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise MigrationError(f'Error aplicando {version:04d}_{name}: {e}')
+            done.append(f'{version:04d}_{name}')
+    finally:
+        cur.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+        conn.commit()
+        cur.close()
+    return done
+
+
+def migration_status(conn, directory=MIGRATIONS_DIR):
+    """Devuelve [(versión, nombre, estado)] con estado 'aplicada', 'pendiente' o 'modificada'."""
+    applied = applied_migrations(conn)
+    status = []
+    for version, name, _, checksum in discover_migrations(directory):
+        if version not in applied:
+            state = 'pendiente'
+        elif applied[version] != checksum:
+            state = 'modificada'
+        else:
+            state = 'aplicada'
+        status.append((version, name, state))
+    return status
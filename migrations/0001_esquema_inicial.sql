@@ -0,0 +1,77 @@
+-- Esquema base que usa app.py. Todas las sentencias usan IF NOT EXISTS para
+-- poder aplicar la migración sobre una base que ya tenía las tablas.
+
+CREATE TABLE IF NOT EXISTS usuarios (
+    id                 UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    username           TEXT NOT NULL,
+    password           TEXT NOT NULL,
+    plan               TEXT NOT NULL DEFAULT 'azul',
+    image_url          TEXT,
+    likes              INTEGER NOT NULL DEFAULT 0,
+    followers          INTEGER NOT NULL DEFAULT 0,
+    following          INTEGER NOT NULL DEFAULT 0,
+    likes_disponibles  INTEGER NOT NULL DEFAULT 0,
+    likes_ganados      INTEGER NOT NULL DEFAULT 0,
+    dinero_ganado      NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    ultima_conexion    TIMESTAMPTZ,
+    fecha_registro     TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS videos (
+    id               SERIAL PRIMARY KEY,
+    video_id         TEXT NOT NULL,
+    username         TEXT NOT NULL,
+    titulo           TEXT NOT NULL,
+    descripcion      TEXT,
+    video_url        TEXT NOT NULL,
+    thumbnail_url    TEXT,
+    music_url        TEXT,
+    music_name       TEXT,
+    likes            INTEGER NOT NULL DEFAULT 0,
+    visualizaciones  INTEGER NOT NULL DEFAULT 0,
+    comentarios      INTEGER NOT NULL DEFAULT 0,
+    fecha_subida     TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS likes (
+    id         BIGSERIAL PRIMARY KEY,
+    video_id   TEXT NOT NULL,
+    username   TEXT NOT NULL,
+    timestamp  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS vistas (
+    id         BIGSERIAL PRIMARY KEY,
+    video_id   TEXT NOT NULL,
+    username   TEXT NOT NULL,
+    timestamp  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS comentarios (
+    id            BIGSERIAL PRIMARY KEY,
+    comment_id    TEXT NOT NULL,
+    video_id      TEXT NOT NULL,
+    username      TEXT NOT NULL,
+    comment_text  TEXT NOT NULL,
+    image_url     TEXT,
+    timestamp     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    edited        BOOLEAN NOT NULL DEFAULT false
+);
+
+CREATE TABLE IF NOT EXISTS seguidores (
+    id         BIGSERIAL PRIMARY KEY,
+    follower   TEXT NOT NULL,
+    following  TEXT NOT NULL,
+    timestamp  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS mensajes (
+    id            BIGSERIAL PRIMARY KEY,
+    message_id    TEXT NOT NULL,
+    remitente     TEXT NOT NULL,
+    destinatario  TEXT NOT NULL,
+    mensaje       TEXT NOT NULL,
+    leido         BOOLEAN NOT NULL DEFAULT false,
+    timestamp     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    read_at       TIMESTAMPTZ
+);
@@ -0,0 +1,15 @@
+-- Bandeja de entrada materializada (ver inbox.py). Una vez creada se
+-- rellena con: flask --app app rebuild-inbox
+
+CREATE TABLE IF NOT EXISTS conversaciones (
+    usuario           TEXT NOT NULL,
+    contacto          TEXT NOT NULL,
+    ultimo_mensaje    TEXT,
+    ultimo_timestamp  TIMESTAMPTZ NOT NULL,
+    ultimo_remitente  TEXT NOT NULL,
+    no_leidos         INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (usuario, contacto)
+);
+
+CREATE INDEX IF NOT EXISTS conversaciones_usuario_timestamp_idx
+    ON conversaciones (usuario, ultimo_timestamp DESC);
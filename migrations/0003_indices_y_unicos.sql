@@ -0,0 +1,57 @@
+-- Índices de las búsquedas calientes y restricciones de unicidad.
+-- Antes de crear los índices únicos se eliminan los duplicados que pudo
+-- dejar el "SELECT y luego INSERT" de like_video / follow_user, y se
+-- comprueba que no haya usernames repetidos.
+
+DELETE FROM likes a USING likes b
+WHERE a.video_id = b.video_id AND a.username = b.username AND a.id > b.id;
+
+DELETE FROM seguidores a USING seguidores b
+WHERE a.follower = b.follower AND a.following = b.following AND a.id > b.id;
+
+-- register también hacía "SELECT y luego INSERT", pero dos filas de usuarios
+-- con el mismo username son dos cuentas (contraseña, saldo, plan): no se
+-- elige una a ciegas. Si las hay, la migración para con la lista y no se
+-- aplica nada; hay que dejar una fila por username y volver a migrar.
+DO $$
+DECLARE
+    repetidos TEXT;
+    total     INTEGER;
+BEGIN
+    SELECT string_agg(format('%L (%s filas)', username, n), ', ' ORDER BY username),
+           COUNT(*)
+    INTO repetidos, total
+    FROM (
+        SELECT username, COUNT(*) AS n FROM usuarios
+        GROUP BY username HAVING COUNT(*) > 1
+        ORDER BY username
+        LIMIT 50
+    ) d;
+    IF total > 0 THEN
+        SELECT COUNT(*) INTO total
+        FROM (SELECT 1 FROM usuarios GROUP BY username HAVING COUNT(*) > 1) d;
+        RAISE EXCEPTION 'usuarios tiene % nombres de usuario repetidos: %', total, repetidos
+            USING HINT = 'Deja una sola fila por username en usuarios y vuelve a ejecutar las migraciones';
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS usuarios_username_key ON usuarios (username);
+CREATE UNIQUE INDEX IF NOT EXISTS videos_video_id_key ON videos (video_id);
+CREATE UNIQUE INDEX IF NOT EXISTS likes_video_username_key ON likes (video_id, username);
+CREATE UNIQUE INDEX IF NOT EXISTS seguidores_follower_following_key ON seguidores (follower, following);
+CREATE UNIQUE INDEX IF NOT EXISTS comentarios_comment_id_key ON comentarios (comment_id);
+CREATE UNIQUE INDEX IF NOT EXISTS mensajes_message_id_key ON mensajes (message_id);
+
+-- Feed (keyset sobre fecha_subida, video_id) y videos de un usuario
+CREATE INDEX IF NOT EXISTS videos_fecha_subida_idx ON videos (fecha_subida, video_id);
+CREATE INDEX IF NOT EXISTS videos_username_fecha_idx ON videos (username, fecha_subida);
+
+-- Conversación entre dos usuarios, paginada por (timestamp, message_id)
+CREATE INDEX IF NOT EXISTS mensajes_conversacion_idx
+    ON mensajes (remitente, destinatario, timestamp, message_id);
+
+-- Comentarios de un video, del más nuevo al más viejo
+CREATE INDEX IF NOT EXISTS comentarios_video_timestamp_idx
+    ON comentarios (video_id, timestamp, comment_id);
+
+CREATE INDEX IF NOT EXISTS vistas_video_idx ON vistas (video_id);
@@ -0,0 +1,10 @@
+-- Fragmentos de contadores calientes (ver counters.py). Cada fila es un
+-- incremento pendiente de plegar en la columna del contador.
+
+CREATE TABLE IF NOT EXISTS contadores_fragmentados (
+    contador  TEXT NOT NULL,
+    clave     TEXT NOT NULL,
+    slot      SMALLINT NOT NULL,
+    delta     INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (contador, clave, slot)
+);
@@ -0,0 +1,7 @@
+-- Sellos de versión por recurso (ver etags.py). Cada escritura suma 1 a
+-- la versión de lo que cambia; los ETag de las lecturas salen de aquí.
+
+CREATE TABLE IF NOT EXISTS versiones (
+    recurso  TEXT PRIMARY KEY,
+    version  BIGINT NOT NULL DEFAULT 0
+);
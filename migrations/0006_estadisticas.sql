@@ -0,0 +1,37 @@
+-- Estadísticas agregadas por hora y por día (ver analytics.py), por video y
+-- por creador, calculadas de forma incremental desde vistas y likes.
+
+CREATE TABLE IF NOT EXISTS estadisticas (
+    alcance       TEXT NOT NULL,          -- 'video' o 'creador'
+    clave         TEXT NOT NULL,          -- video_id o username del creador
+    granularidad  TEXT NOT NULL,          -- 'hora' o 'dia'
+    bucket        TIMESTAMPTZ NOT NULL,   -- inicio de la hora / del día (UTC)
+    vistas        BIGINT NOT NULL DEFAULT 0,
+    espectadores  BIGINT NOT NULL DEFAULT 0,
+    likes         BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (alcance, clave, granularidad, bucket)
+);
+
+-- Quién vio ya cada video / a cada creador en cada bucket, para contar
+-- espectadores únicos entre lotes. Se purga pasados unos días.
+CREATE TABLE IF NOT EXISTS estadisticas_espectadores (
+    alcance       TEXT NOT NULL,
+    clave         TEXT NOT NULL,
+    granularidad  TEXT NOT NULL,
+    bucket        TIMESTAMPTZ NOT NULL,
+    username      TEXT NOT NULL,
+    PRIMARY KEY (alcance, clave, granularidad, bucket, username)
+);
+
+CREATE INDEX IF NOT EXISTS estadisticas_espectadores_bucket_idx
+    ON estadisticas_espectadores (bucket);
+
+-- Último id de cada tabla de eventos ya agregado
+CREATE TABLE IF NOT EXISTS estadisticas_marcas (
+    fuente       TEXT PRIMARY KEY,
+    ultimo_id    BIGINT NOT NULL DEFAULT 0,
+    actualizado  TIMESTAMPTZ
+);
+
+INSERT INTO estadisticas_marcas (fuente) VALUES ('vistas'), ('likes')
+ON CONFLICT (fuente) DO NOTHING;
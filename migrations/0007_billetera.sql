@@ -0,0 +1,43 @@
+-- Libro de movimientos de la billetera (ver ledger.py). Sólo se añaden
+-- filas; el saldo de un usuario es su última foto en saldos más los
+-- movimientos posteriores.
+
+CREATE TABLE IF NOT EXISTS movimientos (
+    id                 BIGSERIAL PRIMARY KEY,
+    username           TEXT NOT NULL,
+    tipo               TEXT NOT NULL,            -- 'apertura', 'like', 'pago', ...
+    likes_disponibles  BIGINT NOT NULL DEFAULT 0,
+    likes_ganados      BIGINT NOT NULL DEFAULT 0,
+    centimos           BIGINT NOT NULL DEFAULT 0, -- dinero ganado, en céntimos
+    referencia         TEXT,
+    timestamp          TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS movimientos_username_id_idx ON movimientos (username, id);
+
+-- Foto del saldo de cada usuario con todos sus movimientos hasta hasta_id
+CREATE TABLE IF NOT EXISTS saldos (
+    username           TEXT PRIMARY KEY,
+    hasta_id           BIGINT NOT NULL,
+    likes_disponibles  BIGINT NOT NULL DEFAULT 0,
+    likes_ganados      BIGINT NOT NULL DEFAULT 0,
+    centimos           BIGINT NOT NULL DEFAULT 0,
+    actualizado        TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Último movimiento procesado por la liquidación (pagos y fotos)
+CREATE TABLE IF NOT EXISTS saldos_marca (
+    nombre       TEXT PRIMARY KEY,
+    ultimo_id    BIGINT NOT NULL DEFAULT 0,
+    actualizado  TIMESTAMPTZ
+);
+
+INSERT INTO saldos_marca (nombre) VALUES ('movimientos')
+ON CONFLICT (nombre) DO NOTHING;
+
+-- Los valores que ya tenía usuarios pasan al libro como apertura
+INSERT INTO movimientos (username, tipo, likes_disponibles, likes_ganados, centimos)
+SELECT username, 'apertura', likes_disponibles, likes_ganados, ROUND(dinero_ganado * 100)::bigint
+FROM usuarios
+WHERE (likes_disponibles <> 0 OR likes_ganados <> 0 OR dinero_ganado <> 0)
+  AND NOT EXISTS (SELECT 1 FROM movimientos m WHERE m.username = usuarios.username AND m.tipo = 'apertura');
@@ -0,0 +1,22 @@
+-- Búsqueda de texto completo (ver search.py). Las columnas se generan en
+-- cada INSERT/UPDATE, así save_video y register dejan el índice al día sin
+-- más código. Añadirlas reescribe videos y usuarios una vez.
+
+-- Título (peso A), descripción (B) y música (C), con raíces en español
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS busqueda tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', COALESCE(titulo, '')), 'A') ||
+        setweight(to_tsvector('spanish', COALESCE(descripcion, '')), 'B') ||
+        setweight(to_tsvector('spanish', COALESCE(music_name, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS videos_busqueda_idx ON videos USING GIN (busqueda);
+
+-- Nombres de usuario sin raíces ni palabras vacías: 'user_12' -> 'user', '12'
+ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS busqueda tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', username)) STORED;
+
+CREATE INDEX IF NOT EXISTS usuarios_busqueda_idx ON usuarios USING GIN (busqueda);
+
+-- Usuarios registrados desde una fecha (recarga incremental del autocompletado)
+CREATE INDEX IF NOT EXISTS usuarios_fecha_registro_idx ON usuarios (fecha_registro);
@@ -0,0 +1,23 @@
+-- Subidas reanudables por trozos (ver uploads.py). Los bytes están en el
+-- almacenamiento (storage.py); aquí cuántos se han recibido y comprobado,
+-- que es desde donde continúa el cliente tras un corte.
+
+CREATE TABLE IF NOT EXISTS subidas (
+    upload_id     TEXT PRIMARY KEY,
+    username      TEXT NOT NULL,
+    tipo          TEXT NOT NULL,                  -- 'video' o 'imagen'
+    content_type  TEXT NOT NULL,
+    tamano        BIGINT NOT NULL,                -- bytes del fichero completo
+    recibido      BIGINT NOT NULL DEFAULT 0,      -- bytes escritos y comprobados
+    sha256        TEXT,                           -- del fichero completo, si el cliente lo da
+    estado        TEXT NOT NULL DEFAULT 'abierta', -- 'abierta' o 'completa'
+    media_url     TEXT,                           -- al completarse
+    video_id      TEXT,                           -- video registrado con esta subida
+    creada        TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    actualizada   TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Subidas abiertas de un usuario (límite de subidas a la vez) y las
+-- abandonadas que hay que limpiar
+CREATE INDEX IF NOT EXISTS subidas_abiertas_username_idx ON subidas (username) WHERE estado = 'abierta';
+CREATE INDEX IF NOT EXISTS subidas_abiertas_actualizada_idx ON subidas (actualizada) WHERE estado = 'abierta';
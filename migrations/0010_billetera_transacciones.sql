@@ -0,0 +1,20 @@
+-- La liquidación (ledger.py) avanza por transacción y no sólo por id: cada
+-- movimiento guarda la transacción que lo escribió y la marca y las fotos
+-- de saldo son (transaccion, id). Un id bajo puede confirmarse después que
+-- uno alto; una transacción anterior a pg_snapshot_xmin ya terminó, así
+-- que sus filas no pueden aparecer después. xid8 y pg_current_xact_id son
+-- de PostgreSQL 13, como gen_random_uuid en 0001.
+--
+-- Las filas que ya había quedan en la transacción 0, en el mismo orden de
+-- id que tenían: la marca y las fotos siguen valiendo tal cual.
+
+ALTER TABLE movimientos ADD COLUMN IF NOT EXISTS transaccion xid8 NOT NULL DEFAULT '0';
+ALTER TABLE movimientos ALTER COLUMN transaccion SET DEFAULT pg_current_xact_id();
+
+ALTER TABLE saldos ADD COLUMN IF NOT EXISTS hasta_transaccion xid8 NOT NULL DEFAULT '0';
+ALTER TABLE saldos_marca ADD COLUMN IF NOT EXISTS ultima_transaccion xid8 NOT NULL DEFAULT '0';
+
+-- Lote siguiente de la liquidación y movimientos posteriores a una foto
+CREATE INDEX IF NOT EXISTS movimientos_transaccion_idx ON movimientos (transaccion, id);
+CREATE INDEX IF NOT EXISTS movimientos_username_transaccion_idx
+    ON movimientos (username, transaccion, id);
@@ -0,0 +1,7 @@
+-- Cambios de lectura de una conversación ('since' en /api/messages): cada
+-- sentido de la conversación se busca por read_at sin recorrer todo el
+-- historial. Los mensajes sin leer (read_at NULL) no entran en el índice.
+
+CREATE INDEX IF NOT EXISTS mensajes_lectura_idx
+    ON mensajes (remitente, destinatario, read_at)
+    WHERE read_at IS NOT NULL;
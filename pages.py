@@ -0,0 +1,37 @@
+# Páginas HTML de la app: sólo sirven las plantillas, los datos los piden
+# ellas mismas a /api/*
+from flask import Blueprint, render_template
+
+bp = Blueprint('pages', __name__)
+
+@bp.route('/')
+def index():
+    return render_template('index.html')
+
+@bp.route('/perfil')
+def perfil():
+    return render_template('perfil.html')
+
+@bp.route('/videos')
+def videos():
+    return render_template('videos.html')
+
+@bp.route('/chat')
+def chat():
+    return render_template('chat.html')
+
+@bp.route('/mensajes')
+def mensajes():
+    return render_template('mensajes.html')
+
+@bp.route('/streamer')
+def streamer():
+    return render_template('streamer.html')
+
+@bp.route('/billetera')
+def billetera():
+    return render_template('billetera.html')
+
+@bp.route('/editor')
+def editor():
+    return render_template('editor.html')
@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no se puede decodificar."""
+
+
+def _encode(values):
+    raw = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+# Función para convertir una posición (timestamp, id) en un cursor opaco
+def encode_cursor(timestamp, row_id):
+    return _encode([timestamp.isoformat(), str(row_id)])
+
+
+# Función inversa: devuelve (timestamp, id) o lanza InvalidCursor
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = _decode(cursor)
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except Exception:
+        raise InvalidCursor('Cursor inválido')
+
+
+# Cursor de sincronización: posición del último mensaje visto más la
+# marca de tiempo hasta la que ya se conocen los cambios de lectura
+def encode_sync_cursor(timestamp, row_id, read_timestamp):
+    return _encode([timestamp.isoformat() if timestamp else None,
+                    str(row_id) if row_id else None,
+                    read_timestamp.isoformat()])
+
+
+def decode_sync_cursor(cursor):
+    try:
+        timestamp, row_id, read_timestamp = _decode(cursor)
+        return (datetime.fromisoformat(timestamp) if timestamp else None,
+                str(row_id) if row_id else None,
+                datetime.fromisoformat(read_timestamp))
+    except Exception:
+        raise InvalidCursor('Cursor inválido')
+
+
+# Función para leer el tamaño de página de la query string con límites
+def parse_limit(value, default=20, maximum=100):
+    try:
+        limit = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
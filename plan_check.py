@@ -0,0 +1,253 @@
+"""
+Comprobación de regresiones en los planes de consulta.
+
+Aplica las migraciones en una base de datos local desechable, la siembra
+con seed.py, llama a cada endpoint /api/* con el cliente de pruebas de
+Flask grabando todo el SQL que ejecuta, y pasa cada sentencia por EXPLAIN.
+Falla (código de salida 1) si aparece un Seq Scan sobre una tabla grande.
+
+Uso:
+    PLAN_CHECK_DATABASE_URL=postgresql://localhost/likering_plan python plan_check.py [--scale 0.5] [--skip-seed]
+
+¡Vacía las tablas de esa base! Nunca apuntar a la base de producción.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+
+import psycopg2
+from flask import has_request_context, request
+
+import analytics
+import ledger
+import migrate
+from metrics import InstrumentedCursor
+import seed
+
+# Tablas que crecen con el uso: sobre ellas un Seq Scan es una regresión
+LARGE_TABLES = {'usuarios', 'videos', 'likes', 'vistas', 'comentarios',
+                'seguidores', 'mensajes', 'conversaciones',
+                'estadisticas', 'estadisticas_espectadores', 'movimientos', 'saldos', 'subidas'}
+
+# Seq Scans ya conocidos, (endpoint, tabla) -> motivo. Se avisan pero no
+# fallan; hay que quitar la entrada en cuanto se corrija la consulta.
+KNOWN_SEQ_SCANS = {
+    ('background', 'videos'):
+        'carga completa del ranking del feed (ranking.py): lee todos los videos a propósito',
+    ('background', 'usuarios'):
+        'cargas completas del ranking del feed (ranking.py, seguidores de todos los '
+        'creadores) y del autocompletado (search.py, todos los nombres)',
+}
+
+# Sólo se explican consultas y DML (no SAVEPOINT, LOCK, etc.)
+EXPLAINABLE_PREFIXES = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+
+class RecordingCursor(InstrumentedCursor):
+    """Cursor que guarda cada sentencia ejecutada junto al endpoint que la lanzó."""
+
+    statements = []
+
+    def execute(self, query, vars=None):
+        sql = self.mogrify(query, vars).decode()
+        endpoint = request.endpoint if has_request_context() else 'background'
+        RecordingCursor.statements.append((endpoint, sql))
+        return super().execute(query, vars)
+
+
+def run_scenarios(app):
+    """Llama a todos los endpoints con datos del seed (user_1, user_2, video_1...)."""
+    client = app.test_client()
+    resources = app.extensions['recursos']
+    password = seed.SEED_PASSWORD
+
+    def ok(response):
+        if response.status_code >= 500:
+            raise RuntimeError(f'{response.request.path}: {response.get_data(as_text=True)}')
+        return response.get_json() or {}
+
+    def ok_batch(actions):
+        # El lote responde 200 aunque falle alguna acción: se mira cada una
+        results = ok(client.post('/api/batch', json={'actions': actions})).get('results', [])
+        failed = [r for r in results if r.get('status', 200) >= 500]
+        if failed:
+            raise RuntimeError(f'/api/batch: {failed}')
+
+    ok(client.post('/api/login', json={'username': 'user_1', 'password': password}))
+    ok(client.get('/api/user-profile?user=user_1'))
+    ok(client.get('/api/user-videos?user=user_1'))
+
+    feed = ok(client.get('/api/all-videos?user=user_2&limit=20'))
+    if feed.get('nextCursor'):
+        ok(client.get('/api/all-videos?user=user_2&limit=20&cursor=' + feed['nextCursor']))
+
+    # Feed personalizado: carga del ranking y un refresco (quedan como 'background')
+    resources.feed_ranker.run_once()
+    ok(client.post('/api/like-video', json={'videoId': 'video_2', 'username': 'user_9999997'}))
+    resources.feed_ranker.run_once()
+    ranked = ok(client.get('/api/feed?user=user_2&limit=20'))
+    if ranked.get('nextCursor'):
+        ok(client.get('/api/feed?user=user_2&limit=20&cursor=' + ranked['nextCursor']))
+
+    # Términos selectivos: uno que salga en todos los videos (p. ej.
+    # 'video') se resuelve bien leyendo la tabla entera
+    ok(client.get('/api/search?q=descripción 1234'))
+    ok(client.get('/api/search?q=canción 12&type=videos'))
+    ok(client.get('/api/search?q=user_12&type=users'))
+    resources.username_index.run_once()
+    resources.username_index.run_once()
+    ok(client.get('/api/autocomplete?q=user_1'))
+
+    comments = ok(client.get('/api/comments?videoId=video_1'))
+    if comments.get('nextCursor'):
+        ok(client.get('/api/comments?videoId=video_1&cursor=' + comments['nextCursor']))
+    ok(client.post('/api/add-comment', json={'videoId': 'video_1', 'username': 'user_3',
+                                             'commentText': 'plan check'}))
+    ok(client.post('/api/like-video', json={'videoId': 'video_2', 'username': 'user_9999999'}))
+    ok(client.post('/api/record-view', json={'videoId': 'video_3', 'username': 'user_3'}))
+    resources.view_buffer.flush()
+    ok(client.post('/api/follow-user', json={'follower': 'user_3', 'following': 'user_9999999'}))
+    ok(client.post('/api/save-video', json={'usuario': 'user_3', 'titulo': 'plan check',
+                                            'videoUrl': 'v', 'thumbnailUrl': 't'}))
+    # Subida por trozos: un trozo con checksum, reanudación y alta del video
+    content = b'plan check ' * 1000
+    upload = ok(client.post('/api/uploads', json={'usuario': 'user_3', 'contentType': 'video/mp4',
+                                                  'size': len(content),
+                                                  'sha256': hashlib.sha256(content).hexdigest()}))
+    upload_url = '/api/uploads/' + upload['data']['uploadId']
+    half = len(content) // 2
+    for start, end in ((0, half), (half, len(content))):
+        chunk = content[start:end]
+        ok(client.patch(upload_url, data=chunk, headers={
+            'Upload-Offset': str(start), 'X-Chunk-Sha256': hashlib.sha256(chunk).hexdigest()}))
+        ok(client.get(upload_url))
+    ok(client.post(upload_url + '/complete', json={'titulo': 'plan check', 'thumbnailUrl': 't'}))
+    ok(client.post('/api/register', json={'username': 'plan_check_user', 'password': password,
+                                          'imageUrl': 'i'}))
+    ok_batch([
+        {'type': 'view', 'videoId': 'video_4', 'username': 'user_5'},
+        {'type': 'like', 'videoId': 'video_4', 'username': 'user_9999998'},
+        {'type': 'comment', 'videoId': 'video_4', 'username': 'user_5', 'commentText': 'lote'},
+        {'type': 'follow', 'follower': 'user_5', 'following': 'user_9999998'},
+    ])
+    # Lote sólo de seguimientos: la sentencia sin la parte de los likes
+    ok_batch([{'type': 'follow', 'follower': 'user_6', 'following': 'user_9999998'}])
+
+    ok(client.get('/api/conversations?user=user_1'))
+    page = ok(client.get('/api/messages?user1=user_1&user2=user_2&limit=20'))
+    if page.get('prevCursor'):
+        ok(client.get('/api/messages?user1=user_1&user2=user_2&limit=20&before=' + page['prevCursor']))
+    ok(client.post('/api/send-message', json={'from': 'user_2', 'to': 'user_1', 'message': 'plan'}))
+    if page.get('cursor'):
+        ok(client.get('/api/messages?user1=user_1&user2=user_2&since=' + page['cursor']))
+    ok(client.post('/api/mark-as-read', json={'from': 'user_2', 'to': 'user_1'}))
+
+    # Agregados de estadísticas (sus consultas quedan como 'background')
+    conn = resources.db_pool.getconn()
+    try:
+        analytics.rollup_all(conn, batch_size=5000, max_batches=2)
+        analytics.prune_viewers(conn)
+    finally:
+        resources.db_pool.putconn(conn)
+    ok(client.get('/api/creator-stats?user=user_1'))
+    ok(client.get('/api/creator-stats?user=user_1&granularity=hour&periods=48'))
+    ok(client.get('/api/video-stats?videoId=video_1'))
+
+    # Billetera: con y sin foto de saldo
+    ok(client.get('/api/wallet?user=user_1'))
+    conn = resources.db_pool.getconn()
+    try:
+        ledger.run_all(conn, batch_size=5000, max_batches=2)
+    finally:
+        resources.db_pool.putconn(conn)
+    wallet = ok(client.get('/api/wallet?user=user_1&limit=20'))
+    if wallet.get('nextBefore'):
+        ok(client.get(f"/api/wallet?user=user_1&limit=20&before={wallet['nextBefore']}"))
+
+
+def seq_scans(plan):
+    """Devuelve las tablas grandes que el plan recorre con Seq Scan."""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in LARGE_TABLES:
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found += seq_scans(child)
+    return found
+
+
+def explain(conn, sql):
+    cur = conn.cursor()
+    try:
+        cur.execute('EXPLAIN (FORMAT JSON) ' + sql)
+        return cur.fetchone()[0][0]['Plan']
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def check_plans(conn, statements):
+    """Devuelve [(endpoint, tablas, sql)] con los planes que hacen Seq Scan."""
+    results = []
+    seen = set()
+    for endpoint, sql in statements:
+        normalized = ' '.join(sql.split())
+        if not normalized.upper().startswith(EXPLAINABLE_PREFIXES) or (endpoint, normalized) in seen:
+            continue
+        seen.add((endpoint, normalized))
+        tables = seq_scans(explain(conn, sql))
+        if tables:
+            results.append((endpoint, sorted(set(tables)), normalized))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Comprueba que ningún endpoint haga Seq Scan en tablas grandes')
+    parser.add_argument('--scale', type=float, default=1.0, help='Escala del seed (1.0 = seed.DEFAULT_COUNTS)')
+    parser.add_argument('--skip-seed', action='store_true', help='Reutilizar los datos ya sembrados')
+    args = parser.parse_args(argv)
+
+    dsn = os.getenv('PLAN_CHECK_DATABASE_URL')
+    if not dsn:
+        print('Define PLAN_CHECK_DATABASE_URL con una base de datos local desechable')
+        return 2
+
+    # La app lee DATABASE_URL al crearse: se apunta a la base de pruebas
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('STORAGE_DIR', tempfile.mkdtemp(prefix='plan_check_'))
+    conn = psycopg2.connect(dsn)
+    print('Aplicando migraciones:', ', '.join(migrate.migrate(conn)) or 'ninguna pendiente')
+    if not args.skip_seed:
+        print('Sembrando datos...')
+        seed.seed(conn, seed.seed_counts(args.scale))
+
+    from app import create_app
+    app = create_app()
+    app.extensions['recursos'].db_pool.cursor_factory = RecordingCursor
+    run_scenarios(app)
+
+    results = check_plans(conn, RecordingCursor.statements)
+    conn.close()
+
+    endpoints = sorted({e for e, _ in RecordingCursor.statements})
+    print(f"Sentencias revisadas: {len(RecordingCursor.statements)} en {len(endpoints)} endpoints")
+    failures = []
+    for endpoint, tables, sql in results:
+        new_tables = [t for t in tables if (endpoint, t) not in KNOWN_SEQ_SCANS]
+        for table in tables:
+            if (endpoint, table) in KNOWN_SEQ_SCANS:
+                print(f"\nAviso (conocido) Seq Scan en {table} ({endpoint}): "
+                      f"{KNOWN_SEQ_SCANS[(endpoint, table)]}")
+        if new_tables:
+            failures.append((endpoint, new_tables, sql))
+            print(f"\nSeq Scan en {', '.join(new_tables)} ({endpoint}):\n  {sql}")
+    if failures:
+        print(f"\nFALLO: {len(failures)} sentencias con Seq Scan sobre tablas grandes")
+        return 1
+    print('OK: ningún Seq Scan sobre tablas grandes')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
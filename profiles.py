@@ -0,0 +1,80 @@
+# Perfiles de usuario (username, image_url, plan y contadores) leídos a
+# través de profile_cache. Quien modifica una fila de `usuarios` llama a
+# caches.invalidate_profiles() después del commit. Cada perfil lleva la
+# versión de perfil:<username> (etags.py) leída en la misma consulta.
+import counters
+import etags
+from caches import profile_cache
+
+# Un perfil por nombre, cada uno por el índice de username. Con un
+# `username = ANY(%s)` de miles de nombres (la bandeja de quien tiene muchos
+# contactos, con la caché fría) el planner prefiere recorrer toda la tabla;
+# el LIMIT del LATERAL impide que lo convierta en un join y lo obliga a
+# buscar nombre a nombre.
+PROFILE_QUERY = '''
+    SELECT p.*
+    FROM unnest(%s::text[]) AS k(nombre)
+    CROSS JOIN LATERAL (
+        SELECT username, image_url, plan, likes,
+               ''' + counters.value('usuarios.followers') + ''' as followers,
+               ''' + counters.value('usuarios.following') + ''' as following,
+               ''' + etags.value("'perfil:' || username") + ''' as version
+        FROM usuarios
+        WHERE username = k.nombre
+        LIMIT 1
+    ) p
+'''
+
+
+def split_cached(usernames):
+    """
+    Separa los perfiles que ya están en la caché de los que hay que leer.
+    Devuelve (encontrados, que_faltan, generación).
+    """
+    generation = profile_cache.generation
+    found, missing = {}, []
+    for username in dict.fromkeys(usernames):
+        profile = profile_cache.get(username)
+        if profile is None:
+            missing.append(username)
+        else:
+            found[username] = dict(profile)
+    return found, missing, generation
+
+
+def remember(rows, found, generation):
+    """Guarda en la caché las filas leídas con PROFILE_QUERY y las añade a found."""
+    for row in rows:
+        profile = dict(row)
+        profile_cache.set(profile['username'], profile, generation)
+        found[profile['username']] = dict(profile)
+    return found
+
+
+def get_profiles(usernames, connect):
+    """
+    Devuelve {username: perfil} de los usuarios que existen, con una sola
+    consulta para todos los que no estén en la caché. `connect` devuelve la
+    conexión de la petición y sólo se llama si hace falta consultar.
+    """
+    found, missing, generation = split_cached(usernames)
+    if missing:
+        conn = connect()
+        if not conn:
+            raise ConnectionError('Error de conexión')
+        cur = conn.cursor()
+        cur.execute(PROFILE_QUERY, (missing,))
+        remember(cur.fetchall(), found, generation)
+        cur.close()
+    return found
+
+
+def get_profile(username, connect):
+    return get_profiles([username], connect).get(username)
+
+
+def drop_if_older(username, version):
+    """Quita de la caché el perfil si se leyó antes de `version` (lo cambió otro proceso)."""
+    profile = profile_cache.get(username)
+    if profile is not None and profile['version'] < version:
+        profile_cache.pop(username)
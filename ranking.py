@@ -0,0 +1,343 @@
+# Ranking personalizado del feed (/api/feed). Cada proceso guarda en
+# arrays de NumPy, por video, lo que no depende del usuario: likes,
+# vistas, comentarios y antigüedad, y por creador sus seguidores. Ordenar
+# los candidatos de un usuario es una pasada vectorizada (suma + top-k con
+# argpartition) con un extra para los creadores que sigue.
+#
+# La puntuación está en escala logarítmica:
+#
+#     W_LIKES * log1p(likes) + W_VIEWS * log1p(vistas) + W_COMMENTS * log1p(comentarios)
+#     + W_FOLLOWERS * log1p(seguidores del creador)
+#     - ln 2 * horas / RANKING_HALF_LIFE_HOURS       (la mitad cada half-life)
+#     + RANKING_FOLLOW_BOOST si el usuario sigue al creador
+#
+# Como `- k * (ahora - subida)` ordena igual que `k * subida`, la parte de
+# cada video se precalcula al cambiar sus contadores y no con cada petición.
+#
+# Los arrays se mantienen leyendo cada RANKING_REFRESH_INTERVAL segundos
+# las filas nuevas de videos, likes, vistas, comentarios y seguidores (por
+# id, con la misma espera ante huecos que analytics.py) y volviendo a leer
+# los contadores de los videos y creadores afectados. Releer el valor
+# absoluto hace que procesar dos veces un evento no importe. Cada
+# RANKING_FULL_REFRESH_INTERVAL segundos se recarga todo.
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+import config
+import counters
+from analytics import safe_prefix
+from streaming import server_cursor
+
+
+def configure(settings):
+    global W_LIKES, W_VIEWS, W_COMMENTS, W_FOLLOWERS, HALF_LIFE_HOURS, FOLLOW_BOOST
+    global BATCH_SIZE, MAX_DEPTH, DECAY_PER_SECOND
+    W_LIKES = settings['RANKING_W_LIKES']
+    W_VIEWS = settings['RANKING_W_VIEWS']
+    W_COMMENTS = settings['RANKING_W_COMMENTS']
+    W_FOLLOWERS = settings['RANKING_W_FOLLOWERS']
+    HALF_LIFE_HOURS = settings['RANKING_HALF_LIFE_HOURS']
+    FOLLOW_BOOST = settings['RANKING_FOLLOW_BOOST']
+
+    BATCH_SIZE = settings['RANKING_BATCH_SIZE']
+
+    # Hasta qué posición del ranking se puede paginar en /api/feed
+    MAX_DEPTH = settings['RANKING_MAX_DEPTH']
+
+    # Puntos que pierde un video por cada segundo de antigüedad
+    DECAY_PER_SECOND = math.log(2) / (HALF_LIFE_HOURS * 3600)
+
+
+config.register(configure)
+
+# tabla de eventos -> columna con la clave afectada ('video' o 'creador')
+SOURCES = {
+    'videos': ('video_id', 'video'),
+    'likes': ('video_id', 'video'),
+    'vistas': ('video_id', 'video'),
+    'comentarios': ('video_id', 'video'),
+    'seguidores': ('following', 'creador'),
+}
+
+VIDEOS_QUERY = '''
+    SELECT v.video_id, v.username,
+           EXTRACT(EPOCH FROM v.fecha_subida)::float8 as subida,
+           ''' + counters.value('videos.likes', 'v') + ''' as likes,
+           ''' + counters.value('videos.visualizaciones', 'v') + ''' as visualizaciones,
+           v.comentarios
+    FROM videos v
+'''
+
+CREATORS_QUERY = '''
+    SELECT u.username, ''' + counters.value('usuarios.followers', 'u') + ''' as followers
+    FROM usuarios u
+'''
+
+
+def content_score(likes, views, comments, uploaded):
+    """Parte de la puntuación de cada video que sólo depende de él (arrays)."""
+    return (W_LIKES * np.log1p(likes) + W_VIEWS * np.log1p(views)
+            + W_COMMENTS * np.log1p(comments) + DECAY_PER_SECOND * uploaded)
+
+
+def creator_score(followers):
+    return W_FOLLOWERS * np.log1p(followers)
+
+
+def top_k(scores, k):
+    """Índices de las k puntuaciones más altas, de mayor a menor."""
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(scores, len(scores) - k)[len(scores) - k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class FeedRanker:
+    """
+    Candidatos del feed en arrays (un elemento por video, y por creador) y
+    el hilo que los mantiene al día.
+    """
+
+    def __init__(self, pool, interval=10.0, full_interval=3600.0):
+        self.pool = pool
+        self.interval = interval
+        self.full_interval = full_interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._loaded_at = None
+        self._marks = {}
+        self._reset()
+        self.refreshes = 0
+        self.errors = 0
+        self.last_rank_ms = 0.0
+
+    def _reset(self, capacity=1024):
+        self.video_ids = []                         # fila -> video_id
+        self._rows = {}                             # video_id -> fila
+        self.creators = []                          # código -> username
+        self._codes = {}                            # username -> código
+        self._creator = np.zeros(capacity, dtype=np.int32)
+        self._static = np.zeros(capacity)           # content_score de cada video
+        self._creator_score = np.zeros(capacity)    # creator_score de cada creador
+        self._n = 0
+
+    @property
+    def ready(self):
+        return self._loaded_at is not None
+
+    # ---------- Actualización ----------
+
+    def _code(self, username):
+        code = self._codes.get(username)
+        if code is None:
+            code = len(self.creators)
+            self.creators.append(username)
+            self._codes[username] = code
+            if code >= len(self._creator_score):
+                self._creator_score = np.concatenate([self._creator_score, np.zeros(len(self._creator_score))])
+        return code
+
+    def upsert_videos(self, rows):
+        """Añade o actualiza videos (filas de VIDEOS_QUERY)."""
+        if not rows:
+            return
+        with self._lock:
+            index = np.empty(len(rows), dtype=np.int64)
+            for i, row in enumerate(rows):
+                position = self._rows.get(row['video_id'])
+                if position is None:
+                    position = self._n
+                    if position >= len(self._static):
+                        self._static = np.concatenate([self._static, np.zeros(len(self._static))])
+                        self._creator = np.concatenate([self._creator, np.zeros(len(self._creator), dtype=np.int32)])
+                    self.video_ids.append(row['video_id'])
+                    self._rows[row['video_id']] = position
+                    self._n += 1
+                self._creator[position] = self._code(row['username'])
+                index[i] = position
+            self._static[index] = content_score(
+                np.fromiter((r['likes'] for r in rows), dtype=np.float64, count=len(rows)),
+                np.fromiter((r['visualizaciones'] for r in rows), dtype=np.float64, count=len(rows)),
+                np.fromiter((r['comentarios'] for r in rows), dtype=np.float64, count=len(rows)),
+                np.fromiter((r['subida'] for r in rows), dtype=np.float64, count=len(rows)))
+
+    def update_creators(self, rows):
+        """Actualiza los seguidores de los creadores (filas de CREATORS_QUERY)."""
+        with self._lock:
+            known = [(self._codes[r['username']], r['followers']) for r in rows if r['username'] in self._codes]
+            if known:
+                codes, followers = zip(*known)
+                self._creator_score[list(codes)] = creator_score(np.array(followers, dtype=np.float64))
+
+    def load(self, conn):
+        """Carga todos los videos y creadores desde cero."""
+        cur = conn.cursor()
+        marks = {}
+        for source in SOURCES:
+            cur.execute(f'SELECT COALESCE(MAX(id), 0) as id FROM {source}')
+            marks[source] = cur.fetchone()['id']
+        cur.close()
+
+        # Se carga aparte y se cambia de golpe: el ranking sigue sirviendo
+        fresh = FeedRanker(self.pool, self.interval, self.full_interval)
+        stream = server_cursor(conn)
+        try:
+            stream.execute(VIDEOS_QUERY)
+            while True:
+                rows = stream.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                fresh.upsert_videos(rows)
+        finally:
+            stream.close()
+        cur = conn.cursor()
+        cur.execute(CREATORS_QUERY + ' WHERE u.username IN (SELECT username FROM videos)')
+        fresh.update_creators(cur.fetchall())
+        cur.close()
+        conn.commit()
+
+        with self._lock:
+            (self.video_ids, self._rows, self.creators, self._codes, self._creator,
+             self._static, self._creator_score, self._n) = (
+                fresh.video_ids, fresh._rows, fresh.creators, fresh._codes, fresh._creator,
+                fresh._static, fresh._creator_score, fresh._n)
+            self._marks = marks
+            self._loaded_at = time.monotonic()
+
+    def refresh(self, conn, batch_size=None, lag=None):
+        """
+        Lee los eventos nuevos de cada tabla y vuelve a leer los videos y
+        creadores afectados. Devuelve cuántos eventos leyó.
+        """
+        batch_size = batch_size or BATCH_SIZE
+        cur = conn.cursor()
+        try:
+            cur.execute('SELECT NOW() as now')
+            now = cur.fetchone()['now']
+            videos, creators, marks, done = set(), set(), {}, 0
+            for source, (key, kind) in SOURCES.items():
+                timestamp = 'fecha_subida' if source == 'videos' else 'timestamp'
+                cur.execute(f'''
+                    SELECT id, {key} as clave, {timestamp} as timestamp FROM {source}
+                    WHERE id > %s
+                    ORDER BY id
+                    LIMIT %s
+                ''', (self._marks[source], batch_size))
+                events = safe_prefix(cur.fetchall(), self._marks[source], now, lag)
+                if events:
+                    (videos if kind == 'video' else creators).update(e['clave'] for e in events)
+                    marks[source] = events[-1]['id']
+                    done += len(events)
+
+            if videos:
+                cur.execute(VIDEOS_QUERY + ' WHERE v.video_id = ANY(%s)', (sorted(videos),))
+                rows = cur.fetchall()
+                self.upsert_videos(rows)
+                creators.update(r['username'] for r in rows)
+            if creators:
+                cur.execute(CREATORS_QUERY + ' WHERE u.username = ANY(%s)', (sorted(creators),))
+                self.update_creators(cur.fetchall())
+            conn.commit()
+            self._marks.update(marks)
+            return done
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    # ---------- Ranking ----------
+
+    def rank(self, followed=(), k=20, exclude_creator=None):
+        """
+        video_ids de los k mejores candidatos para un usuario que sigue a
+        los creadores `followed`, de mayor a menor puntuación.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            n = self._n
+            static, creator = self._static[:n], self._creator[:n]
+            per_creator = self._creator_score[:len(self.creators)].copy()
+            codes = [self._codes[u] for u in followed if u in self._codes]
+            excluded = self._codes.get(exclude_creator)
+            video_ids = self.video_ids
+
+        per_creator[codes] += FOLLOW_BOOST
+        if excluded is not None:
+            per_creator[excluded] = -np.inf
+        scores = static + per_creator[creator]
+        best = top_k(scores, min(k, n))
+        result = [video_ids[i] for i in best if scores[i] != -np.inf]
+        self.last_rank_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    # ---------- Hilo ----------
+
+    def ensure_started(self):
+        """
+        Arranca el hilo (también en cada proceso hijo tras un fork). Sin
+        intervalo sólo hace la carga inicial.
+        """
+        with self._lock:
+            if (self._thread is not None and self._pid == os.getpid()
+                    and (self._thread.is_alive() or not self.interval)):
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='feed-ranking', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.run_once()
+            if not self.interval:
+                return
+            time.sleep(self.interval)
+
+    def run_once(self):
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            if (self._loaded_at is None
+                    or (self.full_interval and time.monotonic() - self._loaded_at > self.full_interval)):
+                self.load(conn)
+                done = self._n
+            else:
+                done = self.refresh(conn)
+        except Exception as e:
+            print(f"Error actualizando el ranking del feed: {e}")
+            if conn is not None:
+                self.pool.putconn(conn, discard=True)
+                conn = None
+            with self._lock:
+                self.errors += 1
+            return 0
+        finally:
+            if conn is not None:
+                self.pool.putconn(conn)
+        with self._lock:
+            self.refreshes += 1
+        return done
+
+    def stats(self):
+        with self._lock:
+            return {
+                'videos': self._n,
+                'creators': len(self.creators),
+                'refreshes': self.refreshes,
+                'errors': self.errors,
+                'last_rank_ms': round(self.last_rank_ms, 3),
+            }
+
+
+def ranker_from_settings(pool, settings):
+    return FeedRanker(pool,
+                      interval=settings['RANKING_REFRESH_INTERVAL'],
+                      full_interval=settings['RANKING_FULL_REFRESH_INTERVAL'])
@@ -0,0 +1,83 @@
+import queue
+
+from flask import request
+from flask_socketio import SocketIO, join_room
+
+import config
+
+socketio = SocketIO()
+
+
+# Función para enganchar Socket.IO a la app. Con SOCKETIO_MESSAGE_QUEUE
+# (redis://, amqp://, kafka://) los procesos se reenvían los eventos entre
+# sí; sin ella cada proceso sólo entrega a sus propios sockets.
+#
+# Las sesiones de Socket.IO viven en el proceso que las abrió: todas las
+# peticiones de un cliente tienen que llegar al mismo. gunicorn no lo
+# garantiza entre sus workers, así que se usa un worker por instancia y,
+# para escalar, varias instancias detrás de un balanceador con sesiones
+# pegajosas (ver gunicorn.conf.py).
+def init_realtime(app):
+    options = {'cors_allowed_origins': app.config['SOCKETIO_CORS_ORIGINS']}
+    if app.config['SOCKETIO_ASYNC_MODE']:
+        options['async_mode'] = app.config['SOCKETIO_ASYNC_MODE']
+    if app.config['SOCKETIO_MESSAGE_QUEUE']:
+        options['message_queue'] = app.config['SOCKETIO_MESSAGE_QUEUE']
+    socketio.init_app(app, **options)
+
+
+def user_room(username):
+    return f'user:{username}'
+
+
+class SocketIOBroadcaster:
+    """Publica eventos en las salas de Socket.IO (backend por defecto)."""
+
+    def publish(self, username, event, payload):
+        socketio.emit(event, payload, to=user_room(username))
+
+
+class QueueBroadcaster:
+    """Backend en memoria: guarda los eventos en una cola (para pruebas)."""
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def publish(self, username, event, payload):
+        self.events.put((user_room(username), event, payload))
+
+
+BROADCASTERS = {
+    'socketio': SocketIOBroadcaster,
+    'memory': QueueBroadcaster,
+}
+
+broadcaster = None
+
+
+def configure(settings):
+    global broadcaster
+    backend = BROADCASTERS[settings['REALTIME_BACKEND']]
+    if not isinstance(broadcaster, backend):
+        broadcaster = backend()
+
+
+config.register(configure)
+
+
+def publish(usernames, event, payload):
+    """Envía un evento a la sala personal de cada usuario indicado."""
+    for username in dict.fromkeys(usernames):
+        try:
+            broadcaster.publish(username, event, payload)
+        except Exception as e:
+            print(f"Error publicando evento {event}: {e}")
+
+
+# Cada socket se une a la sala de su usuario (?user=<username>)
+@socketio.on('connect')
+def on_connect(auth=None):
+    username = request.args.get('user') or (auth or {}).get('user')
+    if not username:
+        return False
+    join_room(user_room(username))
@@ -0,0 +1,121 @@
+# Recursos de cada proceso: el pool de conexiones, los hilos en segundo
+# plano, el control de admisión y el almacenamiento de las subidas.
+# Crearlos no abre ninguna conexión ni arranca ningún hilo, así que
+# create_app() puede correr en el proceso maestro de gunicorn (preload_app)
+# y los workers heredan la app ya importada. Cada worker abre lo suyo después del fork:
+#
+#   - con start(), desde post_worker_init (ver gunicorn.conf.py), antes de
+#     atender la primera petición;
+#   - si nadie llama a start() (flask run, test_client), con la primera
+#     petición: ensure_started en before_request y el pool conecta al pedir.
+#
+# El pool y los hilos ya comprueban el pid: lo heredado del padre se olvida.
+import time
+
+from flask import current_app, g
+
+import admission
+import analytics
+import counters
+import ledger
+import ranking
+import search
+import storage
+from db_pool import pool_from_settings
+from metrics import InstrumentedCursor, observe_checkout, registry
+from view_buffer import aggregator_from_settings
+
+
+class Resources:
+    """
+    Pool, hilos, control de admisión y almacenamiento de la app, con la
+    configuración de config.load().
+    """
+
+    def __init__(self, settings):
+        # Pool de conexiones del proceso (tamaños configurables con DB_POOL_*); cada
+        # consulta pasa por InstrumentedCursor para medir tiempos y filas
+        self.db_pool = pool_from_settings(settings, cursor_factory=InstrumentedCursor)
+
+        # Visualizaciones pendientes de escribir (ver view_buffer.py); su hilo
+        # arranca con la primera vista
+        self.view_buffer = aggregator_from_settings(self.db_pool, settings)
+
+        # Contadores fragmentados (SHARDED_COUNTERS, ver counters.py)
+        self.counter_compactor = counters.compactor_from_settings(self.db_pool, settings)
+
+        # Agregados de estadísticas para los creadores (ver analytics.py)
+        self.stats_rollup = analytics.worker_from_settings(self.db_pool, settings)
+
+        # Liquidación de la billetera y fotos de saldo (ver ledger.py)
+        self.payout_worker = ledger.worker_from_settings(self.db_pool, settings)
+
+        # Ranking personalizado del feed (ver ranking.py)
+        self.feed_ranker = ranking.ranker_from_settings(self.db_pool, settings)
+
+        # Nombres de usuario en memoria para el autocompletado (ver search.py)
+        self.username_index = search.index_from_settings(self.db_pool, settings)
+
+        # Límites por usuario, por IP y de peticiones en curso (ver admission.py)
+        self.admission_control = admission.control_from_settings(settings)
+
+        # Ficheros de las subidas por trozos (ver storage.py y uploads.py)
+        self.storage = storage.storage_from_settings(settings)
+
+    def workers(self):
+        """Hilos con ensure_started, por prefijo de sus gauges en /metrics."""
+        return {
+            'counter_compactor': self.counter_compactor,
+            'analytics_rollup': self.stats_rollup,
+            'payouts': self.payout_worker,
+            'feed_ranking': self.feed_ranker,
+            'autocomplete': self.username_index,
+        }
+
+    def ensure_started(self):
+        for worker in self.workers().values():
+            worker.ensure_started()
+
+    def start(self):
+        """Abre las conexiones mínimas del pool y arranca los hilos del proceso."""
+        self.db_pool.fill()
+        self.ensure_started()
+
+    def release_db_connection(self, exc):
+        # Devolver la conexión al pool al terminar la petición, también si hubo
+        # una excepción (el pool hace rollback de cualquier transacción abierta)
+        conn = g.pop('db_conn', None)
+        if conn is not None:
+            self.db_pool.putconn(conn)
+
+    def init_app(self, app):
+        app.extensions['recursos'] = self
+        app.before_request(self.ensure_started)
+        app.teardown_appcontext(self.release_db_connection)
+        admission.init_admission(app, self.admission_control)
+
+        # Métricas en formato Prometheus: el estado del pool, de la cola de
+        # visualizaciones y de cada hilo
+        registry.gauge_callback('db_pool', self.db_pool.stats)
+        registry.gauge_callback('view_buffer', self.view_buffer.stats)
+        for prefix, worker in self.workers().items():
+            registry.gauge_callback(prefix, worker.stats)
+        registry.gauge_callback('admission', self.admission_control.stats)
+
+
+def current_resources():
+    return current_app.extensions['recursos']
+
+
+# Función para conectar a la base de datos: toma una conexión del pool
+# la primera vez que se pide en la petición y la reutiliza hasta el final
+def get_db_connection():
+    if 'db_conn' not in g:
+        try:
+            start = time.perf_counter()
+            g.db_conn = current_resources().db_pool.getconn()
+            observe_checkout(time.perf_counter() - start)
+        except Exception as e:
+            print(f"Error conectando a la base de datos: {e}")
+            return None
+    return g.db_conn
@@ -0,0 +1,302 @@
+# Búsqueda de videos y usuarios (/api/search) y autocompletado de nombres
+# de usuario mientras se escribe (/api/autocomplete).
+#
+# La búsqueda va a Postgres: columnas tsvector generadas con índice GIN
+# (migración 0008), ordenadas por ts_rank_cd. El autocompletado no toca la
+# base: cada proceso guarda los nombres en memoria en una lista ordenada
+# (prefijos con bisect) y, para lo que aparece en medio del nombre, un
+# índice invertido de trigramas en arrays de NumPy.
+#
+# register añade el nombre nuevo al índice del proceso que lo atiende; los
+# demás lo recogen al releer cada AUTOCOMPLETE_REFRESH_INTERVAL segundos
+# los usuarios registrados desde la última vez. Los nombres que llegan así
+# van a una lista pequeña que se recorre entera y se pasa a los trigramas
+# en la siguiente recarga completa (AUTOCOMPLETE_FULL_REFRESH_INTERVAL).
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+import numpy as np
+
+import analytics
+import config
+from streaming import server_cursor
+
+
+def configure(settings):
+    global BATCH_SIZE, MAX_RECENT
+    BATCH_SIZE = settings['AUTOCOMPLETE_BATCH_SIZE']
+    # Nombres sin pasar a trigramas a partir de los cuales se recarga antes de tiempo
+    MAX_RECENT = settings['AUTOCOMPLETE_MAX_RECENT']
+
+
+config.register(configure)
+
+# Posiciones que se cruzan de cada vez al buscar subcadenas
+CHUNK_SIZE = 4096
+
+# El @@ va directamente contra la columna para que use el índice GIN de
+# busqueda (migración 0008); el texto se pasa dos veces
+VIDEOS_QUERY = '''
+    SELECT v.video_id, v.username as user, v.titulo, v.descripcion as description,
+           v.thumbnail_url, v.music_name as music, v.fecha_subida,
+           ts_rank_cd(v.busqueda, websearch_to_tsquery('spanish', %(text)s)) as rank
+    FROM videos v
+    WHERE v.busqueda @@ websearch_to_tsquery('spanish', %(text)s)
+    ORDER BY rank DESC, v.fecha_subida DESC, v.video_id
+    LIMIT %(limit)s
+'''
+
+USERS_QUERY = '''
+    SELECT u.username, u.image_url as profile_img,
+           ts_rank_cd(u.busqueda, q.query) as rank
+    FROM usuarios u, to_tsquery('simple', %s) q(query)
+    WHERE u.busqueda @@ q.query
+    ORDER BY rank DESC, length(u.username), u.username
+    LIMIT %s
+'''
+
+_WORD = re.compile(r'\w+')
+
+
+def prefix_query(text):
+    """tsquery 'palabra:* & palabra:*' con las palabras de text, o None si no tiene."""
+    words = _WORD.findall(text.lower().replace('_', ' '))
+    return ' & '.join(w + ':*' for w in words) or None
+
+
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class UsernameIndex:
+    """
+    Nombres de usuario para autocompletar: prefijos con bisect sobre una
+    lista ordenada y subcadenas con un índice de trigramas.
+    """
+
+    def __init__(self, pool, interval=30.0, full_interval=3600.0):
+        self.pool = pool
+        self.interval = interval
+        self.full_interval = full_interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._loaded_at = None
+        self._since = None
+        self._keys = []         # nombres en minúsculas, ordenados
+        self._names = []        # nombre original de cada clave
+        self._frozen = []       # nombres (en minúsculas) que cubren los trigramas
+        self._grams = {}        # trigrama -> array de posiciones en _frozen
+        self._recent = []       # nombres añadidos después de construir los trigramas
+        self.refreshes = 0
+        self.errors = 0
+
+    @property
+    def ready(self):
+        return self._loaded_at is not None
+
+    def __len__(self):
+        return len(self._keys)
+
+    # ---------- Actualización ----------
+
+    def build(self, names):
+        """Sustituye el índice por los nombres dados."""
+        names = sorted(set(names), key=str.lower)
+        keys = [n.lower() for n in names]
+        postings = {}
+        for position, key in enumerate(keys):
+            for gram in trigrams(key):
+                postings.setdefault(gram, []).append(position)
+        grams = {gram: np.array(p, dtype=np.int32) for gram, p in postings.items()}
+        with self._lock:
+            self._keys, self._names = keys, names
+            self._frozen, self._grams, self._recent = list(keys), grams, []
+
+    def add(self, username):
+        """Añade un nombre (si no estaba). Devuelve True si era nuevo."""
+        key = username.lower()
+        with self._lock:
+            i = bisect_left(self._keys, key)
+            while i < len(self._keys) and self._keys[i] == key:
+                if self._names[i] == username:
+                    return False
+                i += 1
+            self._keys.insert(i, key)
+            self._names.insert(i, username)
+            insort(self._recent, key)
+            return True
+
+    def load(self, conn):
+        """Carga todos los nombres desde cero."""
+        cur = conn.cursor()
+        cur.execute('SELECT NOW() as now')
+        since = cur.fetchone()['now']
+        cur.close()
+        names = []
+        stream = server_cursor(conn)
+        try:
+            stream.execute('SELECT username FROM usuarios')
+            while True:
+                rows = stream.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                names.extend(r['username'] for r in rows)
+        finally:
+            stream.close()
+        conn.commit()
+        self.build(names)
+        self._since = since
+        self._loaded_at = time.monotonic()
+
+    def refresh(self, conn, lag=None):
+        """
+        Añade los usuarios registrados desde la última lectura. Se relee un
+        margen de lag segundos porque fecha_registro es la del inicio de la
+        transacción, no la del commit. Devuelve cuántos nombres eran nuevos.
+        """
+        lag = analytics.LAG if lag is None else lag
+        cur = conn.cursor()
+        try:
+            cur.execute('SELECT NOW() as now')
+            now = cur.fetchone()['now']
+            cur.execute('SELECT username FROM usuarios WHERE fecha_registro > %s',
+                        (self._since - timedelta(seconds=lag),))
+            rows = cur.fetchall()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+        added = sum(self.add(r['username']) for r in rows)
+        self._since = now
+        return added
+
+    # ---------- Consulta ----------
+
+    def complete(self, text, limit=10):
+        """
+        Hasta `limit` nombres para lo escrito: primero los que empiezan por
+        text y después los que lo contienen, cada grupo en orden alfabético.
+        """
+        key = text.lower()
+        if not key:
+            return []
+        with self._lock:
+            result = self._lookup(bisect_left(self._keys, key), limit, lambda k: k.startswith(key))
+            if len(result) >= limit or len(key) < 3:
+                return result
+            frozen, grams = self._frozen, self._grams
+            recent = [k for k in self._recent if key in k and not k.startswith(key)]
+
+        wanted = limit - len(result)
+        found = sorted(set(self._contains(key, frozen, grams, wanted) + recent))[:wanted]
+        with self._lock:
+            for k in found:
+                result += [n for n in self._lookup(bisect_left(self._keys, k), limit, k.__eq__)
+                           if n not in result][:limit - len(result)]
+        return result
+
+    def _lookup(self, start, limit, accept):
+        """Nombres desde la posición start mientras su clave cumpla accept."""
+        names = []
+        i = start
+        while i < len(self._keys) and len(names) < limit and accept(self._keys[i]):
+            names.append(self._names[i])
+            i += 1
+        return names
+
+    @staticmethod
+    def _contains(key, frozen, grams, wanted):
+        """
+        Hasta `wanted` claves de frozen que contienen key sin empezar por
+        ella. Las listas de posiciones de sus trigramas están ordenadas: se
+        recorre la más corta por bloques y se cruza con las demás con
+        searchsorted, parando en cuanto hay suficientes.
+        """
+        postings = [grams.get(g) for g in trigrams(key)]
+        if any(p is None for p in postings):
+            return []
+        postings.sort(key=len)
+        found = []
+        for start in range(0, len(postings[0]), CHUNK_SIZE):
+            matches = postings[0][start:start + CHUNK_SIZE]
+            for p in postings[1:]:
+                matches = matches[p[np.minimum(np.searchsorted(p, matches), len(p) - 1)] == matches]
+                if not len(matches):
+                    break
+            for i in matches:
+                k = frozen[i]
+                if key in k and not k.startswith(key):
+                    found.append(k)
+                    if len(found) >= wanted:
+                        return found
+        return found
+
+    # ---------- Hilo ----------
+
+    def ensure_started(self):
+        """
+        Arranca el hilo (también en cada proceso hijo tras un fork). Sin
+        intervalo sólo hace la carga inicial.
+        """
+        with self._lock:
+            if (self._thread is not None and self._pid == os.getpid()
+                    and (self._thread.is_alive() or not self.interval)):
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='autocomplete', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.run_once()
+            if not self.interval:
+                return
+            time.sleep(self.interval)
+
+    def run_once(self):
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            if (self._loaded_at is None or len(self._recent) > MAX_RECENT
+                    or (self.full_interval and time.monotonic() - self._loaded_at > self.full_interval)):
+                self.load(conn)
+                done = len(self._keys)
+            else:
+                done = self.refresh(conn)
+        except Exception as e:
+            print(f"Error actualizando el autocompletado: {e}")
+            if conn is not None:
+                self.pool.putconn(conn, discard=True)
+                conn = None
+            with self._lock:
+                self.errors += 1
+            return 0
+        finally:
+            if conn is not None:
+                self.pool.putconn(conn)
+        with self._lock:
+            self.refreshes += 1
+        return done
+
+    def stats(self):
+        with self._lock:
+            return {
+                'usernames': len(self._keys),
+                'recent': len(self._recent),
+                'trigrams': len(self._grams),
+                'refreshes': self.refreshes,
+                'errors': self.errors,
+            }
+
+
+def index_from_settings(pool, settings):
+    return UsernameIndex(pool,
+                         interval=settings['AUTOCOMPLETE_REFRESH_INTERVAL'],
+                         full_interval=settings['AUTOCOMPLETE_FULL_REFRESH_INTERVAL'])
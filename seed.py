@@ -0,0 +1,194 @@
+import hashlib
+import time
+
+import inbox
+
+# Volumen por defecto de cada tabla (se multiplica por la escala)
+DEFAULT_COUNTS = {
+    'usuarios': 20000,
+    'videos': 50000,
+    'likes': 200000,
+    'vistas': 200000,
+    'comentarios': 100000,
+    'seguidores': 100000,
+    'mensajes': 200000,
+    'subidas': 20000,
+}
+
+# Todos los usuarios sembrados comparten esta contraseña
+SEED_PASSWORD = 'secreto'
+
+SEEDED_TABLES = ['usuarios', 'videos', 'likes', 'vistas', 'comentarios',
+                 'seguidores', 'mensajes', 'conversaciones', 'contadores_fragmentados',
+                 'estadisticas', 'estadisticas_espectadores', 'movimientos', 'saldos', 'subidas']
+
+
+def seed_counts(scale=1.0, **overrides):
+    counts = {table: max(1, int(n * scale)) for table, n in DEFAULT_COUNTS.items()}
+    counts.update({table: n for table, n in overrides.items() if n is not None})
+    return counts
+
+
+def seed(conn, counts=None, verbose=True):
+    """
+    Vacía las tablas y genera datos sintéticos deterministas: usuarios
+    user_1..user_N (contraseña SEED_PASSWORD) y videos video_1..video_N.
+    Los usuarios y videos con número bajo son los más populares, y
+    user_1 / user_2 siempre tienen una conversación entre ellos.
+    Requiere el esquema de migrations/ ya aplicado.
+    """
+    counts = counts or seed_counts()
+    u, v = counts['usuarios'], counts['videos']
+    password_hash = hashlib.sha256(SEED_PASSWORD.encode()).hexdigest()
+    cur = conn.cursor()
+
+    def step(table, sql, params):
+        start = time.monotonic()
+        cur.execute(sql, params)
+        conn.commit()
+        if verbose:
+            print(f"  {table}: {cur.rowcount} filas en {time.monotonic() - start:.1f}s")
+
+    cur.execute('TRUNCATE ' + ', '.join(SEEDED_TABLES) + ' RESTART IDENTITY')
+    # Los ids de vistas y likes vuelven a empezar: también sus marcas (analytics.py)
+    cur.execute('UPDATE estadisticas_marcas SET ultimo_id = 0, actualizado = NULL')
+    cur.execute("UPDATE saldos_marca SET ultima_transaccion = '0', ultimo_id = 0, actualizado = NULL")
+    cur.execute('SELECT setseed(0.42)')
+
+    step('usuarios', '''
+        INSERT INTO usuarios (username, password, plan, image_url, fecha_registro)
+        SELECT 'user_' || i, %s, 'azul', 'https://img.likering.dev/u/' || i || '.png',
+               NOW() - i * INTERVAL '1 minute'
+        FROM generate_series(1, %s) i
+    ''', (password_hash, u))
+
+    step('videos', '''
+        INSERT INTO videos (video_id, username, titulo, descripcion, video_url,
+                            thumbnail_url, music_url, music_name, fecha_subida)
+        SELECT 'video_' || i,
+               'user_' || (1 + floor(%s * power(random(), 3)))::int,
+               'Video ' || i, 'Descripción del video ' || i,
+               'https://media.likering.dev/v/' || i || '.mp4',
+               'https://media.likering.dev/t/' || i || '.jpg',
+               '', 'Canción ' || (i %% 500),
+               NOW() - i * INTERVAL '10 seconds'
+        FROM generate_series(1, %s) i
+    ''', (u, v))
+
+    step('likes', '''
+        INSERT INTO likes (video_id, username, timestamp)
+        SELECT 'video_' || (1 + floor(%s * power(random(), 2)))::int,
+               'user_' || (1 + floor(%s * random()))::int,
+               NOW() - random() * INTERVAL '30 days'
+        FROM generate_series(1, %s) i
+        ON CONFLICT DO NOTHING
+    ''', (v, u, counts['likes']))
+
+    # Cada like recibido es un movimiento de la billetera del autor (ledger.py)
+    step('movimientos', '''
+        INSERT INTO movimientos (username, tipo, likes_ganados, referencia, timestamp)
+        SELECT v.username, 'like', 1, l.video_id, l.timestamp
+        FROM likes l JOIN videos v ON v.video_id = l.video_id
+        ORDER BY l.id
+    ''', ())
+
+    step('vistas', '''
+        INSERT INTO vistas (video_id, username, timestamp)
+        SELECT 'video_' || (1 + floor(%s * power(random(), 2)))::int,
+               'user_' || (1 + floor(%s * random()))::int,
+               NOW() - random() * INTERVAL '30 days'
+        FROM generate_series(1, %s) i
+    ''', (v, u, counts['vistas']))
+
+    step('comentarios', '''
+        INSERT INTO comentarios (comment_id, video_id, username, comment_text, image_url, timestamp)
+        SELECT 'comment_' || i,
+               'video_' || (1 + floor(%s * power(random(), 2)))::int,
+               'user_' || n, 'Comentario ' || i,
+               'https://img.likering.dev/u/' || n || '.png',
+               NOW() - random() * INTERVAL '30 days'
+        FROM (SELECT i, (1 + floor(%s * random()))::int as n
+              FROM generate_series(1, %s) i) s
+    ''', (v, u, counts['comentarios']))
+
+    step('seguidores', '''
+        INSERT INTO seguidores (follower, following)
+        SELECT 'user_' || (1 + floor(%s * random()))::int,
+               'user_' || (1 + floor(%s * power(random(), 3)))::int
+        FROM generate_series(1, %s) i
+        ON CONFLICT DO NOTHING
+    ''', (u, u, counts['seguidores']))
+    cur.execute('DELETE FROM seguidores WHERE follower = following')
+
+    step('mensajes', '''
+        INSERT INTO mensajes (message_id, remitente, destinatario, mensaje,
+                              leido, timestamp, read_at)
+        SELECT 'message_' || i, remitente, destinatario, 'Mensaje ' || i,
+               leido, ts, CASE WHEN leido THEN ts + INTERVAL '1 minute' END
+        FROM (
+            SELECT i,
+                   CASE WHEN i %% 100 = 0 THEN 'user_' || (1 + (i / 100) %% 2)
+                        ELSE 'user_' || (1 + floor(%s * power(random(), 2)))::int END as remitente,
+                   CASE WHEN i %% 100 = 0 THEN 'user_' || (2 - (i / 100) %% 2)
+                        ELSE 'user_' || (1 + floor(%s * random()))::int END as destinatario,
+                   random() < 0.8 as leido,
+                   NOW() - (%s - i) * INTERVAL '1 second' as ts
+            FROM generate_series(1, %s) i
+        ) s
+    ''', (u, u, counts['mensajes'], counts['mensajes']))
+
+    # Subidas por trozos (uploads.py): casi todas completas, con su video;
+    # una de cada 20 sigue abierta a medias
+    step('subidas', '''
+        INSERT INTO subidas (upload_id, username, tipo, content_type, tamano, recibido,
+                             estado, media_url, video_id, creada, actualizada)
+        SELECT 'upload_' || i, 'user_' || (1 + floor(%s * power(random(), 2)))::int,
+               'video', 'video/mp4', 8 * 1024 * 1024,
+               CASE WHEN abierta THEN 4 * 1024 * 1024 ELSE 8 * 1024 * 1024 END,
+               CASE WHEN abierta THEN 'abierta' ELSE 'completa' END,
+               CASE WHEN abierta THEN NULL ELSE '/media/videos/upload_' || i || '.mp4' END,
+               CASE WHEN abierta THEN NULL ELSE 'video_' || (1 + (i - 1) %% %s) END,
+               ts, ts
+        FROM (
+            SELECT i, i %% 20 = 0 as abierta, NOW() - random() * INTERVAL '30 days' as ts
+            FROM generate_series(1, %s) i
+        ) s
+    ''', (u, v, counts['subidas']))
+
+    # Contadores desnormalizados coherentes con las tablas de eventos
+    cur.execute('''
+        UPDATE videos v SET likes = c.n
+        FROM (SELECT video_id, COUNT(*) as n FROM likes GROUP BY video_id) c
+        WHERE v.video_id = c.video_id
+    ''')
+    cur.execute('''
+        UPDATE videos v SET visualizaciones = c.n
+        FROM (SELECT video_id, COUNT(*) as n FROM vistas GROUP BY video_id) c
+        WHERE v.video_id = c.video_id
+    ''')
+    cur.execute('''
+        UPDATE videos v SET comentarios = c.n
+        FROM (SELECT video_id, COUNT(*) as n FROM comentarios GROUP BY video_id) c
+        WHERE v.video_id = c.video_id
+    ''')
+    cur.execute('''
+        UPDATE usuarios u SET followers = c.n
+        FROM (SELECT following, COUNT(*) as n FROM seguidores GROUP BY following) c
+        WHERE u.username = c.following
+    ''')
+    cur.execute('''
+        UPDATE usuarios u SET following = c.n
+        FROM (SELECT follower, COUNT(*) as n FROM seguidores GROUP BY follower) c
+        WHERE u.username = c.follower
+    ''')
+    conn.commit()
+
+    written = inbox.rebuild_inbox(conn)
+    if verbose:
+        print(f"  conversaciones: {written} filas")
+
+    cur.close()
+    conn.autocommit = True
+    conn.cursor().execute('VACUUM ANALYZE')
+    conn.autocommit = False
+    return counts
@@ -0,0 +1,166 @@
+# Almacenamiento de los ficheros subidos por trozos (ver uploads.py y
+# /api/uploads en videos_api.py). Un backend guarda dos cosas:
+#
+#   - la parte de cada subida abierta, por upload_id, que crece trozo a
+#     trozo: locked, write, read, delete;
+#   - los ficheros terminados, por nombre ('videos/<id>.mp4'), que se
+#     sirven a los clientes: publish, url, serve.
+#
+# write escribe desde el offset confirmado en la base de datos y descarta
+# lo que hubiera detrás (un trozo a medias de un intento anterior), así que
+# repetir un trozo tras un corte es seguro.
+#
+# STORAGE_BACKEND:
+#     local   directorio STORAGE_DIR, servido por la app en /media/ (un solo
+#             servidor, un volumen compartido entre máquinas, o pruebas)
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+from flask import send_from_directory
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Sin STORAGE_DIR, junto al código (como migrations/)
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'almacen')
+
+# Bytes que se leen de la petición (y del disco) de cada vez
+BLOCK_SIZE = 1024 * 1024
+
+
+class UploadBusy(Exception):
+    """Otra petición está escribiendo en la misma subida."""
+
+
+class ChunkRejected(Exception):
+    """El trozo llegó incompleto o no coincide con su checksum; no se guarda."""
+
+
+class LocalStorage:
+    """Subidas en STORAGE_DIR/partes y ficheros terminados en STORAGE_DIR/media."""
+
+    def __init__(self, root, base_url='/media/'):
+        self.root = os.path.abspath(root)
+        self.parts_dir = os.path.join(self.root, 'partes')
+        self.media_dir = os.path.join(self.root, 'media')
+        self.base_url = base_url
+        self._lock = threading.Lock()
+        self._held = set()      # subidas tomadas en este proceso (sin fcntl)
+
+    def _part(self, key):
+        return os.path.join(self.parts_dir, key + '.part')
+
+    @contextmanager
+    def locked(self, key):
+        """
+        Exclusión sobre una subida entre hilos y procesos (flock sobre un
+        fichero .lock al lado de la parte). No espera: lanza UploadBusy.
+        """
+        with self._lock:
+            if key in self._held:
+                raise UploadBusy(key)
+            self._held.add(key)
+        fd = None
+        try:
+            if fcntl is not None:
+                os.makedirs(self.parts_dir, exist_ok=True)
+                fd = os.open(os.path.join(self.parts_dir, key + '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadBusy(key)
+            yield
+        finally:
+            if fd is not None:
+                os.close(fd)
+            with self._lock:
+                self._held.discard(key)
+
+    def write(self, key, offset, stream, length, checksum=None):
+        """
+        Copia `length` bytes de stream a la parte desde offset, por bloques y
+        sin guardarlos en memoria. Devuelve el sha256 (hex) del trozo; si
+        llega incompleto o no coincide con checksum lo descarta y lanza
+        ChunkRejected. Llamar dentro de locked(key).
+        """
+        os.makedirs(self.parts_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd = os.open(self._part(key), os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, 'r+b') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            remaining = length
+            try:
+                while remaining:
+                    block = stream.read(min(BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    f.write(block)
+                    digest.update(block)
+                    remaining -= len(block)
+                if remaining:
+                    raise ChunkRejected(f'Faltan {remaining} bytes del trozo')
+                if checksum and digest.hexdigest() != checksum.lower():
+                    raise ChunkRejected('El trozo no coincide con su checksum')
+            except BaseException:
+                # También si el cliente corta la conexión a mitad del trozo
+                f.truncate(offset)
+                raise
+            f.flush()
+            os.fsync(f.fileno())
+        return digest.hexdigest()
+
+    def read(self, key):
+        """Bloques de la parte, en orden."""
+        with open(self._part(key), 'rb') as f:
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    return
+                yield block
+
+    def size(self, key):
+        try:
+            return os.path.getsize(self._part(key))
+        except FileNotFoundError:
+            return 0
+
+    def delete(self, key):
+        for path in (self._part(key), os.path.join(self.parts_dir, key + '.lock')):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def publish(self, key, name):
+        """
+        Mueve la parte terminada a `name` y devuelve su URL. Si ya se movió
+        (un reintento de completar) sólo devuelve la URL.
+        """
+        target = os.path.join(self.media_dir, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(self._part(key)):
+            os.replace(self._part(key), target)
+        elif not os.path.exists(target):
+            raise FileNotFoundError(f'La subida {key} no tiene fichero')
+        self.delete(key)
+        return self.url(name)
+
+    def url(self, name):
+        return self.base_url + name
+
+    def serve(self, name):
+        """Respuesta con el fichero terminado; admite Range (los videos se reproducen a trozos)."""
+        return send_from_directory(self.media_dir, name, conditional=True, max_age=86400)
+
+
+def storage_from_settings(settings):
+    name = settings['STORAGE_BACKEND']
+    if name == 'local':
+        return LocalStorage(settings['STORAGE_DIR'] or DEFAULT_DIR,
+                            base_url=settings['STORAGE_BASE_URL'])
+    raise ValueError(f'STORAGE_BACKEND desconocido: {name}')
@@ -0,0 +1,89 @@
+# Respuestas JSON en streaming para listas que pueden ser muy largas (los
+# videos de un usuario, su bandeja de entrada). Las filas se leen de un
+# cursor con nombre, que deja el resultado en el servidor, de CHUNK_SIZE en
+# CHUNK_SIZE, y cada bloque se codifica y se envía antes de pedir el
+# siguiente: la memoria del worker depende del bloque, no del resultado.
+#
+# El cuerpo es el mismo que daría jsonify (mismo serializador, claves
+# ordenadas). Si todo cabe en el primer bloque se responde con jsonify
+# normal, con Content-Length.
+#
+# El cursor con nombre vive en la conexión de la petición (g.db_conn), que
+# el teardown devuelve al pool (con rollback) antes de que se envíe el
+# cuerpo. Para el streaming se saca de g y la devuelve la propia respuesta
+# al cerrarse.
+import uuid
+
+from flask import current_app, g, stream_with_context
+
+import config
+from metrics import jsonify
+
+
+def configure(settings):
+    global CHUNK_SIZE
+    CHUNK_SIZE = settings['STREAM_CHUNK_SIZE']
+
+
+config.register(configure)
+
+
+def server_cursor(conn):
+    """Cursor con nombre (DECLARE ... CURSOR) en la transacción de conn."""
+    return conn.cursor(name='stream_' + uuid.uuid4().hex)
+
+
+def _dumps(value):
+    return current_app.json.dumps(value, separators=(',', ':'))
+
+
+def list_response(cur, convert=None, **fields):
+    """
+    Respuesta {**fields, 'data': [...]} con las filas de cur (ya ejecutado)
+    leídas por bloques. convert(filas) devuelve los elementos de un bloque
+    (por defecto un dict por fila). Cierra cur al terminar.
+    """
+    convert = convert or (lambda rows: [dict(r) for r in rows])
+    rows = cur.fetchmany(CHUNK_SIZE)
+    if len(rows) < CHUNK_SIZE:
+        cur.close()
+        return jsonify(dict(fields, data=convert(rows)))
+
+    # Lo que va antes y después del array, con las claves en el orden de jsonify
+    prefix, suffix = _dumps(dict(fields, data=[])).split('"data":[]', 1)
+    prefix += '"data":['
+    suffix = ']' + suffix + '\n'
+
+    def generate(rows):
+        try:
+            yield prefix
+            first = True
+            while rows:
+                items = convert(rows)
+                if items:
+                    yield ('' if first else ',') + ','.join(_dumps(item) for item in items)
+                    first = False
+                rows = cur.fetchmany(CHUNK_SIZE)
+            yield suffix
+        except Exception as e:
+            # Las cabeceras ya se enviaron: se corta la conexión a medias
+            # para que el cliente no tome el cuerpo truncado por completo
+            print(f"Error en respuesta en streaming: {e}")
+            raise
+        finally:
+            cur.close()
+
+    # La conexión pasa a ser de la respuesta: el teardown ya no la toca y
+    # vuelve al pool al cerrarse la respuesta (también si el cliente corta
+    # antes de leer nada)
+    conn = cur.connection
+    if g.get('db_conn') is conn:
+        g.pop('db_conn')
+    pool = current_app.extensions['recursos'].db_pool
+
+    # stream_with_context mantiene el contexto (current_app.json) mientras
+    # se envía el cuerpo
+    response = current_app.response_class(stream_with_context(generate(rows)),
+                                          mimetype=current_app.json.mimetype)
+    response.call_on_close(lambda: pool.putconn(conn))
+    return response
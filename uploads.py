@@ -0,0 +1,110 @@
+# Subidas reanudables de videos e imágenes, por trozos (rutas /api/uploads
+# en videos_api.py, bytes en storage.py, sesiones en la tabla subidas):
+#
+#   POST  /api/uploads                    abre la subida: usuario, tipo,
+#                                         contentType, size y opcionalmente
+#                                         el sha256 del fichero completo
+#   PATCH /api/uploads/<id>               un trozo: el cuerpo son los bytes,
+#                                         Upload-Offset dice dónde empiezan y
+#                                         X-Chunk-Sha256 (opcional) su checksum
+#   GET   /api/uploads/<id>               offset desde el que continuar
+#   POST  /api/uploads/<id>/complete      comprueba el fichero, lo publica y,
+#                                         si es un video, lo registra como
+#                                         /api/save-video
+#
+# Tras un corte el cliente pide el offset y sigue desde ahí. Un trozo sólo
+# cuenta cuando está en disco y su offset en la base de datos; lo que
+# quedara de un intento a medias se sobrescribe con el siguiente.
+#
+# Las subidas abiertas sin trozos en UPLOAD_EXPIRY_HOURS se borran con
+#     flask --app app clean-uploads
+import hashlib
+
+import config
+
+# tipo -> {content type: extensión}
+CONTENT_TYPES = {
+    'video': {'video/mp4': '.mp4', 'video/webm': '.webm', 'video/quicktime': '.mov'},
+    'imagen': {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp'},
+}
+
+# Carpeta de cada tipo dentro del almacenamiento
+FOLDERS = {'video': 'videos', 'imagen': 'imagenes'}
+
+
+def configure(settings):
+    global MAX_SIZE, CHUNK_SIZE, MAX_CHUNK_SIZE, MAX_OPEN, EXPIRY_HOURS
+    MAX_SIZE = {
+        'video': settings['UPLOAD_MAX_VIDEO_BYTES'],
+        'imagen': settings['UPLOAD_MAX_IMAGE_BYTES'],
+    }
+    # Tamaño de trozo que se sugiere al cliente y el máximo que se acepta
+    CHUNK_SIZE = settings['UPLOAD_CHUNK_SIZE']
+    MAX_CHUNK_SIZE = settings['UPLOAD_MAX_CHUNK_SIZE']
+    # Subidas abiertas a la vez por usuario
+    MAX_OPEN = settings['UPLOAD_MAX_OPEN']
+    EXPIRY_HOURS = settings['UPLOAD_EXPIRY_HOURS']
+
+
+config.register(configure)
+
+SESSION_QUERY = '''
+    SELECT upload_id, username, tipo, content_type, tamano, recibido, sha256,
+           estado, media_url, video_id
+    FROM subidas
+    WHERE upload_id = %s
+'''
+
+
+def is_sha256(value):
+    return isinstance(value, str) and len(value) == 64 and all(c in '0123456789abcdefABCDEF' for c in value)
+
+
+def media_name(session):
+    """Nombre del fichero publicado: 'videos/<upload_id>.mp4'."""
+    extension = CONTENT_TYPES[session['tipo']][session['content_type']]
+    return f"{FOLDERS[session['tipo']]}/{session['upload_id']}{extension}"
+
+
+def describe(session):
+    """JSON de una subida para el cliente."""
+    return {
+        'uploadId': session['upload_id'],
+        'type': session['tipo'],
+        'size': session['tamano'],
+        'offset': session['recibido'],
+        'status': session['estado'],
+        'chunkSize': CHUNK_SIZE,
+        'mediaUrl': session['media_url'],
+        'videoId': session['video_id'],
+    }
+
+
+def full_checksum(storage, upload_id):
+    """sha256 (hex) del fichero de una subida, leído por bloques."""
+    digest = hashlib.sha256()
+    for block in storage.read(upload_id):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def expire(conn, storage, hours=None):
+    """Borra las subidas abiertas sin actividad en `hours` horas. Devuelve cuántas."""
+    hours = EXPIRY_HOURS if hours is None else hours
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            DELETE FROM subidas
+            WHERE estado = 'abierta' AND actualizada < NOW() - make_interval(secs => %s)
+            RETURNING upload_id
+        ''', (hours * 3600,))
+        expired = [r['upload_id'] for r in cur.fetchall()]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    for upload_id in expired:
+        storage.delete(upload_id)
+    return len(expired)
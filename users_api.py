@@ -0,0 +1,215 @@
+# API de usuarios: registro, login, perfil, billetera y autocompletado de
+# nombres
+import hashlib
+
+from flask import Blueprint, request
+
+import counters
+import etags
+import ledger
+from caches import invalidate_profiles
+from metrics import jsonify
+from pagination import parse_limit
+from profiles import get_profile, drop_if_older
+from resources import current_resources, get_db_connection
+
+bp = Blueprint('users_api', __name__)
+
+# Función para hashear contraseñas
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+# API: Registro de usuario
+# API: Registro de nuevos usuarios
+@bp.route('/api/register', methods=['POST'])
+def register():
+    try:
+        data = request.get_json()
+        username = data.get('username')
+        password = data.get('password')
+        # Asumiendo que el campo de la URL de la imagen se llama 'imageUrl' en el frontend
+        imageUrl = data.get('imageUrl') 
+        
+        if not all([username, password, imageUrl]):
+            return jsonify({'success': False, 'message': 'Faltan datos de registro (usuario, contraseña o imagen)'}), 400
+
+        hashed_password = hash_password(password)
+
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión a la base de datos'}), 500
+        
+        cur = conn.cursor()
+        
+        # 1. Verificar si el usuario ya existe
+        cur.execute("SELECT id FROM usuarios WHERE username = %s", (username,))
+        if cur.fetchone():
+            cur.close()
+            return jsonify({'success': False, 'message': 'El nombre de usuario ya existe'}), 409
+
+        # 2. Insertar nuevo usuario en la tabla 'usuarios'
+        # Usamos gen_random_uuid() para el ID y 'azul' como plan por defecto, basado en tus snippets y la imagen
+        cur.execute('''
+            INSERT INTO usuarios (id, username, password, plan, image_url)
+            VALUES (gen_random_uuid(), %s, %s, %s, %s)
+            RETURNING id;
+        ''', (username, hashed_password, 'azul', imageUrl))
+        etags.touch(cur, etags.profile(username))
+        
+        conn.commit()
+        cur.close()
+        invalidate_profiles(username)
+        current_resources().username_index.add(username)
+        
+        # Respuesta exitosa que el frontend espera
+        return jsonify({'success': True, 'message': 'Registro exitoso'})
+        
+    except Exception as e:
+        print(f"Error en la ruta /api/register: {e}")
+        return jsonify({'success': False, 'message': f'Error interno del servidor: {str(e)}'}), 500
+
+# API: Login de usuario
+@bp.route('/api/login', methods=['POST'])
+def login():
+    try:
+        data = request.get_json()
+        username = data.get('username')
+        password = data.get('password')
+        
+        if not username or not password:
+            return jsonify({'success': False, 'message': 'Usuario y contraseña requeridos'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        password_hash = hash_password(password)
+        
+        cur.execute('''
+            SELECT username, image_url, plan, likes,
+                   ''' + counters.value('usuarios.followers') + ''' as followers,
+                   ''' + counters.value('usuarios.following') + ''' as following
+            FROM usuarios
+            WHERE username = %s AND password = %s
+        ''', (username, password_hash))
+        
+        user = cur.fetchone()
+        
+        if user:
+            # Saldo de la billetera desde el libro de movimientos
+            user_data = dict(user, **ledger.balance(cur, username))
+            
+            # Actualizar última conexión
+            cur.execute('UPDATE usuarios SET ultima_conexion = NOW() WHERE username = %s', (username,))
+            conn.commit()
+            invalidate_profiles(username)
+            cur.close()
+            
+            return jsonify({
+                'success': True,
+                'data': user_data
+            })
+        else:
+            cur.close()
+            return jsonify({'success': False, 'message': 'Usuario o contraseña incorrectos'}), 401
+            
+    except Exception as e:
+        print(f"Error en login: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Obtener perfil de usuario
+# Con If-None-Match sólo se lee la versión del perfil: si no cambió, 304.
+@bp.route('/api/user-profile', methods=['GET'])
+def get_user_profile():
+    try:
+        username = request.args.get('user')
+        if not username:
+            return jsonify({'success': False, 'message': 'Usuario requerido'}), 400
+        
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+            cur = conn.cursor()
+            resource = etags.profile(username)
+            version = etags.current(cur, [resource])[resource]
+            cur.close()
+            etag = etags.make_etag({resource: version})
+            if etags.matches(if_none_match, etag):
+                return etags.not_modified(etag)
+            # Si otro proceso cambió el perfil, la copia de la caché ya no vale
+            drop_if_older(username, version)
+        
+        # Sale de profile_cache; sólo se consulta la BD si no está
+        user = get_profile(username, get_db_connection)
+        
+        if user:
+            version = user.pop('version')
+            return etags.tagged(jsonify({
+                'success': True,
+                'data': user
+            }), etags.make_etag({etags.profile(username): version}))
+        else:
+            return jsonify({'success': False, 'message': 'Usuario no encontrado'}), 404
+            
+    except Exception as e:
+        print(f"Error obteniendo perfil: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Autocompletado de nombres de usuario mientras se escribe
+# Sin consultas a la base: sale del índice en memoria del proceso
+@bp.route('/api/autocomplete', methods=['GET'])
+def autocomplete_users():
+    text = (request.args.get('q') or '').strip()
+    limit = parse_limit(request.args.get('limit'), default=10, maximum=50)
+    username_index = current_resources().username_index
+    if not username_index.ready:
+        response = jsonify({'success': False, 'message': 'El autocompletado se está cargando'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    return jsonify({'success': True, 'data': username_index.complete(text, limit)})
+
+# API: Billetera de un usuario (billetera.html)
+# Saldo (foto en saldos + movimientos posteriores) y los últimos movimientos,
+# del más nuevo al más viejo. Parámetros: user, limit y before (id del
+# último movimiento ya mostrado, para seguir hacia atrás).
+@bp.route('/api/wallet', methods=['GET'])
+def get_wallet():
+    try:
+        username = request.args.get('user')
+        if not username:
+            return jsonify({'success': False, 'message': 'Usuario requerido'}), 400
+        
+        limit = parse_limit(request.args.get('limit'))
+        try:
+            before = int(request.args.get('before') or 2 ** 63 - 1)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Parámetro before inválido'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        balance = ledger.balance(cur, username)
+        cur.execute(ledger.HISTORY_QUERY, (username, before, limit))
+        history = [dict(m) for m in cur.fetchall()]
+        cur.close()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'likesDisponibles': balance['likes_disponibles'],
+                'likesGanados': balance['likes_ganados'],
+                'dineroGanado': balance['dinero_ganado'],
+                'movimientos': history
+            },
+            'nextBefore': history[-1]['id'] if len(history) == limit else None
+        })
+        
+    except Exception as e:
+        print(f"Error obteniendo billetera: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
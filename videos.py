@@ -0,0 +1,128 @@
+# Páginas de /api/all-videos, compartidas por videos_api.py (Flask) y
+# async_api.py (asyncio): las mismas consultas, el mismo formato y el mismo
+# ETag en los dos servidores. Cada uno sólo pone cómo ejecutarlas.
+#
+# Paginado por keyset sobre (fecha_subida, video_id). Una página (igual para
+# todos los usuarios) es (videos, next_cursor, versiones) y vive en
+# feed_cache; las versiones son las de videos y videos:<autor> de sus
+# autores, leídas antes que las filas o con ellas. Los flags is_liked /
+# is_following se añaden encima con USER_FLAGS_QUERY.
+import counters
+import etags
+from caches import feed_cache
+from pagination import encode_cursor, decode_cursor, parse_limit
+
+PAGE_QUERY = '''
+    SELECT v.video_id, v.username as user, v.titulo, v.descripcion as description,
+           v.video_url, v.thumbnail_url, v.music_name as music,
+           ''' + counters.value('videos.likes', 'v') + ''' as likes,
+           ''' + counters.value('videos.visualizaciones', 'v') + ''' as visualizaciones,
+           v.comentarios as comments,
+           v.fecha_subida,
+           u.image_url as profile_img,
+           ''' + etags.value("'videos:' || v.username") + ''' as version
+    FROM (
+        SELECT * FROM videos
+        {filter}
+        ORDER BY fecha_subida DESC, video_id DESC
+        LIMIT %s
+    ) v
+    JOIN usuarios u ON v.username = u.username
+    ORDER BY v.fecha_subida DESC, v.video_id DESC
+'''
+
+FIRST_PAGE_QUERY = PAGE_QUERY.replace('{filter}', '')
+
+NEXT_PAGE_QUERY = PAGE_QUERY.replace('{filter}', 'WHERE (fecha_subida, video_id) < (%s, %s)')
+
+USER_FLAGS_QUERY = '''
+    SELECT 'like' as kind, video_id as key FROM likes
+    WHERE username = %s AND video_id = ANY(%s)
+    UNION ALL
+    SELECT 'follow', following FROM seguidores
+    WHERE follower = %s AND following = ANY(%s)
+'''
+
+
+def read_args(args):
+    """
+    (usuario, limit, cursor, posición) de la query string; la posición es
+    None en la primera página. Lanza InvalidCursor.
+    """
+    cursor = args.get('cursor')
+    return (args.get('user'), parse_limit(args.get('limit')), cursor,
+            decode_cursor(cursor) if cursor else None)
+
+
+def cache_key(cursor, limit):
+    return (cursor or '', limit)
+
+
+def page_query(position, limit):
+    """(sql, params) de la página tras `position`, con una fila de más."""
+    if position is None:
+        return FIRST_PAGE_QUERY, (limit + 1,)
+    return NEXT_PAGE_QUERY, tuple(position) + (limit + 1,)
+
+
+def version_resources(current_user, page, if_none_match):
+    """
+    Recursos cuya versión hay que leer: la del usuario (flags) y, para
+    revalidar, las de la página cacheada.
+    """
+    resources = [etags.profile(current_user)] if current_user else []
+    if page is not None and if_none_match:
+        resources += list(page[2])
+    return resources
+
+
+def is_stale(page, versions):
+    """¿Otro proceso cambió algo de la página cacheada después de leerla?"""
+    return any(versions.get(resource, version) != version for resource, version in page[2].items())
+
+
+def cache_page(key, rows, limit, page_versions, generation):
+    """Página de las filas de page_query y las versiones leídas antes; la guarda en feed_cache."""
+    videos = [dict(v) for v in rows]
+    next_cursor = None
+    if len(videos) > limit:
+        videos = videos[:limit]
+        next_cursor = encode_cursor(videos[-1]['fecha_subida'], videos[-1]['video_id'])
+    page_versions = dict(page_versions)
+    for v in videos:
+        page_versions[etags.user_videos(v['user'])] = v.pop('version')
+    page = (videos, next_cursor, page_versions)
+    feed_cache.set(key, page, generation)
+    return page
+
+
+def page_etag(page, current_user, versions, cursor, limit):
+    etag_versions = dict(page[2])
+    if current_user:
+        etag_versions[etags.profile(current_user)] = versions[etags.profile(current_user)]
+    return etags.make_etag(etag_versions, cursor, limit)
+
+
+def user_flags_params(current_user, videos):
+    """Params de USER_FLAGS_QUERY, o None si no hace falta consultar."""
+    if not (current_user and videos):
+        return None
+    return (current_user, [v['video_id'] for v in videos],
+            current_user, list({v['user'] for v in videos}))
+
+
+def with_user_flags(videos, rows):
+    """Copia de los videos con is_liked / is_following a partir de USER_FLAGS_QUERY."""
+    liked, followed = set(), set()
+    for row in rows:
+        (liked if row['kind'] == 'like' else followed).add(row['key'])
+    return [dict(v, is_liked=v['video_id'] in liked,
+                 is_following=v['user'] in followed) for v in videos]
+
+
+def response(page, data):
+    return {
+        'success': True,
+        'data': data,
+        'nextCursor': page[1]
+    }
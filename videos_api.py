@@ -0,0 +1,1165 @@
+# API de videos: listas y feed, búsqueda, subida (también por trozos),
+# acciones (likes, vistas, comentarios, seguir, lotes) y estadísticas de
+# los creadores
+import math
+import uuid
+
+from flask import Blueprint, request
+from psycopg2 import extensions
+
+import admission
+import analytics
+import comments
+import counters
+import etags
+import ranking
+import search
+import streaming
+import uploads
+import videos
+from caches import feed_cache, comments_cache, invalidate_feed, invalidate_profiles
+from metrics import jsonify
+from pagination import parse_limit, InvalidCursor
+from profiles import get_profiles
+from resources import current_resources, get_db_connection
+from storage import ChunkRejected, UploadBusy
+from view_buffer import ViewBufferFull
+
+bp = Blueprint('videos_api', __name__)
+
+# API: Obtener videos de un usuario
+# El ETag es la versión de videos:<usuario>, leída antes que los videos; con
+# If-None-Match que coincide se responde 304 sin leerlos. Con muchos videos
+# la lista se envía en streaming desde un cursor del servidor.
+@bp.route('/api/user-videos', methods=['GET'])
+def get_user_videos():
+    try:
+        username = request.args.get('user')
+        if not username:
+            return jsonify({'success': False, 'message': 'Usuario requerido'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        etag = etags.make_etag(etags.current(cur, [etags.user_videos(username)]))
+        if etags.matches(request.headers.get('If-None-Match'), etag):
+            cur.close()
+            return etags.not_modified(etag)
+        cur.close()
+        
+        cur = streaming.server_cursor(conn)
+        cur.execute('''
+            SELECT video_id, titulo, descripcion, video_url, thumbnail_url, music_name,
+                   ''' + counters.value('videos.likes') + ''' as likes,
+                   ''' + counters.value('videos.visualizaciones') + ''' as visualizaciones,
+                   comentarios, fecha_subida
+            FROM videos
+            WHERE username = %s
+            ORDER BY fecha_subida DESC
+        ''', (username,))
+        
+        return etags.tagged(streaming.list_response(cur, success=True), etag)
+        
+    except Exception as e:
+        print(f"Error obteniendo videos: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Obtener todos los videos (para feed)
+# Paginado por keyset sobre (fecha_subida, video_id): cada página cuesta lo
+# mismo sin importar cuántos videos haya. Parámetros: limit y cursor.
+# La página (igual para todos los usuarios) sale de feed_cache; los flags
+# is_liked / is_following se añaden encima con una sola consulta.
+# El ETag combina las versiones de la página (videos y videos:<autor> de sus
+# autores, guardadas con ella) y la de perfil:<usuario> para los flags.
+# Consultas y formato en videos.py (compartidos con async_api.py).
+@bp.route('/api/all-videos', methods=['GET'])
+def get_all_videos():
+    try:
+        try:
+            current_user, limit, cursor, position = videos.read_args(request.args)
+        except InvalidCursor as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        cache_key = videos.cache_key(cursor, limit)
+        generation = feed_cache.generation
+        page = feed_cache.get(cache_key)
+        if_none_match = request.headers.get('If-None-Match')
+
+        # Sólo se toma una conexión si hay algo que consultar
+        cur = None
+        if page is None or current_user or if_none_match:
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+            cur = conn.cursor()
+
+        # Si otro proceso cambió la página cacheada se vuelve a leer
+        resources = videos.version_resources(current_user, page, if_none_match)
+        versions = etags.current(cur, resources) if resources else {}
+        if page is not None and videos.is_stale(page, versions):
+            page = None
+
+        if page is None:
+            page_versions = etags.current(cur, [etags.FEED])
+            cur.execute(*videos.page_query(position, limit))
+            page = videos.cache_page(cache_key, cur.fetchall(), limit, page_versions, generation)
+
+        etag = videos.page_etag(page, current_user, versions, cursor, limit)
+        if etags.matches(if_none_match, etag):
+            if cur is not None:
+                cur.close()
+            return etags.not_modified(etag)
+
+        data = with_user_flags(cur, current_user, page[0])
+        if cur is not None:
+            cur.close()
+        
+        return etags.tagged(jsonify(videos.response(page, data)), etag)
+        
+    except Exception as e:
+        print(f"Error obteniendo videos: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def with_user_flags(cur, current_user, page):
+    """Copia de los videos con is_liked / is_following del usuario (una consulta)."""
+    params = videos.user_flags_params(current_user, page)
+    rows = []
+    if params:
+        cur.execute(videos.USER_FLAGS_QUERY, params)
+        rows = cur.fetchall()
+    return videos.with_user_flags(page, rows)
+
+# API: Feed personalizado (ver ranking.py)
+# Los videos ordenados por su puntuación para el usuario, con un extra
+# para los creadores que sigue y sin los suyos. El cursor es la posición
+# en el ranking: entre páginas el orden puede cambiar un poco.
+@bp.route('/api/feed', methods=['GET'])
+def get_ranked_feed():
+    try:
+        current_user = request.args.get('user')
+        limit = parse_limit(request.args.get('limit'))
+        try:
+            offset = int(request.args.get('cursor') or 0)
+        except ValueError:
+            offset = -1
+        if not 0 <= offset <= ranking.MAX_DEPTH:
+            return jsonify({'success': False, 'message': 'Cursor inválido'}), 400
+        
+        feed_ranker = current_resources().feed_ranker
+        if not feed_ranker.ready:
+            response = jsonify({'success': False, 'message': 'El feed se está cargando'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        followed = []
+        if current_user:
+            cur.execute('SELECT following FROM seguidores WHERE follower = %s', (current_user,))
+            followed = [row['following'] for row in cur.fetchall()]
+        
+        # Una de más para saber si hay página siguiente
+        ranked = feed_ranker.rank(followed, k=offset + limit + 1, exclude_creator=current_user)
+        page_ids = ranked[offset:offset + limit]
+        
+        cur.execute('''
+            SELECT v.video_id, v.username as user, v.titulo, v.descripcion as description,
+                   v.video_url, v.thumbnail_url, v.music_name as music,
+                   ''' + counters.value('videos.likes', 'v') + ''' as likes,
+                   ''' + counters.value('videos.visualizaciones', 'v') + ''' as visualizaciones,
+                   v.comentarios as comments,
+                   v.fecha_subida,
+                   u.image_url as profile_img
+            FROM videos v
+            JOIN usuarios u ON v.username = u.username
+            WHERE v.video_id = ANY(%s)
+        ''', (page_ids,))
+        rows = {v['video_id']: dict(v) for v in cur.fetchall()}
+        page = [rows[video_id] for video_id in page_ids if video_id in rows]
+        
+        data = with_user_flags(cur, current_user, page)
+        cur.close()
+        
+        has_more = len(ranked) > offset + limit and offset + limit <= ranking.MAX_DEPTH
+        return jsonify({
+            'success': True,
+            'data': data,
+            'nextCursor': str(offset + limit) if has_more else None
+        })
+        
+    except Exception as e:
+        print(f"Error obteniendo el feed: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Búsqueda de videos (título, descripción, música) y usuarios
+# Parámetros: q, type ('all', 'videos' o 'users') y limit (por tipo)
+@bp.route('/api/search', methods=['GET'])
+def search_content():
+    try:
+        text = (request.args.get('q') or '').strip()
+        kind = request.args.get('type', 'all')
+        limit = parse_limit(request.args.get('limit'))
+        if not text:
+            return jsonify({'success': False, 'message': 'Texto de búsqueda requerido'}), 400
+        if kind not in ('all', 'videos', 'users'):
+            return jsonify({'success': False, 'message': 'Tipo de búsqueda inválido'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        data = {}
+        if kind in ('all', 'videos'):
+            cur.execute(search.VIDEOS_QUERY, {'text': text, 'limit': limit})
+            data['videos'] = [dict(v) for v in cur.fetchall()]
+        if kind in ('all', 'users'):
+            data['users'] = []
+            users_query = search.prefix_query(text)
+            if users_query:
+                cur.execute(search.USERS_QUERY, (users_query, limit))
+                data['users'] = [dict(u) for u in cur.fetchall()]
+        cur.close()
+        
+        for rows in data.values():
+            for row in rows:
+                row.pop('rank')
+        return jsonify({'success': True, 'data': data})
+        
+    except Exception as e:
+        print(f"Error buscando: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Guardar video
+@bp.route('/api/save-video', methods=['POST'])
+def save_video():
+    try:
+        data = request.get_json()
+        username = data.get('usuario')
+        titulo = data.get('titulo')
+        descripcion = data.get('descripcion')
+        video_url = data.get('videoUrl')
+        thumbnail_url = data.get('thumbnailUrl')
+        music_url = data.get('musicUrl', '')
+        
+        if not all([username, titulo, video_url, thumbnail_url]):
+            return jsonify({'success': False, 'message': 'Datos incompletos'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        video_id = insert_video(cur, username, titulo, descripcion, video_url, thumbnail_url, music_url)
+        conn.commit()
+        invalidate_feed()
+        cur.close()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Video guardado exitosamente',
+            'videoId': video_id
+        })
+        
+    except Exception as e:
+        print(f"Error guardando video: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# Alta de un video en la transacción de cur: la usan save_video y
+# complete_upload. Quien llama hace commit e invalidate_feed()
+def insert_video(cur, username, titulo, descripcion, video_url, thumbnail_url, music_url):
+    # Generar ID único para el video
+    video_id = str(uuid.uuid4())
+    
+    cur.execute('''
+        INSERT INTO videos (video_id, username, titulo, descripcion, video_url,
+                          thumbnail_url, music_url, music_name)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+    ''', (video_id, username, titulo, descripcion, video_url,
+          thumbnail_url, music_url, music_url))
+    etags.touch(cur, etags.FEED, etags.user_videos(username))
+    return video_id
+
+# ==================== SUBIDAS POR TROZOS ====================
+# Ver uploads.py. Mientras llegan los bytes de un trozo (o se calcula el
+# sha256 del fichero) la petición no retiene una conexión del pool: la
+# devuelve tras leer la sesión y toma otra para confirmar.
+
+def upload_error(status, message, session=None):
+    body = {'success': False, 'message': message}
+    if session is not None:
+        body['offset'] = session['recibido']
+    return jsonify(body), status
+
+# API: Abrir una subida (devuelve el uploadId y el tamaño de trozo sugerido)
+@bp.route('/api/uploads', methods=['POST'])
+def create_upload():
+    try:
+        data = request.get_json()
+        username = data.get('usuario')
+        kind = data.get('type', 'video')
+        content_type = (data.get('contentType') or '').split(';')[0].strip().lower()
+        size = data.get('size')
+        checksum = data.get('sha256')
+        
+        if (not username or kind not in uploads.CONTENT_TYPES
+                or not isinstance(size, int) or isinstance(size, bool) or size <= 0):
+            return jsonify({'success': False, 'message': 'Datos incompletos'}), 400
+        if content_type not in uploads.CONTENT_TYPES[kind]:
+            return jsonify({'success': False, 'message': 'Formato de fichero no admitido'}), 415
+        if size > uploads.MAX_SIZE[kind]:
+            return jsonify({'success': False, 'message': 'El fichero es demasiado grande'}), 413
+        if checksum is not None and not uploads.is_sha256(checksum):
+            return jsonify({'success': False, 'message': 'sha256 inválido'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT COUNT(*) as abiertas FROM subidas
+            WHERE username = %s AND estado = 'abierta'
+        ''', (username,))
+        if cur.fetchone()['abiertas'] >= uploads.MAX_OPEN:
+            cur.close()
+            return jsonify({'success': False, 'message': 'Demasiadas subidas sin terminar'}), 429
+        
+        upload_id = str(uuid.uuid4())
+        cur.execute('''
+            INSERT INTO subidas (upload_id, username, tipo, content_type, tamano, sha256)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        ''', (upload_id, username, kind, content_type, size, checksum.lower() if checksum else None))
+        cur.execute(uploads.SESSION_QUERY, (upload_id,))
+        session = cur.fetchone()
+        conn.commit()
+        cur.close()
+        
+        response = jsonify({'success': True, 'data': uploads.describe(session)})
+        response.headers['Location'] = f'/api/uploads/{upload_id}'
+        return response, 201
+        
+    except Exception as e:
+        print(f"Error abriendo subida: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Estado de una subida: desde qué offset continuar tras un corte
+@bp.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        cur.execute(uploads.SESSION_QUERY, (upload_id,))
+        session = cur.fetchone()
+        cur.close()
+        if session is None:
+            return jsonify({'success': False, 'message': 'Subida no encontrada'}), 404
+        
+        response = jsonify({'success': True, 'data': uploads.describe(session)})
+        response.headers['Upload-Offset'] = str(session['recibido'])
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+        
+    except Exception as e:
+        print(f"Error leyendo subida: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Recibir un trozo. El cuerpo son los bytes en crudo (no multipart) y
+# se copian al almacenamiento por bloques, sin leerlos enteros en memoria
+@bp.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    try:
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return upload_error(400, 'Falta la cabecera Upload-Offset')
+        length = request.content_length
+        if length is None:
+            return upload_error(411, 'Falta la cabecera Content-Length')
+        if not 0 < length <= uploads.MAX_CHUNK_SIZE:
+            return upload_error(413, 'Trozo vacío o demasiado grande')
+        checksum = request.headers.get('X-Chunk-Sha256')
+        if checksum is not None and not uploads.is_sha256(checksum):
+            return upload_error(400, 'X-Chunk-Sha256 inválido')
+        
+        resources = current_resources()
+        conn = get_db_connection()
+        if not conn:
+            return upload_error(500, 'Error de conexión')
+        
+        cur = conn.cursor()
+        cur.execute(uploads.SESSION_QUERY, (upload_id,))
+        session = cur.fetchone()
+        cur.close()
+        conn.commit()
+        resources.release_db_connection(None)
+        
+        if session is None:
+            return upload_error(404, 'Subida no encontrada')
+        if session['estado'] != 'abierta':
+            return upload_error(409, 'La subida ya está completa', session)
+        if offset != session['recibido']:
+            return upload_error(409, 'El trozo no empieza donde sigue la subida', session)
+        if offset + length > session['tamano']:
+            return upload_error(400, 'El trozo pasa del tamaño de la subida', session)
+        
+        with resources.storage.locked(upload_id):
+            try:
+                resources.storage.write(upload_id, offset, request.stream, length, checksum)
+            except ChunkRejected as e:
+                return upload_error(400, str(e), session)
+            
+            # Confirmar el offset antes de soltar el candado: hasta aquí el
+            # trozo no cuenta y el siguiente intento lo sobrescribe
+            conn = get_db_connection()
+            if not conn:
+                return upload_error(500, 'Error de conexión', session)
+            cur = conn.cursor()
+            cur.execute('''
+                UPDATE subidas SET recibido = %s, actualizada = NOW()
+                WHERE upload_id = %s AND recibido = %s AND estado = 'abierta'
+            ''', (offset + length, upload_id, offset))
+            confirmed = cur.rowcount == 1
+            conn.commit()
+            cur.close()
+        
+        if not confirmed:
+            return upload_error(409, 'La subida cambió mientras llegaba el trozo')
+        response = jsonify({'success': True, 'offset': offset + length})
+        response.headers['Upload-Offset'] = str(offset + length)
+        return response
+        
+    except UploadBusy:
+        return upload_error(409, 'Ya se está recibiendo un trozo de esta subida')
+    except Exception as e:
+        print(f"Error recibiendo trozo: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Completar una subida. Un video se registra igual que en save_video
+# (titulo, descripcion, musicUrl y la miniatura como thumbnailUrl o como
+# thumbnailUploadId de una subida de imagen ya completa). Repetirla
+# devuelve el mismo resultado
+@bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        resources = current_resources()
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        cur.execute(uploads.SESSION_QUERY, (upload_id,))
+        session = cur.fetchone()
+        if session is None:
+            cur.close()
+            return jsonify({'success': False, 'message': 'Subida no encontrada'}), 404
+        if session['estado'] == 'completa':
+            cur.close()
+            # Se confirma antes de publicar: si publicar falló, el reintento
+            # mueve la parte que quedó
+            if resources.storage.size(upload_id):
+                with resources.storage.locked(upload_id):
+                    resources.storage.publish(upload_id, uploads.media_name(session))
+            return jsonify({'success': True, 'videoId': session['video_id'], 'data': uploads.describe(session)})
+        if session['recibido'] != session['tamano']:
+            cur.close()
+            return upload_error(409, 'Faltan trozos por subir', session)
+        
+        if session['tipo'] == 'video':
+            titulo = data.get('titulo')
+            descripcion = data.get('descripcion')
+            music_url = data.get('musicUrl', '')
+            thumbnail_url = data.get('thumbnailUrl')
+            if data.get('thumbnailUploadId'):
+                cur.execute(uploads.SESSION_QUERY, (data['thumbnailUploadId'],))
+                thumbnail = cur.fetchone()
+                if (thumbnail is None or thumbnail['tipo'] != 'imagen' or thumbnail['estado'] != 'completa'
+                        or thumbnail['username'] != session['username']):
+                    cur.close()
+                    return jsonify({'success': False, 'message': 'Miniatura no encontrada'}), 400
+                thumbnail_url = thumbnail['media_url']
+            if not all([titulo, thumbnail_url]):
+                cur.close()
+                return jsonify({'success': False, 'message': 'Datos incompletos'}), 400
+        cur.close()
+        conn.commit()
+        resources.release_db_connection(None)
+        
+        with resources.storage.locked(upload_id):
+            # Sin parte es un reintento cuyo fichero ya se publicó
+            if session['sha256'] and resources.storage.size(upload_id):
+                if uploads.full_checksum(resources.storage, upload_id) != session['sha256']:
+                    conn = get_db_connection()
+                    if not conn:
+                        return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+                    cur = conn.cursor()
+                    cur.execute('''
+                        UPDATE subidas SET recibido = 0, actualizada = NOW()
+                        WHERE upload_id = %s AND estado = 'abierta'
+                    ''', (upload_id,))
+                    conn.commit()
+                    cur.close()
+                    session['recibido'] = 0
+                    return upload_error(422, 'El fichero no coincide con su sha256: hay que subirlo de nuevo', session)
+            
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+            cur = conn.cursor()
+            cur.execute(uploads.SESSION_QUERY + ' FOR UPDATE', (upload_id,))
+            session = cur.fetchone()
+            if session is None or session['estado'] != 'abierta' or session['recibido'] != session['tamano']:
+                conn.rollback()
+                cur.close()
+                return jsonify({'success': False, 'message': 'La subida cambió mientras se completaba'}), 409
+            
+            # El fichero se publica después del COMMIT: si el COMMIT falla la
+            # parte sigue donde estaba y la subida se puede completar otra vez
+            name = uploads.media_name(session)
+            media_url = resources.storage.url(name)
+            video_id = None
+            if session['tipo'] == 'video':
+                video_id = insert_video(cur, session['username'], titulo, descripcion,
+                                        media_url, thumbnail_url, music_url)
+            cur.execute('''
+                UPDATE subidas SET estado = 'completa', media_url = %s, video_id = %s, actualizada = NOW()
+                WHERE upload_id = %s
+            ''', (media_url, video_id, upload_id))
+            conn.commit()
+            cur.close()
+            resources.storage.publish(upload_id, name)
+        
+        if video_id:
+            invalidate_feed()
+        session.update(estado='completa', media_url=media_url, video_id=video_id)
+        return jsonify({
+            'success': True,
+            'message': 'Video guardado exitosamente' if video_id else 'Subida completa',
+            'videoId': video_id,
+            'data': uploads.describe(session)
+        })
+        
+    except UploadBusy:
+        return jsonify({'success': False, 'message': 'Ya se está recibiendo un trozo de esta subida'}), 409
+    except Exception as e:
+        print(f"Error completando subida: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# Ficheros publicados por las subidas (con STORAGE_BACKEND=local)
+@bp.route('/media/<path:name>', methods=['GET'])
+def media(name):
+    return current_resources().storage.serve(name)
+
+# ==================== ACCIONES ====================
+# Lógica de like, vista, comentario y seguimiento compartida entre los
+# endpoints individuales y /api/batch. Cada acción valida los datos, usa la
+# conexión de la petición sin hacer commit y devuelve (respuesta, status).
+
+def is_key(value):
+    """Identificador válido para la BD: texto no vacío y sin bytes nulos."""
+    return isinstance(value, str) and value != '' and '\x00' not in value
+
+def record_likes_and_follows(cur, likes, follows):
+    """
+    Registra likes [(video_id, username)] y seguimientos [(follower,
+    following)] en una sola sentencia, con sus contadores, el like ganado
+    en la billetera del autor y las versiones de los recursos que cambian.
+    Los índices únicos descartan los duplicados, también si llegan dos a la
+    vez. Devuelve (likes nuevos, seguimientos nuevos) como sets.
+    """
+    ctes, params, inserted, keys = [], [], [], []
+    if likes:
+        increment_sql, increment_params = counters.increment('videos.likes', 'SELECT video_id FROM likes_nuevos')
+        ctes.append('''likes_nuevos AS (
+            INSERT INTO likes (video_id, username)
+            SELECT * FROM unnest(%s::text[], %s::text[])
+            ON CONFLICT (video_id, username) DO NOTHING
+            RETURNING video_id, username
+        ), contador_likes AS (
+            ''' + increment_sql + '''
+        ), ganancia AS (
+            INSERT INTO movimientos (username, tipo, likes_ganados, referencia)
+            SELECT v.username, 'like', 1, v.video_id
+            FROM likes_nuevos n JOIN videos v ON v.video_id = n.video_id
+        )''')
+        params += [[video_id for video_id, _ in likes], [username for _, username in likes]]
+        params += increment_params
+        inserted.append("SELECT 'like' as tipo, video_id as a, username as b FROM likes_nuevos")
+        keys.append("SELECT 'videos:' || username FROM videos WHERE video_id IN (SELECT video_id FROM likes_nuevos)")
+    if follows:
+        ctes.append('''seguidores_nuevos AS (
+            INSERT INTO seguidores (follower, following)
+            SELECT * FROM unnest(%s::text[], %s::text[])
+            ON CONFLICT (follower, following) DO NOTHING
+            RETURNING follower, following
+        )''')
+        params += [[follower for follower, _ in follows], [following for _, following in follows]]
+        # Un usuario puede seguir y ser seguido en el mismo lote: los dos
+        # contadores de su fila van en la misma actualización
+        for i, (increment_sql, increment_params) in enumerate(counters.increments([
+                ('usuarios.following', 'SELECT follower FROM seguidores_nuevos'),
+                ('usuarios.followers', 'SELECT following FROM seguidores_nuevos')])):
+            ctes.append(f'contador_seguidores_{i} AS ({increment_sql})')
+            params += increment_params
+        inserted.append("SELECT 'follow' as tipo, follower as a, following as b FROM seguidores_nuevos")
+        keys.append("SELECT 'perfil:' || follower FROM seguidores_nuevos")
+        keys.append("SELECT 'perfil:' || following FROM seguidores_nuevos")
+    if not inserted:
+        return set(), set()
+    
+    bump_sql, bump_params = etags.bump(' UNION ALL '.join(keys))
+    cur.execute('WITH ' + ', '.join(ctes + [bump_sql]) + ' ' + ' UNION ALL '.join(inserted),
+                tuple(params) + bump_params)
+    rows = cur.fetchall()
+    return ({(r['a'], r['b']) for r in rows if r['tipo'] == 'like'},
+            {(r['a'], r['b']) for r in rows if r['tipo'] == 'follow'})
+
+def like_error(data):
+    """(respuesta, status) si el like no es válido; None si lo es."""
+    video_id = data.get('videoId')
+    username = data.get('username')
+    
+    if not all([video_id, username]):
+        return {'success': False, 'message': 'Datos incompletos'}, 400
+    if not (is_key(video_id) and is_key(username)):
+        return {'success': False, 'message': 'Datos inválidos'}, 400
+    return None
+
+def like_action(data):
+    error = like_error(data)
+    if error:
+        return error
+    
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'message': 'Error de conexión'}, 500
+    
+    cur = conn.cursor()
+    liked, _ = record_likes_and_follows(cur, [(data['videoId'], data['username'])], [])
+    cur.close()
+    return like_result(data, bool(liked))
+
+def like_result(data, inserted):
+    if not inserted:
+        return {'success': False, 'message': 'Ya diste like a este video'}, 400
+    
+    return {'success': True, 'message': 'Like registrado'}, 200
+
+# Las vistas se encolan en view_buffer y se escriben por lotes; el contador
+# devuelto es el último valor leído de la BD más las vistas pendientes
+def view_action(data):
+    video_id = data.get('videoId')
+    username = data.get('username')
+    
+    if not all([video_id, username]):
+        return {'success': False, 'message': 'Datos incompletos'}, 400
+    
+    # Una clave que no es texto haría fallar el lote entero de view_buffer
+    if not (is_key(video_id) and is_key(username)):
+        return {'success': False, 'message': 'Datos inválidos'}, 400
+
+    view_buffer = current_resources().view_buffer
+    try:
+        view_buffer.record(video_id, username)
+    except ViewBufferFull:
+        return {'success': False, 'message': 'Servidor ocupado, inténtalo de nuevo'}, 503
+
+    base_count = view_buffer.known_count(video_id)
+    if base_count is None:
+        conn = get_db_connection()
+        if not conn:
+            return {'success': False, 'message': 'Error de conexión'}, 500
+        
+        cur = conn.cursor()
+        cur.execute('SELECT ' + counters.value('videos.visualizaciones') +
+                    ' as visualizaciones FROM videos WHERE video_id = %s', (video_id,))
+        result = cur.fetchone()
+        cur.close()
+        base_count = result['visualizaciones'] if result else 0
+        view_buffer.remember(video_id, base_count)
+    
+    return {
+        'success': True,
+        'newViewCount': base_count + view_buffer.pending_count(video_id)
+    }, 200
+
+def comment_action(data):
+    video_id = data.get('videoId')
+    username = data.get('username')
+    comment_text = data.get('commentText')
+    
+    if not all([video_id, username, comment_text]):
+        return {'success': False, 'message': 'Datos incompletos'}, 400
+    if not (is_key(video_id) and is_key(username) and is_key(comment_text)):
+        return {'success': False, 'message': 'Datos inválidos'}, 400
+    
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'message': 'Error de conexión'}, 500
+    
+    cur = conn.cursor()
+    
+    # Generar ID único para el comentario
+    comment_id = str(uuid.uuid4())
+    
+    # Insertar comentario (con la imagen actual del usuario) y actualizar
+    # el contador y las versiones en una sola sentencia
+    bump_sql, bump_params = etags.bump('''
+        SELECT 'comentarios:' || video_id FROM nuevo
+        UNION ALL
+        SELECT 'videos:' || username FROM videos
+        WHERE video_id IN (SELECT video_id FROM nuevo)
+    ''')
+    cur.execute('''
+        WITH nuevo AS (
+            INSERT INTO comentarios (comment_id, video_id, username, comment_text, image_url)
+            SELECT %s, %s, %s, %s,
+                   COALESCE((SELECT image_url FROM usuarios WHERE username = %s), '')
+            RETURNING video_id, timestamp, image_url
+        ), contador AS (
+            UPDATE videos SET comentarios = comentarios + 1
+            WHERE video_id IN (SELECT video_id FROM nuevo)
+        ), ''' + bump_sql + '''
+        SELECT timestamp, image_url FROM nuevo
+    ''', (comment_id, video_id, username, comment_text, username) + bump_params)
+    inserted = cur.fetchone()
+    timestamp, image_url = inserted['timestamp'], inserted['image_url']
+    cur.close()
+    
+    return {
+        'success': True,
+        'message': 'Comentario agregado',
+        'commentId': comment_id,
+        # Mismo formato que /api/comments, para pintarlo sin recargar
+        'comment': {
+            'comment_id': comment_id,
+            'username': username,
+            'commentText': comment_text,
+            'timestamp': timestamp,
+            'edited': False,
+            'image_url': image_url
+        }
+    }, 200
+
+def follow_error(data):
+    """(respuesta, status) si el seguimiento no es válido; None si lo es."""
+    follower = data.get('follower')
+    following = data.get('following')
+    
+    if not all([follower, following]):
+        return {'success': False, 'message': 'Datos incompletos'}, 400
+    if not (is_key(follower) and is_key(following)):
+        return {'success': False, 'message': 'Datos inválidos'}, 400
+    
+    if follower == following:
+        return {'success': False, 'message': 'No puedes seguirte a ti mismo'}, 400
+    return None
+
+def follow_action(data):
+    error = follow_error(data)
+    if error:
+        return error
+    
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'message': 'Error de conexión'}, 500
+    
+    cur = conn.cursor()
+    _, followed = record_likes_and_follows(cur, [], [(data['follower'], data['following'])])
+    cur.close()
+    return follow_result(data, bool(followed))
+
+def follow_result(data, inserted):
+    if not inserted:
+        return {'success': False, 'message': 'Ya sigues a este usuario'}, 400
+    
+    return {
+        'success': True,
+        'message': f"Ahora sigues a @{data['following']}"
+    }, 200
+
+# Tipos de /api/batch que se escriben todos juntos con
+# record_likes_and_follows -> (validación, campos de la clave, resultado)
+BATCH_WRITES = {
+    'like': (like_error, ('videoId', 'username'), like_result),
+    'follow': (follow_error, ('follower', 'following'), follow_result),
+}
+# Tipos de /api/batch que se ejecutan uno a uno, en orden
+BATCH_ACTIONS = {
+    'comment': comment_action,
+}
+# Tipos de /api/batch que se ejecutan tras el COMMIT: las vistas van a
+# view_buffer, que las escribe aunque el lote se deshaga
+BATCH_AFTER_COMMIT = {
+    'view': view_action,
+}
+MAX_BATCH_ACTIONS = 100
+
+# API: Dar like a un video
+@bp.route('/api/like-video', methods=['POST'])
+def like_video():
+    try:
+        body, status = like_action(request.get_json())
+        if status == 200:
+            get_db_connection().commit()
+            invalidate_feed()
+        return jsonify(body), status
+        
+    except Exception as e:
+        print(f"Error dando like: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Registrar visualización
+@bp.route('/api/record-view', methods=['POST'])
+def record_view():
+    try:
+        body, status = view_action(request.get_json())
+        if status == 503:
+            return jsonify(body), status, {'Retry-After': '1'}
+        return jsonify(body), status
+        
+    except Exception as e:
+        print(f"Error registrando vista: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Obtener comentarios
+# Paginado por keyset sobre (timestamp, comment_id), del más nuevo al más
+# viejo. Parámetros: limit (máx. 100) y cursor. La primera página sale de
+# comments_cache y el total del contador videos.comentarios. El ETag es la
+# versión de comentarios:<video_id> con la que se leyó la página.
+@bp.route('/api/comments', methods=['GET'])
+def get_comments():
+    try:
+        try:
+            video_id, limit, cursor, position = comments.read_args(request.args)
+        except InvalidCursor as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        if not video_id:
+            return jsonify({'success': False, 'message': 'Video ID requerido'}), 400
+
+        generation = comments_cache.generation
+        entry = None if cursor else comments_cache.get(video_id)
+        resource = etags.comments(video_id)
+        if_none_match = request.headers.get('If-None-Match')
+
+        if entry is not None and if_none_match:
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+            # Revalidar: si la versión no es la de la entrada, se vuelve a leer
+            cur = conn.cursor()
+            if etags.current(cur, [resource])[resource] != entry['version']:
+                entry = None
+            cur.close()
+
+        if entry is None:
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+            
+            cur = conn.cursor()
+            cur.execute(comments.TOTAL_QUERY, (video_id,))
+            video = cur.fetchone()
+            total = video['total'] if video else 0
+            version = video['version'] if video else 0
+            
+            if cursor:
+                cur.execute(comments.PAGE_QUERY, comments.page_params(video_id, position, limit))
+                page, next_cursor = comments.page(cur.fetchall(), limit)
+            else:
+                cur.execute(comments.FIRST_PAGE_QUERY, (video_id, comments.FIRST_PAGE_SIZE + 1))
+                entry = comments.cache_first_page(video_id, cur.fetchall(), total, version, generation)
+            cur.close()
+
+        if entry is not None:
+            page, next_cursor = comments.first_page(entry, limit)
+            total = entry['total']
+            version = entry['version']
+
+        etag = comments.page_etag(video_id, version, cursor, limit)
+        if etags.matches(if_none_match, etag):
+            return etags.not_modified(etag)
+
+        # Avatares actuales de los autores de la página (profile_cache)
+        authors = get_profiles([c['username'] for c in page], get_db_connection)
+        
+        return etags.tagged(jsonify(comments.response(page, authors, next_cursor, total)), etag)
+        
+    except Exception as e:
+        print(f"Error obteniendo comentarios: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Agregar comentario
+@bp.route('/api/add-comment', methods=['POST'])
+def add_comment():
+    try:
+        data = request.get_json()
+        body, status = comment_action(data)
+        if status == 200:
+            get_db_connection().commit()
+            comments.add_to_first_page(data['videoId'], body['comment'])
+        return jsonify(body), status
+        
+    except Exception as e:
+        print(f"Error agregando comentario: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Seguir usuario
+@bp.route('/api/follow-user', methods=['POST'])
+def follow_user():
+    try:
+        data = request.get_json()
+        body, status = follow_action(data)
+        if status == 200:
+            get_db_connection().commit()
+            invalidate_feed()
+            invalidate_profiles(data['follower'], data['following'])
+        return jsonify(body), status
+        
+    except Exception as e:
+        print(f"Error siguiendo usuario: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Ejecutar varias acciones (view, like, comment, follow) en una petición
+# Body: {"actions": [{"type": "like", "videoId": ..., "username": ...}, ...]}
+# Todo va en una sola conexión y transacción. Primero se validan todas las
+# acciones; después los likes y seguimientos se escriben en una sola
+# sentencia y los comentarios en orden, cada uno en su propio SAVEPOINT para
+# que un error no deshaga los demás. Las vistas se encolan en view_buffer
+# sólo después del COMMIT: si el lote se deshace no se cuentan.
+@bp.route('/api/batch', methods=['POST'])
+def batch():
+    try:
+        data = request.get_json() or {}
+        actions = data.get('actions')
+        
+        if not isinstance(actions, list) or not actions:
+            return jsonify({'success': False, 'message': 'Lista de acciones requerida'}), 400
+        
+        if len(actions) > MAX_BATCH_ACTIONS:
+            return jsonify({'success': False, 'message': f'Máximo {MAX_BATCH_ACTIONS} acciones por lote'}), 400
+        
+        control = current_resources().admission_control
+        ip = admission.client_ip()
+        results = [None] * len(actions)
+        writes = {kind: [] for kind in BATCH_WRITES}    # tipo -> [(índice, clave)]
+        ordered = []                                    # (índice, tipo) de los comentarios
+        after_commit = []                               # (índice, tipo) de las vistas
+        
+        for index, item in enumerate(actions):
+            kind = item.get('type') if isinstance(item, dict) else None
+            if kind not in BATCH_WRITES and kind not in BATCH_ACTIONS and kind not in BATCH_AFTER_COMMIT:
+                results[index] = {'success': False, 'message': 'Tipo de acción desconocido', 'status': 400}
+                continue
+            
+            # Cada acción gasta de los cubos de su IP y su usuario como si
+            # fuera suelta: un lote no puede saltarse los límites por IP
+            item_class, user_field = admission.BATCH_CLASSES[kind]
+            wait = control.wait(item_class, ip, item.get(user_field))
+            if wait:
+                results[index] = {'success': False, 'message': 'Demasiadas peticiones, inténtalo más tarde',
+                                  'status': 429, 'retryAfter': max(1, math.ceil(wait))}
+                continue
+            
+            if kind in BATCH_WRITES:
+                check, fields, _ = BATCH_WRITES[kind]
+                error = check(item)
+                if error:
+                    results[index] = dict(error[0], status=error[1])
+                else:
+                    writes[kind].append((index, tuple(item[field] for field in fields)))
+            elif kind in BATCH_ACTIONS:
+                ordered.append((index, kind))
+            else:
+                after_commit.append((index, kind))
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        feed_changed = False
+        stale_profiles = set()
+        new_comments = []
+        
+        if writes['like'] or writes['follow']:
+            # Es la primera sentencia del lote: si falla, el rollback no
+            # deshace nada más
+            try:
+                inserted = dict(zip(('like', 'follow'), record_likes_and_follows(
+                    cur,
+                    list(dict.fromkeys(key for _, key in writes['like'])),
+                    list(dict.fromkeys(key for _, key in writes['follow'])))))
+                failure = None
+            except Exception as e:
+                print(f"Error en los likes y seguimientos del lote: {e}")
+                conn.rollback()
+                failure = str(e)
+            
+            for kind, pending in writes.items():
+                result = BATCH_WRITES[kind][2]
+                for index, key in pending:
+                    if failure:
+                        body, status = {'success': False, 'message': failure}, 500
+                    else:
+                        # Una clave repetida en el lote sólo cuenta la primera vez
+                        body, status = result(actions[index], key in inserted[kind])
+                        inserted[kind].discard(key)
+                    feed_changed = feed_changed or status == 200
+                    if kind == 'follow' and status == 200:
+                        stale_profiles.update(key)
+                    results[index] = dict(body, status=status)
+        
+        for index, kind in ordered:
+            item = actions[index]
+            cur.execute('SAVEPOINT batch_action')
+            try:
+                body, status = BATCH_ACTIONS[kind](item)
+            except Exception as e:
+                print(f"Error en acción {kind} del lote: {e}")
+                body, status = {'success': False, 'message': str(e)}, 500
+            
+            if status == 200:
+                cur.execute('RELEASE SAVEPOINT batch_action')
+            else:
+                cur.execute('ROLLBACK TO SAVEPOINT batch_action')
+            if kind == 'comment' and status == 200:
+                new_comments.append((item['videoId'], body['comment']))
+            results[index] = dict(body, status=status)
+        
+        # Con la transacción abortada el COMMIT desharía todo sin avisar
+        if conn.get_transaction_status() == extensions.TRANSACTION_STATUS_INERROR:
+            conn.rollback()
+            cur.close()
+            return jsonify({'success': False, 'message': 'El lote falló y no se guardó'}), 500
+        
+        conn.commit()
+        cur.close()
+        if feed_changed:
+            invalidate_feed()
+        invalidate_profiles(*stale_profiles)
+        for video_id, comment in new_comments:
+            comments.add_to_first_page(video_id, comment)
+        
+        for index, kind in after_commit:
+            try:
+                body, status = BATCH_AFTER_COMMIT[kind](actions[index])
+            except Exception as e:
+                print(f"Error en acción {kind} del lote: {e}")
+                body, status = {'success': False, 'message': str(e)}, 500
+            results[index] = dict(body, status=status)
+        
+        return jsonify({
+            'success': True,
+            'results': results
+        })
+        
+    except Exception as e:
+        print(f"Error ejecutando lote: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Estadísticas de un creador (panel de streamer.html)
+# Salen de la tabla estadisticas (analytics.py), nunca de vistas / likes.
+# Parámetros: user, granularity ('hour' o 'day') y periods (cuántas horas o
+# días hacia atrás, el actual incluido). Los buckets sin actividad no vienen.
+STATS_GRANULARITIES = {'hour': 'hora', 'day': 'dia'}
+
+def stats_window():
+    granularity = STATS_GRANULARITIES.get(request.args.get('granularity', 'day'))
+    periods = parse_limit(request.args.get('periods'), default=24 if granularity == 'hora' else 30,
+                          maximum=24 * 14 if granularity == 'hora' else 366)
+    return granularity, analytics.window_start(granularity, periods) if granularity else None
+
+def stats_series(cur, scope, key, granularity, since):
+    cur.execute(analytics.SERIES_QUERY, (scope, key, granularity, since))
+    return [{
+        'bucket': row['bucket'].isoformat(),
+        'views': row['vistas'],
+        'uniqueViewers': row['espectadores'],
+        'likes': row['likes']
+    } for row in cur.fetchall()]
+
+@bp.route('/api/creator-stats', methods=['GET'])
+def get_creator_stats():
+    try:
+        username = request.args.get('user')
+        if not username:
+            return jsonify({'success': False, 'message': 'Usuario requerido'}), 400
+        
+        granularity, since = stats_window()
+        if not granularity:
+            return jsonify({'success': False, 'message': 'Granularidad inválida'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        series = stats_series(cur, 'creador', username, granularity, since)
+        cur.execute(analytics.TOP_VIDEOS_QUERY, (granularity, since, username, 10))
+        top_videos = [{
+            'videoId': row['video_id'],
+            'titulo': row['titulo'],
+            'views': row['vistas'],
+            'likes': row['likes']
+        } for row in cur.fetchall()]
+        cur.execute(analytics.UPDATED_QUERY)
+        updated = cur.fetchone()['actualizado']
+        cur.close()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'series': series,
+                'topVideos': top_videos,
+                'updatedAt': updated.isoformat() if updated else None
+            }
+        })
+        
+    except Exception as e:
+        print(f"Error obteniendo estadísticas: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# API: Estadísticas de un video (mismos parámetros, con videoId)
+@bp.route('/api/video-stats', methods=['GET'])
+def get_video_stats():
+    try:
+        video_id = request.args.get('videoId')
+        if not video_id:
+            return jsonify({'success': False, 'message': 'Video ID requerido'}), 400
+        
+        granularity, since = stats_window()
+        if not granularity:
+            return jsonify({'success': False, 'message': 'Granularidad inválida'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error de conexión'}), 500
+        
+        cur = conn.cursor()
+        series = stats_series(cur, 'video', video_id, granularity, since)
+        cur.execute(analytics.UPDATED_QUERY)
+        updated = cur.fetchone()['actualizado']
+        cur.close()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'series': series,
+                'updatedAt': updated.isoformat() if updated else None
+            }
+        })
+        
+    except Exception as e:
+        print(f"Error obteniendo estadísticas: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
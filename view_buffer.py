@@ -0,0 +1,261 @@
+import atexit
+import os
+import threading
+import time
+
+import psycopg2
+from cachetools import TTLCache
+from psycopg2.extras import execute_values
+
+import counters
+import etags
+from db_pool import PoolTimeout
+
+# Errores de la conexión o de la base de datos (caída, timeout, interbloqueo):
+# el lote entero vuelve a la cola. Cualquier otro error es de alguna fila.
+UNAVAILABLE = (PoolTimeout, psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class ViewBufferFull(Exception):
+    """La cola de visualizaciones está llena y no se liberó a tiempo."""
+
+
+class ViewAggregator:
+    """
+    Acumula visualizaciones en memoria y las escribe por lotes.
+
+    Cada flush inserta todas las filas de `vistas` en un solo INSERT
+    multi-fila y aplica un único incremento por video, en orden de
+    video_id para que dos procesos no se bloqueen mutuamente. Se vacía
+    cuando hay max_batch eventos o cada flush_interval segundos, y
+    también al terminar el proceso.
+
+    Si la base de datos no está disponible el lote vuelve a la cola. Si
+    falla por sus datos se reintenta video a video y se descartan (con
+    aviso en el log) las vistas de los videos que siguen fallando, para que
+    una fila mala no bloquee todas las demás.
+    """
+
+    def __init__(self, pool, max_batch=500, flush_interval=1.0,
+                 max_pending=10000, put_timeout=0.5):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+
+        self._cond = threading.Condition()
+        self._events = []                               # (video_id, username)
+        self._pending = {}                              # video_id -> vistas sin escribir
+        self._known = TTLCache(maxsize=10000, ttl=60)   # video_id -> valor en BD
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+        self.flushed_events = 0
+        self.flush_errors = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        if self._pid != os.getpid():
+            # Proceso hijo tras un fork: los eventos del padre no son nuestros
+            self._events = []
+            self._pending = {}
+            self._pid = os.getpid()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='view-flusher', daemon=True)
+        self._thread.start()
+
+    def record(self, video_id, username):
+        """
+        Encola una visualización. Devuelve cuántas visualizaciones de ese
+        video quedan pendientes de escribir, o lanza ViewBufferFull si la
+        cola sigue llena tras put_timeout segundos. Lanza ValueError si
+        video_id o username no son texto válido para la BD: una sola clave
+        así haría fallar el lote entero al escribirlo.
+        """
+        for key in (video_id, username):
+            if not isinstance(key, str) or not key or '\x00' in key:
+                raise ValueError(f'Clave de visualización no válida: {key!r}')
+        with self._cond:
+            self._ensure_started()
+            deadline = time.monotonic() + self.put_timeout
+            while len(self._events) >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise ViewBufferFull('Cola de visualizaciones llena')
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+
+            self._pending[video_id] = self._pending.get(video_id, 0) + 1
+            self._events.append((video_id, username))
+            if len(self._events) >= self.max_batch:
+                self._cond.notify_all()
+            return self._pending[video_id]
+
+    def known_count(self, video_id):
+        """Último valor de visualizaciones leído de la BD, o None."""
+        with self._cond:
+            return self._known.get(video_id)
+
+    def remember(self, video_id, count):
+        with self._cond:
+            self._known[video_id] = count
+
+    def pending_count(self, video_id):
+        with self._cond:
+            return self._pending.get(video_id, 0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._events) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def flush(self):
+        with self._cond:
+            events, self._events = self._events, []
+            self._cond.notify_all()
+        if not events:
+            return 0
+
+        try:
+            return self._write(events)
+        except UNAVAILABLE as e:
+            print(f"Error escribiendo visualizaciones: {e}")
+            with self._cond:
+                self.flush_errors += 1
+                self._requeue(events)
+            return 0
+        except Exception as e:
+            print(f"Error escribiendo visualizaciones, se reintenta video a video: {e}")
+            with self._cond:
+                self.flush_errors += 1
+        return self._write_each(events)
+
+    def _write(self, events):
+        """Escribe los eventos en una transacción. Devuelve cuántos escribió."""
+        counts = {}
+        for video_id, _ in events:
+            counts[video_id] = counts.get(video_id, 0) + 1
+
+        conn = self.pool.getconn()
+        try:
+            cur = conn.cursor()
+            execute_values(cur, 'INSERT INTO vistas (video_id, username) VALUES %s',
+                           events, page_size=1000)
+            # Incremento por video en la columna o en sus fragmentos (counters.py)
+            counters.add_many(cur, 'videos.visualizaciones', counts)
+            # Versión de los videos de cada autor afectado (ETag, ver etags.py)
+            etags.touch_query(cur, "SELECT 'videos:' || username FROM videos WHERE video_id = ANY(%s)",
+                              (sorted(counts),))
+            cur.execute('SELECT v.video_id, ' + counters.value('videos.visualizaciones', 'v') +
+                        ' as visualizaciones FROM videos v WHERE v.video_id = ANY(%s)',
+                        (sorted(counts),))
+            updated = cur.fetchall()
+            conn.commit()
+            cur.close()
+        except Exception:
+            self.pool.putconn(conn, discard=True)
+            raise
+        self.pool.putconn(conn)
+
+        with self._cond:
+            for video_id, n in counts.items():
+                left = self._pending.get(video_id, 0) - n
+                if left > 0:
+                    self._pending[video_id] = left
+                else:
+                    self._pending.pop(video_id, None)
+            for row in updated:
+                self._known[row['video_id']] = row['visualizaciones']
+            self.flushed_events += len(events)
+        return len(events)
+
+    def _write_each(self, events):
+        """Escribe los eventos de cada video en su propia transacción."""
+        groups = {}
+        for event in events:
+            try:
+                groups.setdefault(event[0], []).append(event)
+            except TypeError:
+                self._drop([event], 'video_id no válido')
+        groups = list(groups.values())
+
+        written = 0
+        for i, group in enumerate(groups):
+            try:
+                written += self._write(group)
+            except UNAVAILABLE as e:
+                print(f"Error escribiendo visualizaciones: {e}")
+                with self._cond:
+                    self._requeue([event for rest in groups[i:] for event in rest])
+                break
+            except Exception as e:
+                self._drop(group, e)
+        return written
+
+    def _requeue(self, events):
+        # Se devuelven a la cola mientras quepan; el resto se pierde
+        room = max(0, self.max_pending - len(self._events))
+        self._events = events[:room] + self._events
+        self._forget(events[room:])
+
+    def _drop(self, events, reason):
+        print(f"Descartadas {len(events)} visualizaciones de {events[0][0]!r}: {reason}")
+        with self._cond:
+            self.dropped += len(events)
+            self._forget(events)
+
+    def _forget(self, events):
+        for video_id, _ in events:
+            try:
+                left = self._pending.get(video_id, 0) - 1
+            except TypeError:
+                continue
+            if left > 0:
+                self._pending[video_id] = left
+            else:
+                self._pending.pop(video_id, None)
+
+    def stop(self):
+        """Vacía la cola y detiene el hilo (se llama también en atexit)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=10)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queued': len(self._events),
+                'max_pending': self.max_pending,
+                'flushed_events': self.flushed_events,
+                'flush_errors': self.flush_errors,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+            }
+
+
+def aggregator_from_settings(pool, settings):
+    """Crea el agregador con los umbrales VIEW_* de la configuración."""
+    aggregator = ViewAggregator(
+        pool,
+        max_batch=settings['VIEW_FLUSH_BATCH'],
+        flush_interval=settings['VIEW_FLUSH_INTERVAL'],
+        max_pending=settings['VIEW_QUEUE_MAX'],
+        put_timeout=settings['VIEW_QUEUE_TIMEOUT'],
+    )
+    atexit.register(aggregator.stop)
+    return aggregator